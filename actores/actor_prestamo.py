@@ -1,11 +1,11 @@
 import argparse
 import json
-import time
 import threading
-from typing import Optional
 
 import zmq
 
+from common.ga_client import ClienteGA, parse_shards
+
 
 def servir_health(ctx: zmq.Context, bind_addr: str, nombre: str):
     """
@@ -33,44 +33,6 @@ def servir_health(ctx: zmq.Context, bind_addr: str, nombre: str):
         rep.close(0)
 
 
-def llamar_ga_con_failover(
-    ctx: zmq.Context,
-    data: dict,
-    primary_ep: str,
-    backup_ep: Optional[str] = None,
-    timeout_ms: int = 5000,
-) -> dict:
-    """
-    Envía 'data' a GA usando REQ/REP. Intenta primero primary_ep;
-    si hay timeout o error, intenta backup_ep (si existe).
-    """
-    endpoints = [primary_ep] + ([backup_ep] if backup_ep else [])
-
-    for ep in endpoints:
-        if not ep:
-            continue
-        sock = ctx.socket(zmq.REQ)
-        sock.connect(ep)
-        sock.setsockopt(zmq.RCVTIMEO, timeout_ms)
-        try:
-            sock.send_json(data)
-            resp = sock.recv_json()
-            print(f"[ACTOR-PREST] GA {ep} → {resp}")
-            sock.close(0)
-            return resp
-        except zmq.Again:
-            print(f"[ACTOR-PREST][WARN] Timeout hablando con GA {ep}, probando siguiente si existe...")
-        except Exception as e:
-            print(f"[ACTOR-PREST][ERROR] Falla hablando con GA {ep}: {e}")
-        finally:
-            try:
-                sock.close(0)
-            except Exception:
-                pass
-
-    return {"ok": False, "msg": "Ningún GA respondió (ni primario ni backup)."}
-
-
 def main():
     ap = argparse.ArgumentParser(description="Actor PRESTAMO (REP←GC, REQ→GA, Health)")
     ap.add_argument(
@@ -81,7 +43,7 @@ def main():
     ap.add_argument(
         "--ga-primary",
         dest="ga_primary",
-        required=True,
+        default=None,
         help="Dirección REP del GA primario (p.ej. tcp://127.0.0.1:5570)",
     )
     ap.add_argument(
@@ -90,6 +52,13 @@ def main():
         default=None,
         help="Dirección REP del GA de respaldo (p.ej. tcp://127.0.0.1:5571)",
     )
+    ap.add_argument(
+        "--ga-shards",
+        dest="ga_shards",
+        default=None,
+        help="GA por sede: SEDE1=tcp://h1:5570|tcp://h1:5571,SEDE2=tcp://h2:5570 "
+        "(primario|backup). Las sedes sin shard usan --ga-primary/--ga-backup.",
+    )
     ap.add_argument(
         "--hc",
         default="tcp://*:5603",
@@ -102,6 +71,10 @@ def main():
     )
     args = ap.parse_args()
 
+    shards = parse_shards(args.ga_shards)
+    if not args.ga_primary and not shards:
+        raise SystemExit("Debe especificar --ga-primary o --ga-shards (endpoint del GA).")
+
     ctx = zmq.Context.instance()
 
     # Health REP en hilo aparte
@@ -116,6 +89,12 @@ def main():
     rep.bind(args.bind)
     print(f"[{args.name}] REP PRESTAMO en {args.bind}")
     print(f"[{args.name}] GA primario: {args.ga_primary} | GA backup: {args.ga_backup or '-'}")
+    for sede, (prim, back) in shards.items():
+        print(f"[{args.name}] Shard {sede}: GA primario {prim} | GA backup {back or '-'}")
+
+    # Sockets al GA reutilizados entre mensajes
+    cliente = ClienteGA(ctx, args.name, args.ga_primary, args.ga_backup, shards)
+    cliente.precalentar()
 
     try:
         while True:
@@ -124,16 +103,16 @@ def main():
             print(f"[{args.name}] Recibí solicitud de GC: {op} id={data.get('idSolicitud')} data={data}")
 
             if op != "PRESTAMO":
-                resp = {"ok": False, "msg": f"op no soportada por actor PRESTAMO: {op}"}
+                resp = {"ok": False, "error": True, "msg": f"op no soportada por actor PRESTAMO: {op}"}
             else:
-                resp = llamar_ga_con_failover(ctx, data, args.ga_primary, args.ga_backup)
+                resp = cliente.llamar(data)
 
             rep.send_json(resp)
-            time.sleep(0.01)
     except KeyboardInterrupt:
         print(f"\n[{args.name}] Saliendo...")
     finally:
         rep.close(0)
+        cliente.cerrar()
         ctx.term()
 
 
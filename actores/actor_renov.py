@@ -1,15 +1,23 @@
 import argparse
 import json
-import time
 import threading
-from typing import Optional
+from typing import Callable, Optional
 
 import zmq
 
+from common.ga_client import ClienteGA, parse_shards
+from common.pipeline import PipelinePorClave
 
-def servir_health(ctx: zmq.Context, bind_addr: str, nombre: str):
+
+def servir_health(
+    ctx: zmq.Context,
+    bind_addr: str,
+    nombre: str,
+    en_cola: Optional[Callable[[], int]] = None,
+):
     """
     REP de health: responde a {'type':'health'} con {'type':'health_ok'}.
+    Con en_cola incluye los mensajes pendientes del actor (el GC regula el vaciado del backlog).
     """
     rep = ctx.socket(zmq.REP)
     rep.bind(bind_addr)
@@ -19,7 +27,10 @@ def servir_health(ctx: zmq.Context, bind_addr: str, nombre: str):
             try:
                 req = rep.recv_json()
                 if req.get("type") == "health":
-                    rep.send_json({"type": "health_ok", "actor": nombre})
+                    resp = {"type": "health_ok", "actor": nombre}
+                    if en_cola is not None:
+                        resp["en_cola"] = en_cola()
+                    rep.send_json(resp)
                 else:
                     rep.send_json({"type": "error", "error": "unknown"})
             except zmq.ContextTerminated:
@@ -33,50 +44,24 @@ def servir_health(ctx: zmq.Context, bind_addr: str, nombre: str):
         rep.close(0)
 
 
-def llamar_ga_con_failover(
-    ctx: zmq.Context,
-    data: dict,
-    primary_ep: str,
-    backup_ep: Optional[str] = None,
-    timeout_ms: int = 5000,
-) -> dict:
-    """
-    Envía 'data' a GA usando REQ/REP. Intenta primero primary_ep;
-    si hay timeout o error, intenta backup_ep (si existe).
-    """
-    endpoints = [primary_ep] + ([backup_ep] if backup_ep else [])
-
-    for ep in endpoints:
-        if not ep:
-            continue
-        sock = ctx.socket(zmq.REQ)
-        sock.connect(ep)
-        sock.setsockopt(zmq.RCVTIMEO, timeout_ms)
-        try:
-            sock.send_json(data)
-            resp = sock.recv_json()
-            print(f"[ACTOR-REN] GA {ep} → {resp}")
-            sock.close(0)
-            return resp
-        except zmq.Again:
-            print(f"[ACTOR-REN][WARN] Timeout hablando con GA {ep}, probando siguiente si existe...")
-        except Exception as e:
-            print(f"[ACTOR-REN][ERROR] Falla hablando con GA {ep}: {e}")
-        finally:
-            try:
-                sock.close(0)
-            except Exception:
-                pass
-
-    return {"ok": False, "msg": "Ningún GA respondió (ni primario ni backup)."}
-
-
 def main():
     ap = argparse.ArgumentParser(description="Actor RENOVACION (SUB + REQ->GA + Health)")
     ap.add_argument(
         "--sub",
-        required=True,
-        help="Dirección del PUB del GC (p.ej. tcp://127.0.0.1:5560)",
+        default=None,
+        help="Dirección del PUB del GC (p.ej. tcp://127.0.0.1:5560); con varios GC, separadas por coma",
+    )
+    ap.add_argument(
+        "--pull",
+        default=None,
+        help="Dirección del PUSH del GC para este tópico (GC con --distribucion push; "
+        "varias instancias se reparten los mensajes). Reemplaza a --sub.",
+    )
+    ap.add_argument(
+        "--ack",
+        default=None,
+        help="PULL de acks del GC (GC con --entrega confirmada, p.ej. tcp://127.0.0.1:5565). "
+        "Cada mensaje se confirma cuando el GA respondió.",
     )
     # Compatibilidad hacia atrás: --ga (un solo endpoint) o --ga-primary/--ga-backup
     ap.add_argument(
@@ -97,11 +82,38 @@ def main():
         default=None,
         help="Dirección REP del GA de respaldo (p.ej. tcp://127.0.0.1:5571)",
     )
+    ap.add_argument(
+        "--ga-shards",
+        dest="ga_shards",
+        default=None,
+        help="GA por sede: SEDE1=tcp://h1:5570|tcp://h1:5571,SEDE2=tcp://h2:5570 "
+        "(primario|backup). Las sedes sin shard usan --ga-primary/--ga-backup.",
+    )
     ap.add_argument(
         "--hc",
         default="tcp://*:5602",
         help="Bind REP health del actor (default tcp://*:5602)",
     )
+    ap.add_argument(
+        "--concurrencia",
+        type=int,
+        default=4,
+        help="Operaciones en vuelo hacia el GA (un hilo y un cliente GA cada una). "
+        "Las de un mismo (idLibro, idUsuario) se aplican en orden de llegada.",
+    )
+    ap.add_argument(
+        "--cola-max",
+        dest="cola_max",
+        type=int,
+        default=100,
+        help="Mensajes en espera por hilo antes de dejar de leer del SUB",
+    )
+    ap.add_argument(
+        "--topicos",
+        default="RENOVACION",
+        help="Tópicos del PUB del GC (coma). Con DEVOLUCION,RENOVACION un solo actor ordena "
+        "la renovación y la devolución de un mismo préstamo.",
+    )
     ap.add_argument(
         "--name",
         default="ACTOR-REN",
@@ -109,44 +121,74 @@ def main():
     )
     args = ap.parse_args()
 
+    if bool(args.sub) == bool(args.pull):
+        raise SystemExit("Debe especificar --sub (PUB/SUB) o --pull (PUSH/PULL), uno de los dos.")
+
     ga_primary = args.ga_primary or args.ga
     ga_backup = args.ga_backup
 
-    if not ga_primary:
-        raise SystemExit("Debe especificar --ga-primary o --ga (endpoint del GA).")
+    shards = parse_shards(args.ga_shards)
+
+    if not ga_primary and not shards:
+        raise SystemExit("Debe especificar --ga-primary, --ga o --ga-shards (endpoint del GA).")
 
     ctx = zmq.Context.instance()
 
+    if args.pull:
+        # PULL: el GC reparte el tópico entre las instancias conectadas
+        sock = ctx.socket(zmq.PULL)
+        for ep in args.pull.split(","):
+            sock.connect(ep.strip())
+        print(f"[{args.name}] PULL a {args.pull}")
+    else:
+        # SUB al GC
+        sock = ctx.socket(zmq.SUB)
+        for ep in args.sub.split(","):
+            sock.connect(ep.strip())
+        topicos = [t.strip().upper() for t in args.topicos.split(",") if t.strip()]
+        for t in topicos:
+            sock.setsockopt_string(zmq.SUBSCRIBE, t)
+        print(f"[{args.name}] SUB a {args.sub} (tópicos {', '.join(topicos)})")
+
+    print(f"[{args.name}] GA primario: {ga_primary} | GA backup: {ga_backup or '-'}")
+    for sede, (prim, back) in shards.items():
+        print(f"[{args.name}] Shard {sede}: GA primario {prim} | GA backup {back or '-'}")
+
+    def crear_cliente() -> ClienteGA:
+        # Sockets al GA reutilizados entre mensajes (uno por hilo del pipeline)
+        cliente = ClienteGA(ctx, args.name, ga_primary, ga_backup, shards, ack_addr=args.ack)
+        cliente.precalentar()
+        return cliente
+
+    def manejar(cliente: ClienteGA, data: dict):
+        # Enviar al GA de la sede (shard) para aplicar renovación con failover
+        resp = cliente.llamar(data)
+        print(f"[{args.name}] Respuesta GA → {resp}")
+
+    pipeline = PipelinePorClave(args.concurrencia, args.cola_max, crear_cliente, manejar, args.name)
+    pipeline.iniciar()
+
     # Health REP en hilo aparte
     threading.Thread(
         target=servir_health,
-        args=(ctx, args.hc, args.name),
+        args=(ctx, args.hc, args.name, pipeline.en_cola),
         daemon=True,
     ).start()
-
-    # SUB al GC
-    sub = ctx.socket(zmq.SUB)
-    sub.connect(args.sub)
-    sub.setsockopt_string(zmq.SUBSCRIBE, "RENOVACION")
-    print(f"[{args.name}] SUB a {args.sub} (tópico RENOVACION)")
-
-    print(f"[{args.name}] GA primario: {ga_primary} | GA backup: {ga_backup or '-'}")
+    print(f"[{args.name}] Hasta {args.concurrencia} operaciones en vuelo hacia el GA")
 
     try:
         while True:
-            topic, payload = sub.recv_multipart()
+            topic, payload = sock.recv_multipart()
             data = json.loads(payload.decode("utf-8"))
             print(f"[{args.name}] Recibí {topic.decode()}: {data}")
-
-            # Enviar a GA para aplicar renovación con failover
-            resp = llamar_ga_con_failover(ctx, data, ga_primary, ga_backup)
-            print(f"[{args.name}] Respuesta GA → {resp}")
-            time.sleep(0.01)
+            pipeline.enviar(data)
     except KeyboardInterrupt:
         print(f"\n[{args.name}] Saliendo...")
     finally:
-        sub.close(0)
-        ctx.term()
+        sock.close(0)
+        # Si algún hilo sigue esperando al GA, ctx.term() no retornaría
+        if pipeline.cerrar():
+            ctx.term()
 
 
 if __name__ == "__main__":
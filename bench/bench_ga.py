@@ -0,0 +1,205 @@
+"""
+Benchmark del GA a nivel de almacenamiento (sin red).
+
+Reproduce las cargas de ps/data (por defecto sol_prest_sede1/2) directamente contra
+process_operation / process_batch sobre una BD recién inicializada, para comparar
+perfiles de SQLite (--perfil-bd del GA) y tamaños de lote (--lote-max).
+
+Con --modo workers levanta el GA real (python -m ga.ga --workers N) sobre la misma BD
+y lo satura con --clientes REQ concurrentes, para medir operaciones/s según el número
+de workers.
+
+Ejemplos:
+    python -m bench.bench_ga --perfiles default,wal --lotes 1,32 --repeticiones 20
+    python -m bench.bench_ga --modo workers --workers 1,2,4,8 --clientes 16 --perfiles wal
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import List
+
+import zmq
+
+from ga.ga import PERFILES_BD, connect, process_batch, process_operation
+from ga.init_db import crear_bd
+from ps.ps import ensure_message_contract
+
+ARCHIVOS_DEFAULT = "ps/data/sol_prest_sede1.txt,ps/data/sol_prest_sede2.txt"
+
+
+def cargar_workload(archivos: List[str], repeticiones: int) -> List[dict]:
+    """
+    Lee los archivos JSON-por-línea y genera `repeticiones` rondas con idSolicitud únicos.
+    Cada PRESTAMO va seguido (al final de la ronda) de su DEVOLUCION, así cada ronda
+    vuelve a encontrar ejemplares disponibles y todas las operaciones escriben.
+    """
+    base = []
+    for ruta in archivos:
+        with open(ruta, "r", encoding="utf-8") as f:
+            base.extend(json.loads(line) for line in f if line.strip())
+
+    ops = []
+    for r in range(repeticiones):
+        devoluciones = []
+        for m in base:
+            msg = dict(m, idSolicitud=f"{m.get('idSolicitud', 'S')}-R{r}")
+            ops.append(ensure_message_contract(msg))
+            if msg["op"] == "PRESTAMO":
+                dev = dict(msg, op="DEVOLUCION", idSolicitud=f"{msg['idSolicitud']}-D")
+                devoluciones.append(ensure_message_contract(dev))
+        ops.extend(devoluciones)
+    return ops
+
+
+def medir(db_path: str, perfil: str, lote: int, ops: List[dict]) -> float:
+    crear_bd(db_path)
+    con = connect(db_path, perfil)
+    try:
+        t0 = time.perf_counter()
+        if lote <= 1:
+            for data in ops:
+                process_operation(con, data)
+        else:
+            for i in range(0, len(ops), lote):
+                process_batch(con, ops[i:i + lote])
+        return time.perf_counter() - t0
+    finally:
+        con.close()
+
+
+def esperar_ga(ctx: zmq.Context, endpoint: str, timeout_s: float = 10.0):
+    limite = time.monotonic() + timeout_s
+    while time.monotonic() < limite:
+        s = ctx.socket(zmq.REQ)
+        s.setsockopt(zmq.LINGER, 0)
+        s.setsockopt(zmq.RCVTIMEO, 300)
+        s.connect(endpoint)
+        try:
+            s.send_json({"type": "estado_replicacion"})
+            s.recv_json()
+            return
+        except zmq.Again:
+            pass
+        finally:
+            s.close(0)
+    raise RuntimeError(f"GA en {endpoint} no arrancó")
+
+
+def medir_red(
+    db_path: str,
+    perfil: str,
+    lote: int,
+    workers: int,
+    workers_modo: str,
+    clientes: int,
+    ops: List[dict],
+    puerto: int,
+) -> float:
+    """
+    Levanta el GA como proceso aparte y mide el tiempo que tardan `clientes` REQ concurrentes
+    en aplicar todas las operaciones (repartidas en round-robin).
+    """
+    crear_bd(db_path)
+    endpoint = f"tcp://127.0.0.1:{puerto}"
+    cmd = [
+        sys.executable, "-m", "ga.ga",
+        "--rep", f"tcp://127.0.0.1:{puerto}",
+        "--db", db_path,
+        "--perfil-bd", perfil,
+        "--lote-max", str(lote),
+        "--workers", str(workers),
+        "--workers-modo", workers_modo,
+    ]
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    ctx = zmq.Context()
+    try:
+        esperar_ga(ctx, endpoint)
+
+        def cliente(parte: List[dict]):
+            s = ctx.socket(zmq.REQ)
+            s.setsockopt(zmq.LINGER, 0)
+            s.connect(endpoint)
+            for data in parte:
+                s.send_json(data)
+                s.recv_json()
+            s.close(0)
+
+        hilos = [threading.Thread(target=cliente, args=(ops[i::clientes],)) for i in range(clientes)]
+        t0 = time.perf_counter()
+        for h in hilos:
+            h.start()
+        for h in hilos:
+            h.join()
+        return time.perf_counter() - t0
+    finally:
+        proc.terminate()
+        proc.wait()
+        ctx.term()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark de almacenamiento del GA (perfiles SQLite y group commit)")
+    ap.add_argument("--archivos", default=ARCHIVOS_DEFAULT, help="Archivos de solicitudes separados por coma")
+    ap.add_argument("--perfiles", default=",".join(sorted(PERFILES_BD)), help="Perfiles a comparar (coma)")
+    ap.add_argument("--lotes", default="1", help="Tamaños de lote a comparar (coma); 1 = COMMIT por operación")
+    ap.add_argument("--repeticiones", type=int, default=10, help="Rondas sobre los archivos")
+    ap.add_argument("--dir", default=None, help="Carpeta para las BD temporales (default: tmp del sistema)")
+    ap.add_argument(
+        "--modo",
+        choices=["almacenamiento", "workers"],
+        default="almacenamiento",
+        help="almacenamiento: llamadas directas sin red. workers: GA real con --workers y clientes REQ.",
+    )
+    ap.add_argument("--workers", default="1,2,4", help="(modo workers) Cantidades de workers a comparar (coma)")
+    ap.add_argument(
+        "--workers-modo",
+        dest="workers_modo",
+        choices=["hilos", "procesos"],
+        default="hilos",
+        help="(modo workers) Workers del GA como hilos o procesos",
+    )
+    ap.add_argument("--clientes", type=int, default=8, help="(modo workers) Clientes REQ concurrentes")
+    ap.add_argument("--puerto", type=int, default=5590, help="(modo workers) Puerto local para el GA")
+    ap.add_argument(
+        "--copias",
+        type=int,
+        default=1,
+        help="Cada operación se envía N veces con la misma idempotencyKey (como N PS con el mismo archivo)",
+    )
+    args = ap.parse_args()
+
+    ops = cargar_workload([a for a in args.archivos.split(",") if a], args.repeticiones)
+    ops = [data for data in ops for _ in range(args.copias)]
+    perfiles = [p for p in args.perfiles.split(",") if p]
+    lotes = [int(x) for x in args.lotes.split(",") if x]
+    workers = [int(x) for x in args.workers.split(",") if x] if args.modo == "workers" else [0]
+    print(f"[BENCH-GA] {len(ops)} operaciones por corrida")
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        resultados = []
+        for perfil in perfiles:
+            for lote in lotes:
+                for n in workers:
+                    if args.modo == "workers":
+                        dt = medir_red(db_path, perfil, lote, n, args.workers_modo, args.clientes, ops, args.puerto)
+                    else:
+                        dt = medir(db_path, perfil, lote, ops)
+                    resultados.append((perfil, lote, n, dt))
+                    extra = f" workers={n}" if args.modo == "workers" else ""
+                    print(f"[BENCH-GA] perfil={perfil} lote={lote}{extra} → {dt:.3f}s ({len(ops) / dt:.1f} ops/s)")
+
+    base = resultados[0][3]
+    print()
+    print(f"{'perfil':<10} {'lote':>5} {'workers':>8} {'segundos':>9} {'ops/s':>9} {'vs base':>8}")
+    for perfil, lote, n, dt in resultados:
+        print(f"{perfil:<10} {lote:>5} {n or '-':>8} {dt:>9.3f} {len(ops) / dt:>9.1f} {base / dt:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
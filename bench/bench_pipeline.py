@@ -0,0 +1,391 @@
+"""
+Benchmark del sistema completo en localhost: PS → GC → actores → GA.
+
+Para cada escenario (N PS por sede) y cada carga (PRESTAMO o DEV/REN) recrea las BD con
+ga/init_db.py, levanta GA primario y backup, los tres actores y el GC con los mismos comandos
+de comandos/comandosSust.txt, corre los 2·N PS en paralelo, une sus métricas (--metricas-json)
+y apaga todo. El reporte se puede guardar (--salida) y comparar contra uno anterior
+(--baseline) para medir cada cambio de rendimiento.
+
+"drenado" es el tiempo desde que se lanzan los PS hasta que el GA aplicó todas las operaciones
+distintas (en DEV/REN el PS recibe el OK antes de que los actores las apliquen).
+
+Ejemplos:
+    python -m bench.bench_pipeline --salida /tmp/base.json
+    python -m bench.bench_pipeline --gc-args "--modo router" --baseline /tmp/base.json
+    python -m bench.bench_pipeline --escenarios 10 --cargas devren --ps-args "--clientes 5"
+"""
+import argparse
+import json
+import os
+import shlex
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import zmq
+
+from bench.bench_ga import esperar_ga
+from common.metricas import ERROR, OK, RECHAZADA, TIMEOUT, MetricasPS
+from ga.init_db import crear_bd
+from ps.ps import ensure_message_contract
+
+CARGAS = {
+    "prestamo": ("ps/data/sol_prest_sede1.txt", "ps/data/sol_prest_sede2.txt"),
+    "devren": ("ps/data/sol_sede1.txt", "ps/data/sol_sede2.txt"),
+}
+
+# Puertos de comandos/comandosSust.txt (se les suma --desplazamiento)
+PUERTOS = {
+    "ga": 5570,
+    "ga_backup": 5571,
+    "gc_rep": 5555,
+    "gc_pub": 5560,
+    "prestamo": 5585,
+    "hc_dev": 5601,
+    "hc_ren": 5602,
+    "hc_prest": 5603,
+}
+
+
+def claves_distintas(archivos: List[str]) -> int:
+    """
+    Operaciones distintas que debe terminar aplicando el GA (los PS de una misma sede mandan el
+    mismo archivo, con la misma idempotencyKey).
+    """
+    claves = set()
+    for ruta in archivos:
+        with open(ruta, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    claves.add(ensure_message_contract(json.loads(line))["idempotencyKey"])
+    return len(claves)
+
+
+def contar_solicitudes(archivo: str) -> int:
+    with open(archivo, "r", encoding="utf-8") as f:
+        return sum(1 for line in f if line.strip())
+
+
+def contar_aplicadas(db_path: str) -> int:
+    con = sqlite3.connect(db_path, timeout=5)
+    try:
+        return con.execute("SELECT COUNT(*) FROM applied_ops").fetchone()[0]
+    except sqlite3.Error:
+        return -1
+    finally:
+        con.close()
+
+
+class Sistema:
+    """
+    GA primario/backup, actores y GC como procesos hijos; los logs quedan en `tmp`.
+    """
+
+    def __init__(
+        self,
+        tmp: str,
+        p: Dict[str, int],
+        ga_args: List[str],
+        actor_args: List[str],
+        gc_args: List[str],
+    ):
+        self.tmp = tmp
+        self.p = p
+        self.ga_args = ga_args
+        self.actor_args = actor_args
+        self.gc_args = gc_args
+        self.db = os.path.join(tmp, "biblioteca.db")
+        self.db_replica = os.path.join(tmp, "biblioteca_replica.db")
+        self.procs: List[subprocess.Popen] = []
+        self._logs = []
+
+    def _lanzar(self, nombre: str, args: List[str]) -> subprocess.Popen:
+        log = open(os.path.join(self.tmp, f"{nombre}.log"), "w", encoding="utf-8")
+        self._logs.append(log)
+        proc = subprocess.Popen([sys.executable, "-u", "-m", *args], stdout=log, stderr=subprocess.STDOUT)
+        self.procs.append(proc)
+        return proc
+
+    def levantar(self, ctx: zmq.Context, arranque_s: float):
+        p = self.p
+        crear_bd(self.db)
+        crear_bd(self.db_replica)
+        ga = f"tcp://127.0.0.1:{p['ga']}"
+        ga_backup = f"tcp://127.0.0.1:{p['ga_backup']}"
+        gc_pub = f"tcp://127.0.0.1:{p['gc_pub']}"
+        actor_ga = ["--ga-primary", ga, "--ga-backup", ga_backup]
+
+        self._lanzar(
+            "ga_primario",
+            ["ga.ga", "--role", "primary", "--rep", f"tcp://*:{p['ga']}", "--db", self.db,
+             "--db-replica", self.db_replica, *self.ga_args],
+        )
+        self._lanzar(
+            "ga_backup",
+            ["ga.ga", "--role", "backup", "--rep", f"tcp://*:{p['ga_backup']}", "--db", self.db_replica,
+             *self.ga_args],
+        )
+        esperar_ga(ctx, ga)
+        self._lanzar(
+            "actor_devol",
+            ["actores.actor_devol", "--sub", gc_pub, *actor_ga, "--hc", f"tcp://*:{p['hc_dev']}",
+             *self.actor_args],
+        )
+        self._lanzar(
+            "actor_renov",
+            ["actores.actor_renov", "--sub", gc_pub, *actor_ga, "--hc", f"tcp://*:{p['hc_ren']}",
+             *self.actor_args],
+        )
+        self._lanzar(
+            "actor_prestamo",
+            ["actores.actor_prestamo", "--bind", f"tcp://*:{p['prestamo']}", *actor_ga,
+             "--hc", f"tcp://*:{p['hc_prest']}"],
+        )
+        self._lanzar(
+            "gc",
+            ["gestor_carga.gc", "--rep", f"tcp://*:{p['gc_rep']}", "--pub", f"tcp://*:{p['gc_pub']}",
+             "--hc-dev", f"tcp://127.0.0.1:{p['hc_dev']}", "--hc-ren", f"tcp://127.0.0.1:{p['hc_ren']}",
+             "--prestamo-addr", f"tcp://127.0.0.1:{p['prestamo']}",
+             "--hc-prest", f"tcp://127.0.0.1:{p['hc_prest']}", *self.gc_args],
+        )
+        # Los SUB de los actores tienen que estar conectados antes de que el GC publique
+        time.sleep(arranque_s)
+        caidos = [proc.args[3] for proc in self.procs if proc.poll() is not None]
+        if caidos:
+            raise RuntimeError(f"No arrancaron: {', '.join(caidos)} (ver logs en {self.tmp})")
+
+    def apagar(self):
+        for proc in reversed(self.procs):
+            if proc.poll() is None:
+                proc.terminate()
+        for proc in self.procs:
+            try:
+                proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+        for log in self._logs:
+            log.close()
+        self.procs, self._logs = [], []
+
+
+def correr_escenario(
+    tmp: str,
+    carga: str,
+    ps_por_sede: int,
+    puertos: Dict[str, int],
+    args: argparse.Namespace,
+) -> dict:
+    archivos = CARGAS[carga]
+    esperadas = claves_distintas(list(archivos))
+    sistema = Sistema(
+        tmp, puertos, shlex.split(args.ga_args), shlex.split(args.actor_args), shlex.split(args.gc_args)
+    )
+    ctx = zmq.Context()
+    try:
+        sistema.levantar(ctx, args.arranque_s)
+        t0 = time.time()
+        ps_procs = []
+        for sede, archivo in enumerate(archivos, start=1):
+            for i in range(1, ps_por_sede + 1):
+                label = f"SEDE{sede}-PS{i}"
+                ruta_json = os.path.join(tmp, f"{label}.json")
+                log = open(os.path.join(tmp, f"{label}.log"), "w", encoding="utf-8")
+                cmd = [
+                    sys.executable, "-m", "ps.ps",
+                    "--file", archivo,
+                    "--endpoint", f"tcp://127.0.0.1:{puertos['gc_rep']}",
+                    "--interval", str(args.interval),
+                    "--label", label,
+                    "--metricas-json", ruta_json,
+                    *shlex.split(args.ps_args),
+                ]
+                proc = subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT)
+                ps_procs.append((proc, log, label, archivo, ruta_json))
+        for proc, log, _, _, _ in ps_procs:
+            proc.wait()
+            log.close()
+
+        # Esperar a que el GA haya aplicado todo (DEV/REN llegan por los actores, después del OK)
+        drenado_s: Optional[float] = None
+        limite = time.monotonic() + args.drenado_timeout_s
+        while time.monotonic() < limite:
+            if contar_aplicadas(sistema.db) >= esperadas:
+                drenado_s = time.time() - t0
+                break
+            time.sleep(0.05)
+
+        metricas = MetricasPS()
+        metricas.procesos = 0
+        # Un PS que terminó mal o no dejó métricas cuenta todas sus solicitudes como fallas
+        ps_fallidos = 0
+        no_medidas = 0
+        for proc, _, label, archivo, ruta_json in ps_procs:
+            if proc.returncode == 0 and os.path.exists(ruta_json):
+                metricas.fusionar(MetricasPS.cargar_json(ruta_json))
+                continue
+            ps_fallidos += 1
+            no_medidas += contar_solicitudes(archivo)
+            print(
+                f"[BENCH-PIPE][ERROR] {label} terminó con código {proc.returncode}"
+                f"{'' if os.path.exists(ruta_json) else ' sin métricas'} (ver {label}.log en {tmp})"
+            )
+        aplicadas = contar_aplicadas(sistema.db)
+    finally:
+        sistema.apagar()
+        ctx.term()
+
+    total = metricas.resumen()[-1]
+    dur = metricas.duracion()
+    # Los rechazos de negocio (p.ej. sin ejemplares) no son fallas del sistema
+    fallas = metricas.total() - metricas.total(OK) - metricas.total(RECHAZADA) + no_medidas
+    # Corrida rota (no comparable): PS caídos, solicitudes sin respuesta o el GA no aplicó todo
+    valido = (
+        ps_fallidos == 0
+        and metricas.total(TIMEOUT) == 0
+        and metricas.total(ERROR) == 0
+        and aplicadas >= esperadas
+    )
+    return {
+        "escenario": f"{carga} x{ps_por_sede}",
+        "carga": carga,
+        "ps_por_sede": ps_por_sede,
+        "total": metricas.total() + no_medidas,
+        "ok": metricas.total(OK),
+        "rechazadas": metricas.total(RECHAZADA),
+        "fallas": fallas,
+        "ps_fallidos": ps_fallidos,
+        "valido": valido,
+        "ops_s": metricas.total(OK) / dur if dur > 0 else 0.0,
+        "p50_ms": total["p50_ms"],
+        "p99_ms": total["p99_ms"],
+        "max_ms": total["max_ms"],
+        "aplicadas": aplicadas,
+        "esperadas": esperadas,
+        "drenado_s": drenado_s,
+        "metricas": metricas.a_dict(),
+    }
+
+
+def fmt(v: Optional[float], ancho: int, dec: int = 1) -> str:
+    return f"{v:>{ancho}.{dec}f}" if v is not None else f"{'-':>{ancho}}"
+
+
+def imprimir_reporte(resultados: List[dict], baseline: Optional[Dict[str, dict]]):
+    print()
+    cab = f"{'escenario':<14} {'ok':>6} {'fallas':>6} {'ops/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'drenado s':>10}"
+    if baseline is not None:
+        cab += f" {'ops/s vs base':>14} {'p99 vs base':>12}"
+    print(cab)
+    for r in resultados:
+        linea = (
+            f"{r['escenario']:<14} {r['ok']:>6} {r['fallas']:>6} {fmt(r['ops_s'], 8)} "
+            f"{fmt(r['p50_ms'], 8)} {fmt(r['p99_ms'], 8)} {fmt(r['drenado_s'], 10, 2)}"
+        )
+        if not r["valido"]:
+            linea += "  INVÁLIDO"
+        elif baseline is not None:
+            base = baseline.get(r["escenario"])
+            if base and base.get("ops_s") and r["ops_s"]:
+                linea += f" {r['ops_s'] / base['ops_s']:>13.2f}x"
+            else:
+                linea += f" {'-':>14}"
+            if base and base.get("p99_ms") and r["p99_ms"]:
+                linea += f" {r['p99_ms'] / base['p99_ms']:>11.2f}x"
+            else:
+                linea += f" {'-':>12}"
+        print(linea)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark de punta a punta PS → GC → actores → GA")
+    ap.add_argument("--escenarios", default="4,6,10", help="PS por sede de cada escenario (coma)")
+    ap.add_argument(
+        "--cargas",
+        default="prestamo,devren",
+        help=f"Cargas a correr (coma): {', '.join(CARGAS)}",
+    )
+    ap.add_argument("--interval", type=float, default=0.2, help="--interval de cada PS (s)")
+    ap.add_argument("--ps-args", dest="ps_args", default="", help="Argumentos extra para cada PS")
+    ap.add_argument("--gc-args", dest="gc_args", default="", help="Argumentos extra para el GC")
+    ap.add_argument("--ga-args", dest="ga_args", default="", help="Argumentos extra para GA primario y backup")
+    ap.add_argument(
+        "--actor-args",
+        dest="actor_args",
+        default="",
+        help="Argumentos extra para los actores DEV/REN",
+    )
+    ap.add_argument(
+        "--desplazamiento",
+        type=int,
+        default=0,
+        help="Se suma a todos los puertos (para no chocar con un sistema ya levantado)",
+    )
+    ap.add_argument(
+        "--arranque-s",
+        dest="arranque_s",
+        type=float,
+        default=1.5,
+        help="Espera tras levantar los procesos, antes de lanzar los PS",
+    )
+    ap.add_argument(
+        "--drenado-timeout-s",
+        dest="drenado_timeout_s",
+        type=float,
+        default=30.0,
+        help="Máximo a esperar que el GA aplique todas las operaciones",
+    )
+    ap.add_argument("--dir", default=None, help="Carpeta para BD y logs (default: tmp que se borra al final)")
+    ap.add_argument("--salida", default=None, help="Guarda el reporte en este JSON")
+    ap.add_argument("--baseline", default=None, help="Reporte JSON anterior contra el cual comparar")
+    args = ap.parse_args()
+
+    escenarios = [int(x) for x in args.escenarios.split(",") if x]
+    cargas = [c for c in args.cargas.split(",") if c]
+    for c in cargas:
+        if c not in CARGAS:
+            raise SystemExit(f"Carga desconocida: {c} (opciones: {', '.join(CARGAS)})")
+    puertos = {k: v + args.desplazamiento for k, v in PUERTOS.items()}
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            # Los escenarios marcados inválidos no sirven de referencia
+            baseline = {
+                r["escenario"]: r for r in json.load(f)["resultados"] if r.get("valido", True)
+            }
+
+    resultados = []
+    with tempfile.TemporaryDirectory() as tmp_base:
+        for carga in cargas:
+            for n in escenarios:
+                tmp = os.path.join(args.dir or tmp_base, f"{carga}_x{n}")
+                os.makedirs(tmp, exist_ok=True)
+                print(f"[BENCH-PIPE] {carga} con {n} PS por sede (logs en {tmp})")
+                r = correr_escenario(tmp, carga, n, puertos, args)
+                resultados.append(r)
+                estado = "" if r["valido"] else f" ps_fallidos={r['ps_fallidos']} INVÁLIDO"
+                print(
+                    f"[BENCH-PIPE] {r['escenario']} → ok={r['ok']} rechazadas={r['rechazadas']} "
+                    f"fallas={r['fallas']} "
+                    f"{r['ops_s']:.1f} ops/s p99={fmt(r['p99_ms'], 0)} ms "
+                    f"aplicadas={r['aplicadas']}/{r['esperadas']}{estado}"
+                )
+
+    imprimir_reporte(resultados, baseline)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "resultados": resultados}, f, indent=2)
+        print(f"\n[BENCH-PIPE] Reporte en {args.salida}")
+
+    invalidos = [r["escenario"] for r in resultados if not r["valido"]]
+    if invalidos:
+        # Código != 0: un reporte roto no debe usarse como línea base ni compararse
+        raise SystemExit(f"[BENCH-PIPE][ERROR] Corridas inválidas: {', '.join(invalidos)}")
+
+
+if __name__ == "__main__":
+    main()
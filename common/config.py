@@ -7,6 +7,7 @@ GA_REP_ADDR = os.getenv("GA_REP_ADDR", "tcp://*:5570")   # GA escucha a Actores
 
 # Connects (para quien se conecta) 
 # Localhost por defecto; en VMs cambiamos host por la IP del proceso remoto:
+# GC_REP_CONNECT admite varios GC separados por coma (el PS rutea entre ellos)
 GC_REP_CONNECT = os.getenv("GC_REP_CONNECT", "tcp://127.0.0.1:5555")
 GC_PUB_CONNECT = os.getenv("GC_PUB_CONNECT", "tcp://127.0.0.1:5560")
 GA_REP_CONNECT = os.getenv("GA_REP_CONNECT", "tcp://127.0.0.1:5570")
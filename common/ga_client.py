@@ -0,0 +1,162 @@
+import time
+from typing import Dict, List, Optional, Tuple
+
+import zmq
+
+# sede -> (GA primario, GA backup)
+Shards = Dict[str, Tuple[str, Optional[str]]]
+
+
+def parse_shards(spec: Optional[str]) -> Shards:
+    """
+    Parsea el mapa de shards del GA por sede:
+        "SEDE1=tcp://10.0.0.1:5570|tcp://10.0.0.1:5571,SEDE2=tcp://10.0.0.2:5570"
+    Cada sede tiene un GA primario y, opcionalmente, un backup separado por '|'.
+    """
+    shards: Shards = {}
+    if not spec:
+        return shards
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        if "=" not in item:
+            raise ValueError(f"Shard inválido (se espera SEDE=endpoint): {item}")
+        sede, eps = item.split("=", 1)
+        partes = [p.strip() for p in eps.split("|") if p.strip()]
+        if not partes:
+            raise ValueError(f"Shard sin endpoint para {sede}")
+        shards[sede.strip().upper()] = (partes[0], partes[1] if len(partes) > 1 else None)
+    return shards
+
+
+def endpoints_ga(
+    data: dict,
+    shards: Shards,
+    primary_ep: Optional[str] = None,
+    backup_ep: Optional[str] = None,
+) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Elige (primario, backup) del GA para un mensaje según su sede.
+    Si la sede no tiene shard propio se usan los endpoints por defecto (pueden ser None).
+    """
+    sede = (data.get("sede") or "").upper()
+    return shards.get(sede, (primary_ep, backup_ep))
+
+
+class ClienteGA:
+    """
+    Cliente REQ del GA reutilizable por los actores (uno por hilo: los sockets ZMQ no son thread-safe).
+    - Mantiene un socket REQ conectado por endpoint, en vez de abrir y cerrar uno por mensaje.
+    - Tras un timeout el REQ queda esperando respuesta y no admite otro send: se cierra y se
+      recrea en el siguiente uso.
+    - Un GA que no respondió queda penalizado `penalizacion_s` segundos: mientras tanto se prueba
+      primero el otro, así el failover no paga el timeout completo del primario caído en cada mensaje.
+    - Con ack_addr (entrega confirmada del GC), cada mensaje con `_mid` se confirma al GC por PUSH
+      en cuanto un GA respondió; si ninguno respondió no se confirma y el GC lo reenviará.
+      El `_mid` es de la entrega GC → actor: no se reenvía al GA.
+    """
+
+    def __init__(
+        self,
+        ctx: zmq.Context,
+        nombre: str,
+        primary_ep: Optional[str] = None,
+        backup_ep: Optional[str] = None,
+        shards: Optional[Shards] = None,
+        timeout_ms: int = 5000,
+        penalizacion_s: float = 10.0,
+        ack_addr: Optional[str] = None,
+    ):
+        self.ctx = ctx
+        self.nombre = nombre
+        self.primary_ep = primary_ep
+        self.backup_ep = backup_ep
+        self.shards = shards or {}
+        self.timeout_ms = timeout_ms
+        self.penalizacion_s = penalizacion_s
+        self._socks: Dict[str, zmq.Socket] = {}
+        self._caido_hasta: Dict[str, float] = {}
+        self._ack: Optional[zmq.Socket] = None
+        if ack_addr:
+            self._ack = ctx.socket(zmq.PUSH)
+            self._ack.setsockopt(zmq.LINGER, 1000)
+            self._ack.connect(ack_addr)
+
+    def endpoints(self) -> List[str]:
+        eps = [self.primary_ep, self.backup_ep]
+        for prim, back in self.shards.values():
+            eps += [prim, back]
+        return list(dict.fromkeys(ep for ep in eps if ep))
+
+    def precalentar(self):
+        """
+        Conecta de antemano a todos los GA conocidos (el handshake TCP queda fuera del camino caliente).
+        """
+        for ep in self.endpoints():
+            self._socket(ep)
+
+    def _socket(self, ep: str) -> zmq.Socket:
+        sock = self._socks.get(ep)
+        if sock is None:
+            sock = self.ctx.socket(zmq.REQ)
+            sock.setsockopt(zmq.LINGER, 0)
+            sock.setsockopt(zmq.RCVTIMEO, self.timeout_ms)
+            sock.connect(ep)
+            self._socks[ep] = sock
+        return sock
+
+    def _descartar(self, ep: str):
+        sock = self._socks.pop(ep, None)
+        if sock is not None:
+            sock.close(0)
+        self._caido_hasta[ep] = time.monotonic() + self.penalizacion_s
+
+    def _orden(self, primary_ep: str, backup_ep: Optional[str]) -> List[str]:
+        # Los GA penalizados van al final: se prueban sólo si el otro tampoco responde
+        ahora = time.monotonic()
+        eps = [ep for ep in (primary_ep, backup_ep) if ep]
+        return sorted(eps, key=lambda ep: self._caido_hasta.get(ep, 0.0) > ahora)
+
+    def llamar(self, data: dict) -> dict:
+        """
+        Envía 'data' al GA de su sede (shard) con failover primario/backup.
+        """
+        primary_ep, backup_ep = endpoints_ga(data, self.shards, self.primary_ep, self.backup_ep)
+        if not primary_ep:
+            self._confirmar(data)  # reenviarlo no lo arregla
+            return {"ok": False, "error": True, "msg": f"No hay GA configurado para la sede {data.get('sede')}."}
+
+        payload = {k: v for k, v in data.items() if k != "_mid"}
+        for ep in self._orden(primary_ep, backup_ep):
+            sock = self._socket(ep)
+            try:
+                sock.send_json(payload)
+                resp = sock.recv_json()
+                self._caido_hasta.pop(ep, None)
+                print(f"[{self.nombre}] GA {ep} → {resp}")
+                self._confirmar(data)
+                return resp
+            except zmq.Again:
+                print(f"[{self.nombre}][WARN] Timeout hablando con GA {ep}, probando siguiente si existe...")
+            except Exception as e:
+                print(f"[{self.nombre}][ERROR] Falla hablando con GA {ep}: {e}")
+            self._descartar(ep)
+
+        return {"ok": False, "timeout": True, "msg": "Ningún GA respondió (ni primario ni backup)."}
+
+    def _confirmar(self, data: dict):
+        if self._ack is None or "_mid" not in data:
+            return
+        try:
+            self._ack.send_json({"mid": data["_mid"]}, zmq.NOBLOCK)
+        except zmq.Again:
+            pass  # sin ack el GC reenvía; el GA lo detecta como duplicado
+
+    def cerrar(self):
+        for sock in self._socks.values():
+            sock.close(0)
+        self._socks.clear()
+        if self._ack is not None:
+            self._ack.close()
+            self._ack = None
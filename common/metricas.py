@@ -0,0 +1,274 @@
+import csv
+import json
+import time
+from typing import Dict, List, Optional
+
+# Resultados de una solicitud del PS
+OK = "ok"  # el GC respondió ok=True
+RECHAZADA = "rechazada"  # ok=False por una regla de negocio (p.ej. sin ejemplares disponibles)
+OCUPADO = "ocupado"  # el GC siguió ocupado tras agotar los reintentos
+TIMEOUT = "timeout"  # ningún GC respondió, o el GC avisó que su actor no respondió
+ERROR = "error"  # línea inválida, falla local o error del sistema informado en la respuesta
+RESULTADOS = (OK, RECHAZADA, OCUPADO, TIMEOUT, ERROR)
+
+PERCENTILES = (50.0, 90.0, 99.0, 99.9)
+
+
+class Histograma:
+    """
+    Histograma de latencias estilo HDR: cubetas log-lineales sobre microsegundos (2^BITS
+    subcubetas por potencia de 2, error relativo < 1%), en un dict disperso para que ocupe poco
+    y se pueda fusionar y serializar. Registrar es O(1).
+    """
+
+    BITS = 7
+    _MITAD = 1 << (BITS - 1)
+
+    def __init__(self):
+        self.cubetas: Dict[int, int] = {}
+        self.n = 0
+        self.suma_us = 0
+        self.min_us: Optional[int] = None
+        self.max_us: Optional[int] = None
+
+    @classmethod
+    def _indice(cls, v: int) -> int:
+        e = max(0, v.bit_length() - cls.BITS)
+        return e * cls._MITAD + (v >> e)
+
+    @classmethod
+    def _valor(cls, idx: int) -> float:
+        # Punto medio de la cubeta
+        if idx < (1 << cls.BITS):
+            return float(idx)
+        e = idx // cls._MITAD - 1
+        return float(((idx - e * cls._MITAD) << e) + (1 << e) / 2)
+
+    def registrar(self, segundos: float):
+        v = max(0, int(segundos * 1_000_000))
+        idx = self._indice(v)
+        self.cubetas[idx] = self.cubetas.get(idx, 0) + 1
+        self.n += 1
+        self.suma_us += v
+        self.min_us = v if self.min_us is None else min(self.min_us, v)
+        self.max_us = v if self.max_us is None else max(self.max_us, v)
+
+    def percentil(self, p: float) -> Optional[float]:
+        """
+        Latencia (s) bajo la cual queda el p% de las muestras.
+        """
+        if not self.n:
+            return None
+        objetivo = max(1, int(round(p / 100.0 * self.n)))
+        acumulado = 0
+        for idx in sorted(self.cubetas):
+            acumulado += self.cubetas[idx]
+            if acumulado >= objetivo:
+                return min(self._valor(idx), float(self.max_us)) / 1_000_000
+        return self.max_us / 1_000_000
+
+    def media(self) -> Optional[float]:
+        return self.suma_us / self.n / 1_000_000 if self.n else None
+
+    def fusionar(self, otro: "Histograma"):
+        for idx, c in otro.cubetas.items():
+            self.cubetas[idx] = self.cubetas.get(idx, 0) + c
+        self.n += otro.n
+        self.suma_us += otro.suma_us
+        for v in (otro.min_us, otro.max_us):
+            if v is not None:
+                self.min_us = v if self.min_us is None else min(self.min_us, v)
+                self.max_us = v if self.max_us is None else max(self.max_us, v)
+
+    def a_dict(self) -> dict:
+        return {
+            "n": self.n,
+            "suma_us": self.suma_us,
+            "min_us": self.min_us,
+            "max_us": self.max_us,
+            "cubetas": {str(k): v for k, v in sorted(self.cubetas.items())},
+        }
+
+    @classmethod
+    def desde_dict(cls, d: dict) -> "Histograma":
+        h = cls()
+        h.n, h.suma_us, h.min_us, h.max_us = d["n"], d["suma_us"], d["min_us"], d["max_us"]
+        h.cubetas = {int(k): v for k, v in d["cubetas"].items()}
+        return h
+
+
+def clasificar(reply: dict) -> str:
+    """
+    Resultado de una respuesta (no "ocupado") del GC. Las fallas del sistema vienen marcadas con
+    "timeout" o "error"; un ok=False sin marca es un rechazo de negocio.
+    """
+    if reply.get("ok"):
+        return OK
+    if reply.get("timeout"):
+        return TIMEOUT
+    if reply.get("error"):
+        return ERROR
+    return RECHAZADA
+
+
+class MetricasPS:
+    """
+    Métricas de un PS (o de varios, fusionadas): por tipo de operación, conteos por resultado e
+    histograma de latencias de las respondidas; además una serie por segundo (segundo epoch →
+    conteos), así los reportes de varios procesos se alinean al fusionarlos.
+    """
+
+    def __init__(self):
+        self.conteos: Dict[str, Dict[str, int]] = {}
+        self.histogramas: Dict[str, Histograma] = {}
+        self.serie: Dict[int, Dict[str, int]] = {}
+        self.respuestas_ocupado = 0  # cada "ocupado" recibido, aunque luego se haya reintentado bien
+        self.inicio: Optional[float] = None
+        self.fin: Optional[float] = None
+        self.procesos = 1
+
+    def iniciar(self):
+        if self.inicio is None:
+            self.inicio = time.time()
+
+    def terminar(self):
+        self.fin = time.time()
+
+    def registrar(self, op: str, resultado: str, latencia_s: Optional[float] = None):
+        ahora = time.time()
+        self.iniciar()
+        conteo = self.conteos.setdefault(op, dict.fromkeys(RESULTADOS, 0))
+        conteo[resultado] += 1
+        if resultado == OK and latencia_s is not None:
+            self.histogramas.setdefault(op, Histograma()).registrar(latencia_s)
+        segundo = self.serie.setdefault(int(ahora), dict.fromkeys(RESULTADOS, 0))
+        segundo[resultado] += 1
+
+    def total(self, resultado: Optional[str] = None) -> int:
+        return sum(
+            sum(c.values()) if resultado is None else c.get(resultado, 0) for c in self.conteos.values()
+        )
+
+    def histograma_total(self) -> Histograma:
+        h = Histograma()
+        for hist in self.histogramas.values():
+            h.fusionar(hist)
+        return h
+
+    def duracion(self) -> float:
+        if self.inicio is None:
+            return 0.0
+        return max((self.fin or time.time()) - self.inicio, 0.0)
+
+    def fusionar(self, otra: "MetricasPS"):
+        for op, conteo in otra.conteos.items():
+            propio = self.conteos.setdefault(op, dict.fromkeys(RESULTADOS, 0))
+            for r, c in conteo.items():
+                propio[r] = propio.get(r, 0) + c
+        for op, hist in otra.histogramas.items():
+            self.histogramas.setdefault(op, Histograma()).fusionar(hist)
+        for seg, conteo in otra.serie.items():
+            propio = self.serie.setdefault(seg, dict.fromkeys(RESULTADOS, 0))
+            for r, c in conteo.items():
+                propio[r] = propio.get(r, 0) + c
+        self.respuestas_ocupado += otra.respuestas_ocupado
+        if otra.inicio is not None:
+            self.inicio = otra.inicio if self.inicio is None else min(self.inicio, otra.inicio)
+        if otra.fin is not None:
+            self.fin = otra.fin if self.fin is None else max(self.fin, otra.fin)
+        self.procesos += otra.procesos
+
+    # --- Salida ---
+
+    def _fila(self, op: str, conteo: Dict[str, int], hist: Optional[Histograma]) -> dict:
+        fila = {"op": op, **conteo}
+        for p in PERCENTILES:
+            v = hist.percentil(p) if hist else None
+            fila[f"p{p:g}_ms"] = round(v * 1000, 3) if v is not None else None
+        media = hist.media() if hist else None
+        fila["media_ms"] = round(media * 1000, 3) if media is not None else None
+        fila["max_ms"] = round(hist.max_us / 1000, 3) if hist and hist.max_us is not None else None
+        return fila
+
+    def resumen(self) -> List[dict]:
+        filas = [self._fila(op, self.conteos[op], self.histogramas.get(op)) for op in sorted(self.conteos)]
+        total = {r: self.total(r) for r in RESULTADOS}
+        filas.append(self._fila("TOTAL", total, self.histograma_total()))
+        return filas
+
+    def a_dict(self) -> dict:
+        return {
+            "inicio": self.inicio,
+            "fin": self.fin,
+            "procesos": self.procesos,
+            "respuestas_ocupado": self.respuestas_ocupado,
+            "conteos": self.conteos,
+            "histogramas": {op: h.a_dict() for op, h in self.histogramas.items()},
+            "serie": {str(k): v for k, v in sorted(self.serie.items())},
+        }
+
+    @classmethod
+    def desde_dict(cls, d: dict) -> "MetricasPS":
+        m = cls()
+        m.inicio, m.fin = d.get("inicio"), d.get("fin")
+        m.procesos = d.get("procesos", 1)
+        m.respuestas_ocupado = d.get("respuestas_ocupado", 0)
+        # Los JSON de versiones anteriores no traen todos los resultados
+        m.conteos = {op: {**dict.fromkeys(RESULTADOS, 0), **c} for op, c in d.get("conteos", {}).items()}
+        m.histogramas = {op: Histograma.desde_dict(h) for op, h in d.get("histogramas", {}).items()}
+        m.serie = {int(k): {**dict.fromkeys(RESULTADOS, 0), **v} for k, v in d.get("serie", {}).items()}
+        return m
+
+    def guardar_json(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.a_dict(), f)
+
+    @classmethod
+    def cargar_json(cls, path: str) -> "MetricasPS":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.desde_dict(json.load(f))
+
+    def guardar_csv(self, path: str):
+        """
+        Filas "resumen" (una por operación y TOTAL) y "serie" (una por segundo, relativo al inicio).
+        """
+        columnas = ["seccion", "op", "segundo", *RESULTADOS]
+        columnas += [f"p{p:g}_ms" for p in PERCENTILES] + ["media_ms", "max_ms"]
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            w = csv.DictWriter(f, fieldnames=columnas, restval="")
+            w.writeheader()
+            for fila in self.resumen():
+                w.writerow({"seccion": "resumen", **fila})
+            base = int(self.inicio) if self.inicio is not None else 0
+            for seg in sorted(self.serie):
+                w.writerow({"seccion": "serie", "op": "TOTAL", "segundo": seg - base, **self.serie[seg]})
+
+    def imprimir(self, label: str = ""):
+        dur = self.duracion()
+
+        def tasa(n: int) -> float:
+            return n / dur if dur > 0 else 0.0
+
+        total = self.total()
+        ok = self.total(OK)
+        rechazadas = self.total(RECHAZADA)
+        fallas = total - ok - rechazadas
+        print(
+            f"{label}[PS] Terminado. total={total} ok={ok} rechazada={rechazadas} fail={fallas} "
+            f"ocupado={self.respuestas_ocupado}"
+        )
+        print(f"{label}[METRICAS] Duración total = {dur:.4f}s")
+        print(
+            f"{label}[METRICAS] Throughput = {tasa(ok):.2f} ops/s ok, "
+            f"{tasa(self.total(RECHAZADA)):.2f} rechazada, {tasa(self.total(OCUPADO)):.2f} ocupado, "
+            f"{tasa(self.total(TIMEOUT)):.2f} timeout, {tasa(self.total(ERROR)):.2f} error (total={total})"
+        )
+        for fila in self.resumen():
+            if fila["p50_ms"] is None:
+                continue
+            pcts = ", ".join(f"p{p:g} = {fila[f'p{p:g}_ms'] / 1000:.4f}s" for p in PERCENTILES)
+            print(
+                f"{label}[METRICAS] Latencia {fila['op']} (n={fila['ok']}): "
+                f"media = {fila['media_ms'] / 1000:.4f}s, "
+                f"{pcts}, max = {fila['max_ms'] / 1000:.4f}s"
+            )
@@ -0,0 +1,79 @@
+import queue
+import threading
+import time
+import zlib
+from typing import Any, Callable, List
+
+
+def clave_orden(data: dict) -> str:
+    """
+    Operaciones con la misma clave se aplican en orden de llegada (p.ej. renovación y luego
+    devolución del mismo préstamo).
+    """
+    return f"{data.get('idLibro')}|{data.get('idUsuario')}"
+
+
+class PipelinePorClave:
+    """
+    Reparte mensajes entre N hilos, cada uno con su cola acotada y su propio cliente
+    (crear_cliente(), p.ej. un ClienteGA: los sockets ZMQ no se comparten entre hilos).
+    Todos los mensajes de una misma clave caen en el mismo hilo, así varias operaciones quedan
+    en vuelo a la vez sin que una adelante a otra de su misma clave.
+    Si la cola del hilo está llena, enviar() bloquea (contrapresión hacia el SUB).
+    """
+
+    def __init__(
+        self,
+        n_workers: int,
+        cola_max: int,
+        crear_cliente: Callable[[], Any],
+        manejar: Callable[[Any, dict], None],
+        nombre: str,
+    ):
+        self.nombre = nombre
+        self.crear_cliente = crear_cliente
+        self.manejar = manejar
+        self.colas: List[queue.Queue] = [queue.Queue(maxsize=cola_max) for _ in range(n_workers)]
+        self.hilos = [
+            threading.Thread(target=self._worker, args=(cola,), daemon=True) for cola in self.colas
+        ]
+
+    def iniciar(self):
+        for h in self.hilos:
+            h.start()
+
+    def enviar(self, data: dict):
+        idx = zlib.crc32(clave_orden(data).encode("utf-8")) % len(self.colas)
+        self.colas[idx].put(data)
+
+    def en_cola(self) -> int:
+        return sum(c.qsize() for c in self.colas)
+
+    def _worker(self, cola: queue.Queue):
+        cliente = self.crear_cliente()
+        try:
+            while True:
+                data = cola.get()
+                if data is None:
+                    break
+                try:
+                    self.manejar(cliente, data)
+                except Exception as e:
+                    print(f"[{self.nombre}][ERROR] Procesando {data.get('idSolicitud')}: {e}")
+        finally:
+            cliente.cerrar()
+
+    def cerrar(self, timeout_s: float = 5.0) -> bool:
+        """
+        Termina los hilos después de procesar lo ya encolado. Devuelve True si todos terminaron.
+        Todo (encolar el fin con la cola llena y esperar a los hilos) cabe en timeout_s.
+        """
+        fin = time.monotonic() + timeout_s
+        for cola in self.colas:
+            try:
+                cola.put(None, timeout=max(0.0, fin - time.monotonic()))
+            except queue.Full:
+                pass  # hilo trabado: no va a terminar a tiempo
+        for h in self.hilos:
+            h.join(max(0.0, fin - time.monotonic()))
+        return not any(h.is_alive() for h in self.hilos)
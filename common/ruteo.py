@@ -0,0 +1,95 @@
+import bisect
+import hashlib
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+def _hash(clave: str) -> int:
+    return int.from_bytes(hashlib.blake2b(clave.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class AnilloHash:
+    """
+    Hashing consistente con nodos virtuales: cada clave cae en el primer punto del anillo a partir
+    de su hash. Agregar o sacar un nodo sólo mueve ~1/N de las claves.
+    """
+
+    def __init__(self, nodos: List[str], virtuales: int = 100):
+        if not nodos:
+            raise ValueError("El anillo necesita al menos un nodo")
+        self.nodos = list(dict.fromkeys(nodos))
+        puntos: List[Tuple[int, str]] = sorted(
+            (_hash(f"{nodo}#{i}"), nodo) for nodo in self.nodos for i in range(virtuales)
+        )
+        self._hashes = [h for h, _ in puntos]
+        self._nodos = [n for _, n in puntos]
+
+    def sucesores(self, clave: str) -> List[str]:
+        """
+        Nodos distintos en el orden del anillo a partir de la clave: el primero es el dueño,
+        los siguientes son el orden de failover.
+        """
+        i = bisect.bisect(self._hashes, _hash(clave))
+        vistos: List[str] = []
+        for k in range(len(self._nodos)):
+            nodo = self._nodos[(i + k) % len(self._nodos)]
+            if nodo not in vistos:
+                vistos.append(nodo)
+                if len(vistos) == len(self.nodos):
+                    break
+        return vistos
+
+
+def parse_gc_sedes(spec: Optional[str]) -> Dict[str, str]:
+    """
+    "SEDE1=tcp://10.0.0.1:5555,SEDE2=tcp://10.0.0.2:5555" → {sede: endpoint del GC}.
+    """
+    sedes: Dict[str, str] = {}
+    for item in (spec or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        if "=" not in item:
+            raise ValueError(f"GC por sede inválido (se espera SEDE=endpoint): {item}")
+        sede, ep = item.split("=", 1)
+        sedes[sede.strip().upper()] = ep.strip()
+    return sedes
+
+
+class RuteoGC:
+    """
+    Elige a qué GC mandar cada solicitud cuando hay varios.
+    - modo "libro": hashing consistente sobre idLibro; las operaciones de un mismo libro van
+      siempre al mismo GC (y conservan su orden) mientras ese GC responda.
+    - modo "sede": el GC de la sede del mensaje (gc_sedes); las sedes sin GC propio usan el anillo.
+    Los demás GC, en orden del anillo, son el failover. Un GC que no respondió queda penalizado
+    `penalizacion_s` segundos y se prueba al final.
+    """
+
+    def __init__(
+        self,
+        endpoints: List[str],
+        modo: str = "libro",
+        gc_sedes: Optional[Dict[str, str]] = None,
+        penalizacion_s: float = 10.0,
+    ):
+        self.modo = modo
+        self.gc_sedes = gc_sedes or {}
+        self.anillo = AnilloHash(list(endpoints) + list(self.gc_sedes.values()))
+        self.penalizacion_s = penalizacion_s
+        self._caido_hasta: Dict[str, float] = {}
+
+    def candidatos(self, msg: dict) -> List[str]:
+        eps = self.anillo.sucesores(str(msg.get("idLibro") or msg.get("idSolicitud") or ""))
+        if self.modo == "sede":
+            propio = self.gc_sedes.get((msg.get("sede") or "").upper())
+            if propio:
+                eps = [propio] + [ep for ep in eps if ep != propio]
+        ahora = time.monotonic()
+        return sorted(eps, key=lambda ep: self._caido_hasta.get(ep, 0.0) > ahora)
+
+    def marcar_caido(self, ep: str):
+        self._caido_hasta[ep] = time.monotonic() + self.penalizacion_s
+
+    def marcar_ok(self, ep: str):
+        self._caido_hasta.pop(ep, None)
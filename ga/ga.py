@@ -1,9 +1,18 @@
 import argparse
+import hashlib
 import json
+import multiprocessing
 import os
+import signal
+import socket
 import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import nullcontext
+from dataclasses import dataclass, field, replace
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Dict, Iterable, List, Optional, Tuple
 
 import zmq
 
@@ -14,14 +23,100 @@ def iso_now() -> str:
     return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
 
 
-def connect(db_path: str) -> sqlite3.Connection:
+# Perfiles de almacenamiento seleccionables con --perfil-bd.
+# "default" deja el journaling de SQLite tal cual (rollback journal, synchronous=FULL).
+# "wal" evita el fsync por COMMIT del journal clásico y deja leer mientras se escribe.
+PERFILES_BD = {
+    "default": {},
+    "wal": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -64000,  # negativo = KiB (~64 MB)
+        "busy_timeout": 10000,
+        "temp_store": "MEMORY",
+    },
+}
+
+# Consultas calientes. Se definen una sola vez para que el caché de sentencias
+# de sqlite3 (cached_statements) las compile una vez y las reutilice en cada operación.
+SQL_IDEM_EXISTE = "SELECT 1 FROM applied_ops WHERE idempotencyKey = ?"
+# OR IGNORE: la existencia se comprueba con el propio INSERT (rowcount 0 = ya aplicada)
+SQL_IDEM_REGISTRAR = """
+    INSERT OR IGNORE INTO applied_ops(idempotencyKey, op, idSolicitud, timestamp)
+    VALUES (?,?,?,?)
+"""
+SQL_IDEM_CLAVES = "SELECT idempotencyKey FROM applied_ops"
+SQL_IDEM_CONTAR = "SELECT COUNT(*) FROM applied_ops"
+SQL_IDEM_CORTE = "SELECT rowid FROM applied_ops ORDER BY rowid DESC LIMIT 1 OFFSET ?"
+SQL_IDEM_PODAR = """
+    DELETE FROM applied_ops
+    WHERE rowid IN (SELECT rowid FROM applied_ops WHERE rowid <= ? LIMIT 5000)
+"""
+SQL_PRESTAMO_ACTIVO = """
+    SELECT idPrestamo
+    FROM prestamos
+    WHERE idLibro=? AND idUsuario=? AND sede=? AND estado='ACTIVO'
+    ORDER BY idPrestamo DESC
+    LIMIT 1
+"""
+SQL_MARCAR_DEVUELTO = "UPDATE prestamos SET estado='DEVUELTO', fecha_entrega=? WHERE idPrestamo=?"
+SQL_LIBERAR_EJEMPLAR = """
+    UPDATE libros
+    SET ejemplares_disponibles = MIN(ejemplares_totales, ejemplares_disponibles + 1)
+    WHERE idLibro=?
+"""
+SQL_RENOVAR = "UPDATE prestamos SET fecha_entrega=? WHERE idPrestamo=?"
+SQL_DISPONIBILIDAD = """
+    SELECT ejemplares_totales, ejemplares_disponibles
+    FROM libros
+    WHERE idLibro=? AND sede=?
+"""
+SQL_CREAR_PRESTAMO = """
+    INSERT INTO prestamos(idSolicitud, idUsuario, idLibro, sede, fecha_prestamo, fecha_entrega, estado)
+    VALUES (?,?,?,?,?,?,?)
+"""
+SQL_LOG_REGISTRAR = "INSERT INTO replication_log(payload) VALUES (?)"
+SQL_LOG_DESDE = "SELECT seq, payload FROM replication_log WHERE seq > ? ORDER BY seq LIMIT ?"
+SQL_LOG_MAX_SEQ = "SELECT COALESCE(MAX(seq), 0) FROM replication_log"
+SQL_LOG_MIN_SEQ = "SELECT MIN(seq) FROM replication_log"
+SQL_LOG_PODAR = "DELETE FROM replication_log WHERE seq <= ?"
+SQL_SEQ_APLICADA = "SELECT last_seq FROM replica_state WHERE id = 1"
+SQL_GUARDAR_SEQ = """
+    INSERT INTO replica_state(id, last_seq) VALUES (1, ?)
+    ON CONFLICT(id) DO UPDATE SET last_seq = excluded.last_seq
+"""
+SQL_TABLAS_REPLICACION = """
+    CREATE TABLE IF NOT EXISTS replication_log (
+      seq     INTEGER PRIMARY KEY AUTOINCREMENT,
+      payload TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS replica_state (
+      id       INTEGER PRIMARY KEY CHECK (id = 1),
+      last_seq INTEGER NOT NULL
+    );
+"""
+# Condicional: si no quedan ejemplares no toca la fila (rowcount 0), sin SELECT previo
+SQL_TOMAR_EJEMPLAR = """
+    UPDATE libros
+    SET ejemplares_disponibles = ejemplares_disponibles - 1
+    WHERE idLibro=? AND sede=? AND ejemplares_disponibles > 0
+"""
+SQL_LIBROS = "SELECT idLibro, sede, ejemplares_totales, ejemplares_disponibles FROM libros"
+SQL_LIBRO = "SELECT sede, ejemplares_totales, ejemplares_disponibles FROM libros WHERE idLibro=?"
+
+
+def connect(db_path: str, perfil: str = "default") -> sqlite3.Connection:
     con = sqlite3.connect(
         db_path,
         timeout=10,
         isolation_level=None,  # controlaremos las transacciones a mano con BEGIN/COMMIT/ROLLBACK
         check_same_thread=False,
+        cached_statements=256,
     )
     con.execute("PRAGMA foreign_keys = ON")
+    for pragma, valor in PERFILES_BD[perfil].items():
+        con.execute(f"PRAGMA {pragma} = {valor}")
     return con
 
 
@@ -36,21 +131,7 @@ def apply_idempotency(
     Registra la operación en applied_ops si no existe.
     Devuelve True si YA estaba aplicada (idempotente).
     """
-    cur = con.execute(
-        "SELECT 1 FROM applied_ops WHERE idempotencyKey = ?",
-        (key,),
-    )
-    if cur.fetchone():
-        return True
-
-    con.execute(
-        """
-        INSERT INTO applied_ops(idempotencyKey, op, idSolicitud, timestamp)
-        VALUES (?,?,?,?)
-        """,
-        (key, op, idSolicitud, ts),
-    )
-    return False
+    return con.execute(SQL_IDEM_REGISTRAR, (key, op, idSolicitud, ts)).rowcount == 0
 
 
 def op_devolucion(con: sqlite3.Connection, data: dict) -> dict:
@@ -60,16 +141,7 @@ def op_devolucion(con: sqlite3.Connection, data: dict) -> dict:
     ahora = data.get("timestamp") or iso_now()
 
     # Buscar préstamo ACTIVO
-    cur = con.execute(
-        """
-        SELECT idPrestamo
-        FROM prestamos
-        WHERE idLibro=? AND idUsuario=? AND sede=? AND estado='ACTIVO'
-        ORDER BY idPrestamo DESC
-        LIMIT 1
-        """,
-        (idLibro, idUsuario, sede),
-    )
+    cur = con.execute(SQL_PRESTAMO_ACTIVO, (idLibro, idUsuario, sede))
     row = cur.fetchone()
     if not row:
         return {"ok": True, "msg": "No había préstamo activo (idempotente)."}
@@ -77,18 +149,8 @@ def op_devolucion(con: sqlite3.Connection, data: dict) -> dict:
     idp = row[0]
 
     # Marcar DEVUELTO y liberar ejemplar
-    con.execute(
-        "UPDATE prestamos SET estado='DEVUELTO', fecha_entrega=? WHERE idPrestamo=?",
-        (ahora, idp),
-    )
-    con.execute(
-        """
-        UPDATE libros
-        SET ejemplares_disponibles = MIN(ejemplares_totales, ejemplares_disponibles + 1)
-        WHERE idLibro=?
-        """,
-        (idLibro,),
-    )
+    con.execute(SQL_MARCAR_DEVUELTO, (ahora, idp))
+    con.execute(SQL_LIBERAR_EJEMPLAR, (idLibro,))
 
     return {"ok": True, "msg": f"Devolución aplicada sobre préstamo {idp}"}
 
@@ -111,25 +173,13 @@ def op_renovacion(con: sqlite3.Connection, data: dict) -> dict:
             dt = datetime.now(timezone.utc)
         nueva = (dt + timedelta(days=7)).strftime("%Y-%m-%dT%H:%M:%SZ")
 
-    cur = con.execute(
-        """
-        SELECT idPrestamo
-        FROM prestamos
-        WHERE idLibro=? AND idUsuario=? AND sede=? AND estado='ACTIVO'
-        ORDER BY idPrestamo DESC
-        LIMIT 1
-        """,
-        (idLibro, idUsuario, sede),
-    )
+    cur = con.execute(SQL_PRESTAMO_ACTIVO, (idLibro, idUsuario, sede))
     row = cur.fetchone()
     if not row:
         return {"ok": False, "msg": "No hay préstamo activo para renovar."}
 
     idp = row[0]
-    con.execute(
-        "UPDATE prestamos SET fecha_entrega=? WHERE idPrestamo=?",
-        (nueva, idp),
-    )
+    con.execute(SQL_RENOVAR, (nueva, idp))
     return {"ok": True, "msg": f"Renovación aplicada sobre préstamo {idp} nueva_entrega={nueva}"}
 
 
@@ -144,21 +194,10 @@ def op_prestamo(con: sqlite3.Connection, data: dict) -> dict:
     ahora = data.get("timestamp") or iso_now()
     dias = int(data.get("dias", 14))
 
-    # Comprobar disponibilidad del libro
-    cur = con.execute(
-        """
-        SELECT ejemplares_totales, ejemplares_disponibles
-        FROM libros
-        WHERE idLibro=? AND sede=?
-        """,
-        (idLibro, sede),
-    )
-    row = cur.fetchone()
-    if not row:
-        return {"ok": False, "msg": f"Libro {idLibro} no existe en sede {sede}."}
-
-    tot, disp = row
-    if disp <= 0:
+    # Tomar el ejemplar; sólo si no se pudo se consulta el libro para explicar el rechazo
+    if con.execute(SQL_TOMAR_EJEMPLAR, (idLibro, sede)).rowcount == 0:
+        if con.execute(SQL_DISPONIBILIDAD, (idLibro, sede)).fetchone() is None:
+            return {"ok": False, "msg": f"Libro {idLibro} no existe en sede {sede}."}
         return {"ok": False, "msg": f"Sin ejemplares disponibles para {idLibro} en {sede}."}
 
     fecha_entrega = (
@@ -167,10 +206,7 @@ def op_prestamo(con: sqlite3.Connection, data: dict) -> dict:
     ).strftime("%Y-%m-%dT%H:%M:%SZ")
 
     con.execute(
-        """
-        INSERT INTO prestamos(idSolicitud, idUsuario, idLibro, sede, fecha_prestamo, fecha_entrega, estado)
-        VALUES (?,?,?,?,?,?,?)
-        """,
+        SQL_CREAR_PRESTAMO,
         (
             data.get("idSolicitud") or f"S-PREST-{idLibro}-{idUsuario}",
             idUsuario,
@@ -181,14 +217,6 @@ def op_prestamo(con: sqlite3.Connection, data: dict) -> dict:
             "ACTIVO",
         ),
     )
-    con.execute(
-        """
-        UPDATE libros
-        SET ejemplares_disponibles = ejemplares_disponibles - 1
-        WHERE idLibro=? AND sede=?
-        """,
-        (idLibro, sede),
-    )
 
     return {
         "ok": True,
@@ -197,39 +225,1081 @@ def op_prestamo(con: sqlite3.Connection, data: dict) -> dict:
     }
 
 
-def process_operation(con: sqlite3.Connection, data: dict) -> dict:
+OPERACIONES = {
+    "DEVOLUCION": op_devolucion,
+    "RENOVACION": op_renovacion,
+    "PRESTAMO": op_prestamo,
+}
+
+
+def asegurar_tablas_replicacion(con: sqlite3.Connection):
     """
-    Aplica la operación en UNA base de datos (primaria o réplica) respetando idempotencia.
+    Crea replication_log / replica_state en BDs creadas antes de que existieran en schema.sql.
+    """
+    con.executescript(SQL_TABLAS_REPLICACION)
+
+
+def leer_seq_aplicada(con: sqlite3.Connection) -> int:
+    row = con.execute(SQL_SEQ_APLICADA).fetchone()
+    return row[0] if row else 0
+
+
+class CacheDisponibilidad:
+    """
+    Copia en memoria de libros: idLibro -> (sede, totales, disponibles).
+    Se carga al arrancar y, tras cada COMMIT, se releen las filas de los libros tocados,
+    así los PRESTAMO sin ejemplares se rechazan sin consultar la tabla.
+    Sólo es válido si este proceso es el único que escribe la BD.
+    """
+
+    def __init__(self, con: sqlite3.Connection):
+        self._libros: Dict[str, Tuple[str, int, int]] = {}
+        self.rechazos = 0
+        for idLibro, sede, tot, disp in con.execute(SQL_LIBROS):
+            self._libros[idLibro] = (sede, tot, disp)
+
+    def __len__(self) -> int:
+        return len(self._libros)
+
+    def refrescar(self, con: sqlite3.Connection, lote: Iterable[dict]):
+        # RENOVACION no cambia disponibles
+        tocados = {d.get("idLibro") for d in lote if (d.get("op") or "").upper() in ("PRESTAMO", "DEVOLUCION")}
+        for idLibro in tocados:
+            fila = con.execute(SQL_LIBRO, (idLibro,)).fetchone()
+            if fila:
+                self._libros[idLibro] = tuple(fila)
+            else:
+                self._libros.pop(idLibro, None)
+
+    def rechazo(self, data: dict) -> Optional[dict]:
+        """
+        Respuesta de rechazo para un PRESTAMO que no puede aplicarse, o None si hay que intentarlo.
+        """
+        if (data.get("op") or "").upper() != "PRESTAMO":
+            return None
+        idLibro, sede = data.get("idLibro"), data.get("sede")
+        libro = self._libros.get(idLibro)
+        if libro is None or libro[0] != sede:
+            return {"ok": False, "msg": f"Libro {idLibro} no existe en sede {sede}."}
+        if libro[2] <= 0:
+            return {"ok": False, "msg": f"Sin ejemplares disponibles para {idLibro} en {sede}."}
+        return None
+
+    def verificar(self, con: sqlite3.Connection) -> dict:
+        """
+        Compara el caché con la tabla libros y devuelve las diferencias (máx. 20 de muestra).
+        """
+        en_tabla = {idLibro: (sede, tot, disp) for idLibro, sede, tot, disp in con.execute(SQL_LIBROS)}
+        diferencias = []
+        for idLibro in sorted(set(en_tabla) | set(self._libros)):
+            if en_tabla.get(idLibro) != self._libros.get(idLibro):
+                diferencias.append(
+                    {"idLibro": idLibro, "tabla": en_tabla.get(idLibro), "cache": self._libros.get(idLibro)}
+                )
+        return {
+            "ok": not diferencias,
+            "libros": len(en_tabla),
+            "rechazos_desde_cache": self.rechazos,
+            "total_diferencias": len(diferencias),
+            "diferencias": diferencias[:20],
+        }
+
+
+class FiltroBloom:
+    """
+    Filtro de Bloom sobre claves de texto: nunca da falsos negativos y, hasta su capacidad,
+    ~1% de falsos positivos (10 bits y 7 hashes por clave). Pasada la capacidad los falsos
+    positivos crecen rápido (ver `lleno`).
+    """
+
+    def __init__(self, capacidad: int):
+        self.bits = max(1 << 16, capacidad * 10)
+        self.k = 7
+        self.capacidad = self.bits // 10
+        self.claves = 0  # agregadas (las repetidas cuentan de nuevo: es una cota)
+        self._arr = bytearray((self.bits + 7) // 8)
+
+    @property
+    def lleno(self) -> bool:
+        return self.claves > self.capacidad
+
+    def _posiciones(self, clave: str):
+        h = hashlib.blake2b(clave.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(h[:8], "little")
+        h2 = int.from_bytes(h[8:], "little") | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.k)]
+
+    def agregar(self, clave: str):
+        self.claves += 1
+        for p in self._posiciones(clave):
+            self._arr[p >> 3] |= 1 << (p & 7)
+
+    def __contains__(self, clave: str) -> bool:
+        return all(self._arr[p >> 3] & (1 << (p & 7)) for p in self._posiciones(clave))
+
+
+class CacheIdempotencia:
+    """
+    Comprobación previa de duplicados sin ir a SQLite: LRU con TTL de las claves recientes y un
+    filtro de Bloom con todas las claves de applied_ops. Un "no" del filtro es definitivo; un
+    "quizás" que no está en el LRU se confirma con la tabla.
+    La garantía sigue siendo el INSERT OR IGNORE dentro de la transacción: si el caché se queda
+    atrás (workers en otros procesos, filtro en reconstrucción) sólo se pierde el atajo.
+    El filtro se reconstruye tras cada poda y también cuando se llena (reconstruir_si_lleno).
+    """
+
+    def __init__(self, con: sqlite3.Connection, capacidad: int, ttl_s: float):
+        self.capacidad = capacidad
+        self.ttl_s = ttl_s
+        self._recientes: "OrderedDict[str, float]" = OrderedDict()  # clave -> vence (monotonic)
+        self._candado = threading.Lock()
+        self._nuevo: Optional[FiltroBloom] = None  # filtro en reconstrucción (ver reconstruir)
+        self._reconstruccion = threading.Lock()  # una reconstrucción a la vez
+        self.aciertos = 0
+        self.negativos = 0
+        self.consultas_bd = 0
+        self._filtro = FiltroBloom(1)
+        self.reconstruir(con)
+
+    def _recordar(self, clave: str):
+        self._recientes[clave] = time.monotonic() + self.ttl_s
+        self._recientes.move_to_end(clave)
+        while len(self._recientes) > self.capacidad:
+            self._recientes.popitem(last=False)
+
+    def vista(self, con: sqlite3.Connection, clave: str) -> bool:
+        """
+        True si la clave ya está en applied_ops.
+        """
+        with self._candado:
+            vence = self._recientes.get(clave)
+            if vence is not None:
+                if vence > time.monotonic():
+                    self._recientes.move_to_end(clave)
+                    self.aciertos += 1
+                    return True
+                del self._recientes[clave]
+            if clave not in self._filtro:
+                self.negativos += 1
+                return False
+            self.consultas_bd += 1
+        if con.execute(SQL_IDEM_EXISTE, (clave,)).fetchone() is None:
+            return False
+        with self._candado:
+            self._recordar(clave)
+        return True
+
+    def registrar(self, claves: Iterable[str]):
+        """
+        Claves ya confirmadas (llamar después del COMMIT, nunca antes).
+        """
+        with self._candado:
+            for clave in claves:
+                self._filtro.agregar(clave)
+                if self._nuevo is not None:
+                    self._nuevo.agregar(clave)
+                self._recordar(clave)
+
+    def reconstruir(self, con: sqlite3.Connection):
+        """
+        Filtro nuevo a partir de applied_ops (tras podar: el de Bloom no permite borrar claves).
+        Lo que se registre mientras se recorre la tabla entra en ambos filtros.
+        """
+        with self._reconstruccion:
+            self._reconstruir(con)
+
+    def reconstruir_si_lleno(self, con: sqlite3.Connection) -> bool:
+        """
+        Reconstruye (al doble de las claves actuales) si el filtro pasó su capacidad, aunque no
+        haya poda. Si ya hay una reconstrucción en curso no espera. Devuelve si reconstruyó.
+        """
+        with self._candado:
+            if not self._filtro.lleno:
+                return False
+        if not self._reconstruccion.acquire(blocking=False):
+            return False
+        try:
+            with self._candado:
+                if not self._filtro.lleno:  # otro hilo acaba de reconstruir
+                    return False
+            self._reconstruir(con)
+        finally:
+            self._reconstruccion.release()
+        return True
+
+    def _reconstruir(self, con: sqlite3.Connection):
+        nuevo = FiltroBloom(max(2 * con.execute(SQL_IDEM_CONTAR).fetchone()[0], self.capacidad))
+        with self._candado:
+            self._nuevo = nuevo
+        cur = con.execute(SQL_IDEM_CLAVES)
+        while True:
+            filas = cur.fetchmany(5000)
+            if not filas:
+                break
+            with self._candado:
+                for (clave,) in filas:
+                    nuevo.agregar(clave)
+        with self._candado:
+            self._filtro, self._nuevo = nuevo, None
+
+    def estado(self) -> dict:
+        with self._candado:
+            return {
+                "recientes": len(self._recientes),
+                "capacidad": self.capacidad,
+                "ttl_s": self.ttl_s,
+                "bits_filtro": self._filtro.bits,
+                "claves_filtro": self._filtro.claves,
+                "capacidad_filtro": self._filtro.capacidad,
+                "aciertos_lru": self.aciertos,
+                "negativos_filtro": self.negativos,
+                "consultas_bd": self.consultas_bd,
+            }
+
+
+def podar_applied_ops(con: sqlite3.Connection, retener: int) -> int:
+    """
+    Borra de applied_ops todo salvo las `retener` claves más recientes, en tandas cortas para
+    no retener el candado de escritura. Devuelve cuántas filas se borraron.
+    """
+    fila = con.execute(SQL_IDEM_CORTE, (retener,)).fetchone()
+    if fila is None:
+        return 0
+    total = 0
+    while True:
+        borradas = con.execute(SQL_IDEM_PODAR, (fila[0],)).rowcount
+        total += borradas
+        if borradas < 5000:
+            return total
+
+
+class CompactadorIdempotencia:
+    """
+    Hilo de retención de applied_ops: cada `intervalo_s` conserva sólo las `retener` claves más
+    recientes. Un reintento que llegue después de que su clave se podó se aplicaría de nuevo,
+    así que `retener` debe cubrir con holgura la ventana de reintentos de PS y actores.
     """
+
+    def __init__(
+        self,
+        db_path: str,
+        perfil: str,
+        retener: int,
+        intervalo_s: float,
+        cache: Optional[CacheIdempotencia],
+    ):
+        self.db_path = db_path
+        self.perfil = perfil
+        self.retener = retener
+        self.intervalo_s = intervalo_s
+        self.cache = cache
+
+    def iniciar(self):
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def _loop(self):
+        con = connect(self.db_path, self.perfil)
+        while True:
+            time.sleep(self.intervalo_s)
+            try:
+                borradas = podar_applied_ops(con, self.retener)
+                if borradas:
+                    print(f"[GA][idem] {borradas} claves antiguas podadas de applied_ops")
+                    if self.cache is not None:
+                        self.cache.reconstruir(con)
+            except Exception as e:
+                print(f"[GA][idem][WARN] Fallo compactando applied_ops: {e}")
+
+
+def ya_aplicada(con: sqlite3.Connection, clave: str, idem: Optional[CacheIdempotencia] = None) -> bool:
+    if idem is not None:
+        return idem.vista(con, clave)
+    return con.execute(SQL_IDEM_EXISTE, (clave,)).fetchone() is not None
+
+
+def clave_idempotencia(data: dict) -> str:
     op = (data.get("op") or "").upper()
-    idem = data.get("idempotencyKey")
-    idsol = data.get("idSolicitud") or "?"
-    ts = data.get("timestamp") or iso_now()
+    return data.get("idempotencyKey") or f"NOIDEMP-{op}-{data.get('idSolicitud') or '?'}"
+
 
-    con.execute("BEGIN")
+def registra_idempotencia(data: dict) -> bool:
+    """
+    Si aplicar_operacion deja la clave en applied_ops (las op no soportadas se rechazan antes).
+    """
+    return (data.get("op") or "").upper() in OPERACIONES
+
+
+def registrar_idempotencia(con: sqlite3.Connection, idem: CacheIdempotencia, claves: List[str]):
+    """
+    Pasa al caché las claves ya confirmadas (después del COMMIT) y reconstruye el filtro si se llenó.
+    """
+    idem.registrar(claves)
+    if idem.reconstruir_si_lleno(con):
+        print(f"[GA] Filtro de idempotencia lleno: reconstruido ({idem.estado()['bits_filtro']} bits)")
 
-    if not idem:
-        idem = f"NOIDEMP-{op}-{idsol}"
+
+def aplicar_operacion(con: sqlite3.Connection, data: dict, log_replicacion: bool = False) -> dict:
+    """
+    Idempotencia + operación, dentro de la transacción que haya abierto el llamador.
+    Con log_replicacion, la operación aplicada se anota en replication_log en la misma transacción.
+    """
+    op = (data.get("op") or "").upper()
+    fn = OPERACIONES.get(op)
+    if fn is None:
+        return {"ok": False, "error": True, "msg": "op no soportada (Ent2)"}
+
+    idem = clave_idempotencia(data)
+    idsol = data.get("idSolicitud") or "?"
+    ts = data.get("timestamp") or iso_now()
 
     ya = apply_idempotency(con, idem, op, idsol, ts)
     if ya:
-        con.execute("COMMIT")
         return {"ok": True, "msg": "Ya aplicado (idempotente)."}
 
-    if op == "DEVOLUCION":
-        res = op_devolucion(con, data)
-    elif op == "RENOVACION":
-        res = op_renovacion(con, data)
-    elif op == "PRESTAMO":
-        res = op_prestamo(con, data)
-    else:
-        con.execute("ROLLBACK")
-        return {"ok": False, "msg": "op no soportada (Ent2)"}
+    res = fn(con, data)
+    if log_replicacion:
+        con.execute(SQL_LOG_REGISTRAR, (json.dumps(data),))
+    return res
+
 
-    con.execute("COMMIT")
+def process_operation(
+    con: sqlite3.Connection,
+    data: dict,
+    log_replicacion: bool = False,
+    candado: Optional[threading.Lock] = None,
+    cache: Optional[CacheDisponibilidad] = None,
+    idem: Optional[CacheIdempotencia] = None,
+) -> dict:
+    """
+    Aplica la operación en UNA base de datos (primaria o réplica) respetando idempotencia.
+    Los duplicados se detectan con una lectura previa (o con idem), sin tomar el candado de escritura.
+    Con cache/idem, los cachés se actualizan tras el COMMIT (dentro del candado).
+    """
+    clave = clave_idempotencia(data)
+    if ya_aplicada(con, clave, idem):
+        return {"ok": True, "msg": "Ya aplicado (idempotente)."}
+
+    with candado or nullcontext():
+        # IMMEDIATE: con varias conexiones escribiendo (workers, réplica) se espera el candado
+        # al inicio en vez de fallar con SQLITE_BUSY al pasar de lectura a escritura.
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            res = aplicar_operacion(con, data, log_replicacion)
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+        con.execute("COMMIT")
+        if cache is not None:
+            cache.refrescar(con, [data])
+        if idem is not None and registra_idempotencia(data):
+            registrar_idempotencia(con, idem, [clave])
     return res
 
 
+def process_batch(
+    con: sqlite3.Connection,
+    lote: List[dict],
+    log_replicacion: bool = False,
+    seq_aplicada: Optional[int] = None,
+    candado: Optional[threading.Lock] = None,
+    cache: Optional[CacheDisponibilidad] = None,
+    idem: Optional[CacheIdempotencia] = None,
+) -> List[dict]:
+    """
+    Group commit: aplica varias operaciones en UNA transacción (un solo fsync).
+    Cada operación corre en su propio SAVEPOINT, así un error sólo deshace esa operación
+    y el resto del lote se confirma. Devuelve un resultado por operación, en orden.
+    En una réplica, seq_aplicada se guarda en replica_state dentro de la misma transacción.
+    """
+    resultados = []
+    confirmadas = []  # claves que quedan en applied_ops si el COMMIT sale bien
+    with candado or nullcontext():
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            for data in lote:
+                con.execute("SAVEPOINT op")
+                try:
+                    res = aplicar_operacion(con, data, log_replicacion)
+                    con.execute("RELEASE op")
+                    if registra_idempotencia(data):
+                        confirmadas.append(clave_idempotencia(data))
+                except Exception as e:
+                    con.execute("ROLLBACK TO op")
+                    con.execute("RELEASE op")
+                    res = {"ok": False, "error": True, "msg": f"Error aplicando op: {e}"}
+                resultados.append(res)
+            if seq_aplicada is not None:
+                con.execute(SQL_GUARDAR_SEQ, (seq_aplicada,))
+            con.execute("COMMIT")
+        except Exception:
+            try:
+                con.execute("ROLLBACK")
+            except Exception:
+                pass
+            raise
+        if cache is not None:
+            cache.refrescar(con, lote)
+        if idem is not None:
+            registrar_idempotencia(con, idem, confirmadas)
+    return resultados
+
+
+class PodaLogReplicacion:
+    """
+    Poda de replication_log compartida por sus consumidores (réplica local y PUB de red): cada uno
+    informa hasta qué seq llegó y sólo se borra lo que ya consumieron todos, conservando además las
+    últimas `retener` entradas. Un consumidor que todavía no informó frena la poda.
+    Para el PUB de red (consumidor "red") cuenta lo que aplicaron los backups, que lo informan en
+    cada pedido de catch-up (ver servir_catchup); lo publicado sólo se usa mientras ningún backup
+    informó. Un backup que informó alguna vez frena la poda aunque se desconecte, así al volver
+    recupera lo que le falta por catch-up.
+    """
+
+    def __init__(self, retener: int):
+        self.retener = retener
+        self._seqs: Dict[str, Optional[int]] = {}
+        self._backups: Dict[str, int] = {}  # backup -> última seq aplicada que informó
+        self._podado_hasta = 0
+        self._candado = threading.Lock()
+
+    def registrar(self, consumidor: str):
+        with self._candado:
+            self._seqs[consumidor] = None
+
+    def avanzar(self, con: sqlite3.Connection, consumidor: str, seq: int):
+        with self._candado:
+            self._seqs[consumidor] = seq
+        self._podar(con)
+
+    def avanzar_backup(self, con: sqlite3.Connection, backup: str, seq: int):
+        with self._candado:
+            self._backups[backup] = max(seq, self._backups.get(backup, 0))
+        self._podar(con)
+
+    def _podar(self, con: sqlite3.Connection):
+        with self._candado:
+            seqs = dict(self._seqs)
+            if "red" in seqs and self._backups:
+                seqs["red"] = min(self._backups.values())
+            if not seqs or any(s is None for s in seqs.values()):
+                return
+            corte = min(seqs.values()) - self.retener
+            if corte - self._podado_hasta < 1000:
+                return
+            self._podado_hasta = corte
+        con.execute(SQL_LOG_PODAR, (corte,))
+
+
+class ReplicadorAsync:
+    """
+    Replicación asíncrona por log: el primario anota cada operación aplicada en replication_log
+    (misma transacción que la operación) y este hilo la aplica en la réplica por lotes, en orden
+    de seq. La última seq aplicada queda en replica_state de la réplica, así que tras un reinicio
+    se reanuda donde quedó. Las respuestas a los actores ya no esperan a la réplica.
+    """
+
+    def __init__(self, db_path: str, replica_path: str, perfil: str, lote: int, poda: PodaLogReplicacion):
+        self.db_path = db_path
+        self.replica_path = replica_path
+        self.perfil = perfil
+        self.lote = lote
+        self.poda = poda
+        poda.registrar("replica")
+        self.hay_nuevas = threading.Event()
+        self.seq_log = 0
+        self.seq_replica = 0
+
+    def notificar(self):
+        self.hay_nuevas.set()
+
+    def estado(self) -> dict:
+        return {
+            "seq_log": self.seq_log,
+            "seq_replica": self.seq_replica,
+            "lag": max(0, self.seq_log - self.seq_replica),
+        }
+
+    def iniciar(self):
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def _loop(self):
+        fuente = connect(self.db_path, self.perfil)
+        destino = connect(self.replica_path, self.perfil)
+        asegurar_tablas_replicacion(destino)
+        self.seq_replica = leer_seq_aplicada(destino)
+        print(f"[GA][repl] Réplica {self.replica_path} en seq={self.seq_replica}")
+
+        primera = fuente.execute(SQL_LOG_MIN_SEQ).fetchone()[0]
+        if primera is not None and primera > self.seq_replica + 1:
+            print(
+                f"[GA][repl][WARN] El log empieza en seq={primera} y la réplica va en {self.seq_replica}: "
+                "faltan operaciones, re-inicializa la réplica desde la BD primaria."
+            )
+
+        while True:
+            self.hay_nuevas.wait(0.5)
+            self.hay_nuevas.clear()
+            while True:
+                self.seq_log = fuente.execute(SQL_LOG_MAX_SEQ).fetchone()[0]
+                filas = fuente.execute(SQL_LOG_DESDE, (self.seq_replica, self.lote)).fetchall()
+                if not filas:
+                    break
+                try:
+                    process_batch(destino, [json.loads(p) for _, p in filas], seq_aplicada=filas[-1][0])
+                except Exception as e:
+                    print(f"[GA][repl][WARN] Fallo aplicando seq {filas[0][0]}..{filas[-1][0]} en réplica: {e}")
+                    time.sleep(1.0)
+                    break
+                self.seq_replica = filas[-1][0]
+                print(f"[GA][repl] Réplica OK hasta seq={self.seq_replica} (lag={self.estado()['lag']})")
+
+            self.poda.avanzar(fuente, "replica", self.seq_replica)
+
+
+class PublicadorReplicacion:
+    """
+    Replicación por red: publica las entradas nuevas de replication_log por un PUB
+    (tópico REPL) hacia uno o más GA backup, en lotes y con su seq. Cada segundo sin
+    tráfico envía un latido con la última seq del log para que los backups midan su lag
+    y detecten huecos (que recuperan por el canal de catch-up, ver servir_catchup).
+    """
+
+    def __init__(
+        self, ctx: zmq.Context, db_path: str, perfil: str, pub_addr: str, lote: int, poda: PodaLogReplicacion
+    ):
+        self.ctx = ctx
+        self.db_path = db_path
+        self.perfil = perfil
+        self.pub_addr = pub_addr
+        self.lote = lote
+        self.poda = poda
+        poda.registrar("red")
+        self.hay_nuevas = threading.Event()
+        self.seq_log = 0
+        self.seq_publicada = 0
+
+    def notificar(self):
+        self.hay_nuevas.set()
+
+    def estado(self) -> dict:
+        return {"seq_log": self.seq_log, "seq_publicada": self.seq_publicada}
+
+    def iniciar(self):
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def _loop(self):
+        fuente = connect(self.db_path, self.perfil)
+        pub = self.ctx.socket(zmq.PUB)
+        pub.setsockopt(zmq.LINGER, 0)
+        pub.bind(self.pub_addr)
+        # Los backups que llegan tarde piden lo anterior por catch-up
+        self.seq_publicada = self.seq_log = fuente.execute(SQL_LOG_MAX_SEQ).fetchone()[0]
+        print(f"[GA][repl] PUB de replicación en {self.pub_addr} desde seq={self.seq_publicada}")
+
+        def publicar(entradas: list):
+            m = {"seq_log": self.seq_log, "entradas": entradas}
+            pub.send_multipart([b"REPL", json.dumps(m).encode("utf-8")])
+
+        try:
+            while True:
+                if not self.hay_nuevas.wait(1.0):
+                    publicar([])  # latido
+                self.hay_nuevas.clear()
+                while True:
+                    self.seq_log = fuente.execute(SQL_LOG_MAX_SEQ).fetchone()[0]
+                    filas = fuente.execute(SQL_LOG_DESDE, (self.seq_publicada, self.lote)).fetchall()
+                    if not filas:
+                        break
+                    publicar([[seq, payload] for seq, payload in filas])
+                    self.seq_publicada = filas[-1][0]
+
+                self.poda.avanzar(fuente, "red", self.seq_publicada)
+        except zmq.ContextTerminated:
+            pass  # el GA está saliendo
+        finally:
+            pub.close(0)
+
+
+def servir_catchup(
+    ctx: zmq.Context,
+    bind_addr: str,
+    db_path: str,
+    perfil: str,
+    lote_max: int,
+    poda: Optional[PodaLogReplicacion] = None,
+):
+    """
+    REP de catch-up del primario: {'type':'catchup','desde':S,'max':N} devuelve las entradas
+    del log con seq > S. Si el log ya fue podado por debajo de S+1 lo indica con ok=False.
+    Con 'backup' en el pedido, S es lo que ese backup ya aplicó y se informa a la poda.
+    """
+    fuente = connect(db_path, perfil)
+    rep = ctx.socket(zmq.REP)
+    rep.setsockopt(zmq.LINGER, 0)
+    rep.bind(bind_addr)
+    print(f"[GA][repl] Catch-up REP en {bind_addr}")
+    try:
+        while True:
+            req = rep.recv_json()
+            try:
+                desde = int(req.get("desde", 0))
+                n = min(int(req.get("max", lote_max)), lote_max)
+                if poda is not None and req.get("backup"):
+                    poda.avanzar_backup(fuente, str(req["backup"]), desde)
+                primera = fuente.execute(SQL_LOG_MIN_SEQ).fetchone()[0]
+                seq_log = fuente.execute(SQL_LOG_MAX_SEQ).fetchone()[0]
+                if primera is not None and primera > desde + 1:
+                    rep.send_json({"ok": False, "msg": "log podado", "primera": primera, "seq_log": seq_log})
+                    continue
+                filas = fuente.execute(SQL_LOG_DESDE, (desde, n)).fetchall()
+                rep.send_json({"ok": True, "seq_log": seq_log, "entradas": [[seq, p] for seq, p in filas]})
+            except zmq.ContextTerminated:
+                raise
+            except Exception as e:
+                rep.send_json({"ok": False, "msg": f"catch-up falló: {e}"})
+    except zmq.ContextTerminated:
+        pass  # el GA está saliendo
+    finally:
+        rep.close(0)
+
+
+class ReceptorReplicacion:
+    """
+    Lado backup de la replicación por red: se suscribe al PUB del primario y aplica las
+    entradas en su BD por lotes (process_batch + replica_state). Al arrancar, al detectar
+    un hueco de seq o cuando un latido anuncia entradas que no llegaron, pide el rango
+    faltante por el canal de catch-up. Además pide catch-up cada PROGRESO_S aunque esté al día:
+    así el primario sabe hasta dónde aplicó y no poda lo que todavía le falta.
+    """
+
+    PROGRESO_S = 2.0
+
+    def __init__(self, ctx: zmq.Context, db_path: str, perfil: str, sub_addr: str, sync_addr: str, lote: int):
+        self.ctx = ctx
+        # Identifica a este backup ante el primario (estable entre reinicios)
+        self.nombre = f"{socket.gethostname()}:{os.path.abspath(db_path)}"
+        self.db_path = db_path
+        self.perfil = perfil
+        self.sub_addr = sub_addr
+        self.sync_addr = sync_addr
+        self.lote = lote
+        self.seq_primario = 0
+        self.seq_aplicada = 0
+
+    def estado(self) -> dict:
+        return {
+            "seq_primario": self.seq_primario,
+            "seq_aplicada": self.seq_aplicada,
+            "lag": max(0, self.seq_primario - self.seq_aplicada),
+        }
+
+    def iniciar(self):
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def _aplicar(self, con: sqlite3.Connection, entradas: list):
+        process_batch(con, [json.loads(p) for _, p in entradas], seq_aplicada=entradas[-1][0])
+        self.seq_aplicada = entradas[-1][0]
+        print(f"[GA][repl] Aplicado hasta seq={self.seq_aplicada} (lag={self.estado()['lag']})")
+
+    def _ponerse_al_dia(self, con: sqlite3.Connection):
+        req = self.ctx.socket(zmq.REQ)
+        req.setsockopt(zmq.LINGER, 0)
+        req.setsockopt(zmq.RCVTIMEO, 5000)
+        req.connect(self.sync_addr)
+        try:
+            while True:
+                req.send_json(
+                    {"type": "catchup", "desde": self.seq_aplicada, "max": self.lote, "backup": self.nombre}
+                )
+                resp = req.recv_json()
+                if not resp.get("ok"):
+                    print(f"[GA][repl][WARN] Catch-up rechazado: {resp}. Re-inicializa este backup desde el primario.")
+                    return
+                self.seq_primario = max(self.seq_primario, resp.get("seq_log", 0))
+                entradas = resp.get("entradas") or []
+                if not entradas:
+                    return
+                self._aplicar(con, entradas)
+        except zmq.Again:
+            print(f"[GA][repl][WARN] Primario {self.sync_addr} no responde al catch-up")
+        finally:
+            req.close(0)
+
+    def _loop(self):
+        con = connect(self.db_path, self.perfil)
+        asegurar_tablas_replicacion(con)
+        self.seq_aplicada = leer_seq_aplicada(con)
+        sub = self.ctx.socket(zmq.SUB)
+        sub.setsockopt(zmq.LINGER, 0)
+        sub.connect(self.sub_addr)
+        sub.setsockopt(zmq.SUBSCRIBE, b"REPL")
+        print(f"[GA][repl] SUB de replicación a {self.sub_addr} desde seq={self.seq_aplicada}")
+        try:
+            self._ponerse_al_dia(con)
+            informado = time.monotonic()
+            while True:
+                if time.monotonic() - informado >= self.PROGRESO_S:
+                    self._ponerse_al_dia(con)  # informa el progreso (y trae lo que falte)
+                    informado = time.monotonic()
+                if not sub.poll(3000):
+                    # Ni datos ni latidos: reintentar catch-up por si el primario volvió
+                    self._ponerse_al_dia(con)
+                    informado = time.monotonic()
+                    continue
+                _, raw = sub.recv_multipart()
+                m = json.loads(raw.decode("utf-8"))
+                self.seq_primario = max(self.seq_primario, m.get("seq_log", 0))
+                entradas = [e for e in m.get("entradas") or [] if e[0] > self.seq_aplicada]
+                try:
+                    if entradas and entradas[0][0] != self.seq_aplicada + 1:
+                        # Hueco (backup recién conectado o PUB descartó mensajes)
+                        self._ponerse_al_dia(con)
+                        entradas = [e for e in entradas if e[0] > self.seq_aplicada]
+                    if entradas:
+                        self._aplicar(con, entradas)
+                    elif self.seq_primario > self.seq_aplicada:
+                        self._ponerse_al_dia(con)
+                except zmq.ContextTerminated:
+                    raise
+                except Exception as e:
+                    print(f"[GA][repl][WARN] Fallo aplicando replicación: {e}")
+                    time.sleep(1.0)
+        except zmq.ContextTerminated:
+            pass  # el GA está saliendo
+        finally:
+            sub.close(0)
+
+
+@dataclass
+class EstadoGA:
+    con: sqlite3.Connection
+    role: str
+    replica_con: Optional[sqlite3.Connection] = None  # réplica síncrona (modo clásico)
+    replicador: Optional[ReplicadorAsync] = None  # réplica asíncrona por log (archivo local)
+    publicador: Optional[PublicadorReplicacion] = None  # réplica por red hacia GA backup
+    receptor: Optional[ReceptorReplicacion] = None  # backup: recibe la réplica por red
+    # Compartido por los workers: serializa los escritores en el proceso (sin los reintentos
+    # con espera del busy handler de SQLite); las lecturas no lo toman.
+    escritura: threading.Lock = field(default_factory=threading.Lock)
+
+    registrar_log: bool = False  # worker en otro proceso: anota el log que drena el proceso principal
+    sede: Optional[str] = None  # shard: sólo atiende operaciones de esta sede
+    disponibilidad: Optional[CacheDisponibilidad] = None  # compartido por los workers en hilos
+    idempotencia: Optional[CacheIdempotencia] = None  # ídem
+
+    @property
+    def log_replicacion(self) -> bool:
+        return self.registrar_log or self.replicador is not None or self.publicador is not None
+
+    def notificar_replicacion(self):
+        for r in (self.replicador, self.publicador):
+            if r is not None:
+                r.notificar()
+
+
+def fuera_de_shard(ga: EstadoGA, data: dict) -> Optional[dict]:
+    """
+    Con --sede, rechaza las operaciones de otra sede en vez de aplicarlas en un shard equivocado.
+    """
+    sede = (data.get("sede") or "").upper()
+    if ga.sede is None or sede == ga.sede:
+        return None
+    return {
+        "ok": False,
+        "error": True,
+        "msg": f"Este GA atiende sólo {ga.sede}; la operación es de {sede or '?'}.",
+    }
+
+
+def rechazo_desde_cache(ga: EstadoGA, data: dict) -> Optional[dict]:
+    """
+    Rechazo de un PRESTAMO resuelto con el caché de disponibilidad, sin transacción.
+    Un reintento de un préstamo ya aplicado no se rechaza: debe seguir respondiendo "Ya aplicado".
+    """
+    if ga.disponibilidad is None:
+        return None
+    rechazo = ga.disponibilidad.rechazo(data)
+    if rechazo is None or ya_aplicada(ga.con, clave_idempotencia(data), ga.idempotencia):
+        return None
+    ga.disponibilidad.rechazos += 1
+    return rechazo
+
+
+def atender_admin(ga: EstadoGA, data: dict) -> dict:
+    """
+    Mensajes de administración ({'type': ...}) que no son operaciones de negocio.
+    """
+    tipo = data.get("type")
+    if tipo == "estado_replicacion":
+        if ga.receptor is not None:
+            return dict(ga.receptor.estado(), ok=True, role=ga.role, modo="red")
+        if ga.replicador is not None or ga.publicador is not None:
+            estado = {"ok": True, "role": ga.role, "modo": "async"}
+            if ga.publicador is not None:
+                estado["red"] = ga.publicador.estado()
+            if ga.replicador is not None:
+                estado.update(ga.replicador.estado())
+            return estado
+        return {
+            "ok": True,
+            "role": ga.role,
+            "modo": "sync" if ga.replica_con is not None else ("replica" if ga.role == "backup" else "sin-replica"),
+            "seq_aplicada": leer_seq_aplicada(ga.con),
+        }
+    if tipo == "verificar_cache":
+        if ga.disponibilidad is None:
+            return {"ok": False, "msg": "Caché de disponibilidad desactivado (--cache-disponibilidad)."}
+        # Con el candado de escritura: ningún worker está entre un COMMIT y su refresco del caché
+        with ga.escritura:
+            return ga.disponibilidad.verificar(ga.con)
+    if tipo == "estado_idempotencia":
+        estado = {"ok": True, "applied_ops": ga.con.execute(SQL_IDEM_CONTAR).fetchone()[0]}
+        if ga.idempotencia is not None:
+            estado.update(ga.idempotencia.estado())
+        return estado
+    return {"ok": False, "msg": f"type no soportado: {tipo}"}
+
+
+def servir_rep(rep: zmq.Socket, ga: EstadoGA):
+    """
+    Modo clásico: una operación y un COMMIT por mensaje.
+    """
+    while True:
+        raw = rep.recv()
+        try:
+            data = json.loads(raw.decode("utf-8"))
+        except Exception as e:
+            rep.send_string(json.dumps({"ok": False, "error": True, "msg": f"JSON inválido: {e}"}))
+            continue
+
+        if "type" in data:
+            rep.send_string(json.dumps(atender_admin(ga, data)))
+            continue
+
+        op = (data.get("op") or "").upper()
+        idsol = data.get("idSolicitud") or "?"
+        print(f"[GA][{ga.role}] op={op} id={idsol}")
+
+        rechazo = fuera_de_shard(ga, data)
+        if rechazo is not None:
+            rep.send_string(json.dumps(rechazo))
+            print(f"[GA][WARN] {op} id={idsol} → {rechazo}")
+            continue
+
+        rechazo = rechazo_desde_cache(ga, data)
+        if rechazo is not None:
+            rep.send_string(json.dumps(rechazo))
+            print(f"[GA] {op} id={idsol} → {rechazo} (caché)")
+            continue
+
+        try:
+            # Aplica en la BD de este GA
+            res = process_operation(
+                ga.con, data, ga.log_replicacion, ga.escritura, ga.disponibilidad, ga.idempotencia
+            )
+
+            # Si soy primario y tengo réplica, replico la misma operación
+            if ga.role == "primary" and ga.replica_con is not None:
+                try:
+                    _ = process_operation(ga.replica_con, data, candado=ga.escritura)
+                    print(f"[GA] Réplica OK para id={idsol}")
+                except Exception as e_rep:
+                    print(f"[GA][WARN] Fallo replicando en BD réplica: {e_rep}")
+            else:
+                ga.notificar_replicacion()
+
+            rep.send_string(json.dumps(res))
+            print(f"[GA] {op} id={idsol} → {res}")
+        except Exception as e:
+            try:
+                ga.con.execute("ROLLBACK")
+            except Exception:
+                pass
+            rep.send_string(json.dumps({"ok": False, "error": True, "msg": f"Error aplicando op: {e}"}))
+            print(f"[GA] Error aplicando {op} id={idsol}: {e}")
+
+
+def recibir_lote(sock: zmq.Socket, lote_max: int, ventana_ms: float) -> List[List[bytes]]:
+    """
+    Espera el primer mensaje y luego junta lo que llegue hasta completar lote_max
+    o agotar la ventana. Cada elemento son los frames completos (sobre + payload).
+    """
+    mensajes = [sock.recv_multipart()]
+    limite = time.monotonic() + ventana_ms / 1000.0
+    while len(mensajes) < lote_max:
+        try:
+            mensajes.append(sock.recv_multipart(zmq.NOBLOCK))
+            continue
+        except zmq.Again:
+            pass
+        restante_ms = (limite - time.monotonic()) * 1000.0
+        if restante_ms <= 0 or not sock.poll(restante_ms, zmq.POLLIN):
+            break
+    return mensajes
+
+
+def servir_lotes(sock: zmq.Socket, ga: EstadoGA, lote_max: int, ventana_ms: float):
+    """
+    Modo group commit sobre un ROUTER: drena las operaciones encoladas, las aplica con
+    process_batch (una transacción por lote) y responde a cada solicitante por separado.
+    """
+    def responder(envelope: List[bytes], res: dict):
+        sock.send_multipart(envelope + [json.dumps(res).encode("utf-8")])
+
+    while True:
+        mensajes = recibir_lote(sock, lote_max, ventana_ms)
+
+        sobres, lote = [], []
+        for frames in mensajes:
+            envelope, raw = frames[:-1], frames[-1]
+            try:
+                data = json.loads(raw.decode("utf-8"))
+            except Exception as e:
+                responder(envelope, {"ok": False, "error": True, "msg": f"JSON inválido: {e}"})
+                continue
+            if "type" in data:
+                responder(envelope, atender_admin(ga, data))
+                continue
+            rechazo = fuera_de_shard(ga, data) or rechazo_desde_cache(ga, data)
+            if rechazo is not None:
+                responder(envelope, rechazo)
+                continue
+            if ga.idempotencia is not None and ga.idempotencia.vista(ga.con, clave_idempotencia(data)):
+                responder(envelope, {"ok": True, "msg": "Ya aplicado (idempotente)."})
+                continue
+            sobres.append(envelope)
+            lote.append(data)
+
+        if not lote:
+            continue
+
+        try:
+            resultados = process_batch(
+                ga.con,
+                lote,
+                ga.log_replicacion,
+                candado=ga.escritura,
+                cache=ga.disponibilidad,
+                idem=ga.idempotencia,
+            )
+        except Exception as e:
+            print(f"[GA] Error confirmando lote de {len(lote)} ops: {e}")
+            resultados = [{"ok": False, "error": True, "msg": f"Error aplicando op: {e}"}] * len(lote)
+        else:
+            if ga.role == "primary" and ga.replica_con is not None:
+                try:
+                    process_batch(ga.replica_con, lote, candado=ga.escritura)
+                    print(f"[GA] Réplica OK para lote de {len(lote)} ops")
+                except Exception as e_rep:
+                    print(f"[GA][WARN] Fallo replicando lote en BD réplica: {e_rep}")
+            else:
+                ga.notificar_replicacion()
+
+        print(f"[GA][{ga.role}] lote de {len(lote)} ops confirmado")
+        for envelope, data, res in zip(sobres, lote, resultados):
+            responder(envelope, res)
+            print(f"[GA] {(data.get('op') or '').upper()} id={data.get('idSolicitud') or '?'} → {res}")
+
+
+def _worker_proceso(backend_addr: str, n: int, args: argparse.Namespace, db_path: str, role: str):
+    """
+    Worker en proceso aparte (evita el GIL): su propio contexto ZMQ y su propia conexión SQLite.
+    """
+    ctx = zmq.Context()
+    con = connect(db_path, args.perfil_bd)
+    replica_con = None
+    if role == "primary" and args.db_replica and args.replicacion == "sync":
+        replica_con = connect(args.db_replica, args.perfil_bd)
+    # El log de replicación lo drena el hilo del proceso principal (sondea la tabla)
+    log_replicacion = role == "primary" and (
+        bool(args.repl_pub) or (bool(args.db_replica) and args.replicacion == "async")
+    )
+    ga = EstadoGA(con=con, role=role, replica_con=replica_con, registrar_log=log_replicacion, sede=args.sede)
+    if args.idem_cache > 0:
+        ga.idempotencia = CacheIdempotencia(con, args.idem_cache, args.idem_ttl_s)
+    sock = ctx.socket(zmq.DEALER if args.lote_max > 1 else zmq.REP)
+    sock.connect(backend_addr)
+    print(f"[GA] Worker {n} listo (pid {os.getpid()})")
+    try:
+        if args.lote_max > 1:
+            servir_lotes(sock, ga, args.lote_max, args.lote_ventana_ms)
+        else:
+            servir_rep(sock, ga)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sock.close(0)
+        ctx.term()
+
+
+def servir_workers(ctx: zmq.Context, front: zmq.Socket, ga: EstadoGA, args: argparse.Namespace, db_path: str):
+    """
+    Pool de N workers detrás de un proxy ROUTER/DEALER. Cada worker tiene su propia conexión
+    SQLite (y su propia conexión a la réplica síncrona, si hay), así las lecturas corren en
+    paralelo y sólo las escrituras compiten por el candado de SQLite.
+    Con --workers-modo procesos cada worker es un proceso (sin GIL); con hilos comparten proceso.
+    """
+    backend = ctx.socket(zmq.DEALER)
+    if args.workers_modo == "procesos":
+        backend_addr = f"tcp://127.0.0.1:{backend.bind_to_random_port('tcp://127.0.0.1')}"
+        for n in range(1, args.workers + 1):
+            # spawn: un fork heredaría el contexto ZMQ y los sockets ya bindeados del padre
+            multiprocessing.get_context("spawn").Process(
+                target=_worker_proceso,
+                args=(backend_addr, n, args, db_path, ga.role),
+                daemon=True,
+            ).start()
+    else:
+        backend.bind("inproc://ga-workers")
+
+        def worker(n: int):
+            con = connect(db_path, args.perfil_bd)
+            replica_con = connect(args.db_replica, args.perfil_bd) if ga.replica_con is not None else None
+            propio = replace(ga, con=con, replica_con=replica_con)
+            # Con group commit el worker usa DEALER: recibe el sobre completo y puede juntar varias ops
+            sock = ctx.socket(zmq.DEALER if args.lote_max > 1 else zmq.REP)
+            sock.connect("inproc://ga-workers")
+            print(f"[GA] Worker {n} listo")
+            try:
+                if args.lote_max > 1:
+                    servir_lotes(sock, propio, args.lote_max, args.lote_ventana_ms)
+                else:
+                    servir_rep(sock, propio)
+            except zmq.ContextTerminated:
+                pass
+            finally:
+                sock.close(0)
+                con.close()
+                if replica_con is not None:
+                    replica_con.close()
+
+        for n in range(1, args.workers + 1):
+            threading.Thread(target=worker, args=(n,), daemon=True).start()
+
+    # Proxy ROUTER/DEALER. No se usa zmq.proxy porque no retorna ante señales (SIGTERM/Ctrl+C).
+    poller = zmq.Poller()
+    poller.register(front, zmq.POLLIN)
+    poller.register(backend, zmq.POLLIN)
+    try:
+        while True:
+            socks = dict(poller.poll(1000))
+            for origen, destino in ((front, backend), (backend, front)):
+                if origen not in socks:
+                    continue
+                while True:
+                    try:
+                        destino.send_multipart(origen.recv_multipart(zmq.NOBLOCK))
+                    except zmq.Again:
+                        break
+    finally:
+        backend.close(0)
+
+
+def _terminar(signum, frame):
+    # SIGTERM como Ctrl+C: cierra sockets y termina los workers en proceso
+    raise KeyboardInterrupt
+
+
 def main():
     ap = argparse.ArgumentParser(description="Gestor de Almacenamiento (GA) con réplica y PRESTAMO")
     ap.add_argument(
@@ -254,7 +1324,137 @@ def main():
         default="primary",
         help="Rol de este GA: primary (aplica ops y replica) o backup (sólo aplica en su propia BD).",
     )
+    ap.add_argument(
+        "--lote-max",
+        dest="lote_max",
+        type=int,
+        default=1,
+        help="Máximo de operaciones por transacción (group commit). 1 = un COMMIT por operación.",
+    )
+    ap.add_argument(
+        "--lote-ventana-ms",
+        dest="lote_ventana_ms",
+        type=float,
+        default=0.0,
+        help="Tiempo máximo esperando más operaciones para completar un lote (ms). "
+        "0 = sólo drena lo que ya está encolado en el socket.",
+    )
+    ap.add_argument(
+        "--perfil-bd",
+        dest="perfil_bd",
+        choices=sorted(PERFILES_BD),
+        default="default",
+        help="Configuración de SQLite: default (journal clásico) o wal (WAL, synchronous=NORMAL, mmap, caché).",
+    )
+    ap.add_argument(
+        "--replicacion",
+        choices=["sync", "async"],
+        default="sync",
+        help="sync: replica cada operación antes de responder. "
+        "async: log de replicación + hilo que lo aplica en la réplica por lotes.",
+    )
+    ap.add_argument(
+        "--repl-lote",
+        dest="repl_lote",
+        type=int,
+        default=256,
+        help="Máximo de entradas del log aplicadas por transacción en la réplica (modo async).",
+    )
+    ap.add_argument(
+        "--repl-retener",
+        dest="repl_retener",
+        type=int,
+        default=10000,
+        help="Entradas ya replicadas que se conservan en replication_log (modo async).",
+    )
+    # Replicación por red hacia GA backup en otra máquina
+    ap.add_argument(
+        "--repl-pub",
+        dest="repl_pub",
+        default=None,
+        help="(primary) Bind PUB donde se publica el log de replicación (p.ej. tcp://*:5575)",
+    )
+    ap.add_argument(
+        "--repl-sync",
+        dest="repl_sync",
+        default=None,
+        help="(primary) Bind REP de catch-up para backups atrasados (p.ej. tcp://*:5576)",
+    )
+    ap.add_argument(
+        "--repl-sub",
+        dest="repl_sub",
+        default=None,
+        help="(backup) PUB de replicación del primario (p.ej. tcp://10.0.0.1:5575)",
+    )
+    ap.add_argument(
+        "--repl-sync-primario",
+        dest="repl_sync_primario",
+        default=None,
+        help="(backup) REP de catch-up del primario (p.ej. tcp://10.0.0.1:5576)",
+    )
+    ap.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Hilos que atienden operaciones, cada uno con su conexión SQLite (ROUTER/DEALER). "
+        "1 = un solo socket y una conexión.",
+    )
+    ap.add_argument(
+        "--workers-modo",
+        dest="workers_modo",
+        choices=["hilos", "procesos"],
+        default="hilos",
+        help="hilos: workers en este proceso. procesos: un proceso por worker (sin GIL).",
+    )
+    ap.add_argument(
+        "--sede",
+        type=str.upper,
+        default=None,
+        help="Shard: este GA sólo atiende operaciones de esa sede (p.ej. SEDE1) y rechaza las demás. "
+        "Default: todas las sedes en una BD.",
+    )
+    ap.add_argument(
+        "--cache-disponibilidad",
+        dest="cache_disponibilidad",
+        action="store_true",
+        help="(primary) Mantiene en memoria la disponibilidad de libros y rechaza los PRESTAMO sin "
+        "ejemplares sin consultar SQLite. No aplica con --workers-modo procesos.",
+    )
+    ap.add_argument(
+        "--idem-cache",
+        dest="idem_cache",
+        type=int,
+        default=100000,
+        help="Claves de idempotencia recientes en memoria (LRU + filtro de Bloom). "
+        "0 = consultar siempre applied_ops.",
+    )
+    ap.add_argument(
+        "--idem-ttl-s",
+        dest="idem_ttl_s",
+        type=float,
+        default=3600.0,
+        help="Segundos que una clave permanece en el LRU de idempotencia.",
+    )
+    ap.add_argument(
+        "--idem-retener",
+        dest="idem_retener",
+        type=int,
+        default=0,
+        help="Claves más recientes que se conservan en applied_ops; el resto se poda periódicamente. "
+        "Debe cubrir la ventana de reintentos. 0 = no podar.",
+    )
+    ap.add_argument(
+        "--idem-compactar-s",
+        dest="idem_compactar_s",
+        type=float,
+        default=300.0,
+        help="Intervalo (s) de la poda de applied_ops (con --idem-retener).",
+    )
     args = ap.parse_args()
+    signal.signal(signal.SIGTERM, _terminar)
+
+    if args.repl_sub and not args.repl_sync_primario:
+        raise SystemExit("--repl-sub requiere --repl-sync-primario para recuperar huecos.")
 
     # Asegurar carpetas
     os.makedirs(os.path.dirname(args.db), exist_ok=True)
@@ -267,69 +1467,99 @@ def main():
     else:
         db_path = args.db
 
-    con = connect(db_path)
+    ctx = zmq.Context.instance()
+
+    con = connect(db_path, args.perfil_bd)
+    asegurar_tablas_replicacion(con)
+    ga = EstadoGA(con=con, role=args.role, sede=args.sede)
+
+    if args.idem_cache > 0:
+        ga.idempotencia = CacheIdempotencia(con, args.idem_cache, args.idem_ttl_s)
+        print(f"[GA] Caché de idempotencia: LRU de {args.idem_cache} claves, TTL {args.idem_ttl_s:g}s")
+    compactador = None
+    if args.idem_retener > 0:
+        compactador = CompactadorIdempotencia(
+            db_path, args.perfil_bd, args.idem_retener, args.idem_compactar_s, ga.idempotencia
+        )
+        print(f"[GA] Retención de applied_ops: últimas {args.idem_retener} claves")
 
-    replica_con: Optional[sqlite3.Connection] = None
-    if args.role == "primary" and args.db_replica:
-        replica_con = connect(args.db_replica)
+    if args.cache_disponibilidad:
+        # Un backup recibe escrituras de otro proceso (réplica) y los workers en procesos
+        # tendrían cada uno su copia: en ambos casos el caché quedaría desactualizado.
+        if args.role != "primary" or (args.workers > 1 and args.workers_modo == "procesos"):
+            print("[GA][WARN] --cache-disponibilidad sólo aplica a un primary con workers en hilos; se ignora.")
+        else:
+            ga.disponibilidad = CacheDisponibilidad(con)
+            print(f"[GA] Caché de disponibilidad cargado: {len(ga.disponibilidad)} libros")
+
+    # Réplica local y PUB de red leen el mismo log: se poda por el más atrasado
+    poda_log = PodaLogReplicacion(args.repl_retener)
+    if args.role == "primary" and args.repl_pub:
+        ga.publicador = PublicadorReplicacion(
+            ctx, db_path, args.perfil_bd, args.repl_pub, args.repl_lote, poda_log
+        )
+    if args.role == "backup" and args.repl_sub:
+        ga.receptor = ReceptorReplicacion(
+            ctx, db_path, args.perfil_bd, args.repl_sub, args.repl_sync_primario, args.repl_lote
+        )
+
+    if args.role == "primary" and args.db_replica and args.replicacion == "async":
+        ga.replicador = ReplicadorAsync(db_path, args.db_replica, args.perfil_bd, args.repl_lote, poda_log)
+        print(f"[GA] Modo PRIMARY con réplica ASÍNCRONA (log de replicación) en {args.db_replica}")
+    elif args.role == "primary" and args.db_replica:
+        ga.replica_con = connect(args.db_replica, args.perfil_bd)
         print(f"[GA] Modo PRIMARY con réplica en {args.db_replica}")
     elif args.role == "backup":
         print(f"[GA] Modo BACKUP usando BD {db_path}")
+    elif ga.publicador is not None:
+        print("[GA] Modo PRIMARY con replicación por red (sin réplica local).")
     else:
         print("[GA] Modo PRIMARY sin réplica (solo BD principal).")
 
-    ctx = zmq.Context.instance()
-    rep = ctx.socket(zmq.REP)
+    # Con group commit o workers hace falta ROUTER: un REP sólo admite una solicitud a la vez
+    usa_router = args.lote_max > 1 or args.workers > 1
+    rep = ctx.socket(zmq.ROUTER if usa_router else zmq.REP)
     rep.bind(args.rep)
 
-    print(f"[GA] REP en {args.rep}")
-    print(f"[GA] Usando BD principal: {db_path}")
-    if replica_con:
+    print(f"[GA] {'ROUTER' if usa_router else 'REP'} en {args.rep}")
+    print(f"[GA] Usando BD principal: {db_path} (perfil {args.perfil_bd})")
+    if args.sede:
+        print(f"[GA] Shard de {args.sede}: se rechazan operaciones de otras sedes")
+    if ga.replica_con or ga.replicador:
         print(f"[GA] Réplica activada en: {args.db_replica}")
+    if args.lote_max > 1:
+        print(f"[GA] Group commit: hasta {args.lote_max} ops por transacción, ventana {args.lote_ventana_ms} ms")
+    if args.workers > 1:
+        print(f"[GA] Pool de {args.workers} workers")
     print("[GA] Esperando operaciones...")
 
-    try:
-        while True:
-            raw = rep.recv()
-            try:
-                data = json.loads(raw.decode("utf-8"))
-            except Exception as e:
-                rep.send_string(json.dumps({"ok": False, "msg": f"JSON inválido: {e}"}))
-                continue
-
-            op = (data.get("op") or "").upper()
-            idsol = data.get("idSolicitud") or "?"
-            print(f"[GA][{args.role}] op={op} id={idsol}")
-
-            try:
-                # Aplica en la BD de este GA
-                res = process_operation(con, data)
+    for hilo in (ga.replicador, ga.publicador, ga.receptor, compactador):
+        if hilo is not None:
+            hilo.iniciar()
+    if args.role == "primary" and args.repl_sync:
+        threading.Thread(
+            target=servir_catchup,
+            args=(ctx, args.repl_sync, db_path, args.perfil_bd, args.repl_lote, poda_log),
+            daemon=True,
+        ).start()
 
-                # Si soy primario y tengo réplica, replico la misma operación
-                if args.role == "primary" and replica_con is not None:
-                    try:
-                        _ = process_operation(replica_con, data)
-                        print(f"[GA] Réplica OK para id={idsol}")
-                    except Exception as e_rep:
-                        print(f"[GA][WARN] Fallo replicando en BD réplica: {e_rep}")
-
-                rep.send_string(json.dumps(res))
-                print(f"[GA] {op} id={idsol} → {res}")
-            except Exception as e:
-                try:
-                    con.execute("ROLLBACK")
-                except Exception:
-                    pass
-                rep.send_string(json.dumps({"ok": False, "msg": f"Error aplicando op: {e}"}))
-                print(f"[GA] Error aplicando {op} id={idsol}: {e}")
+    try:
+        if args.workers > 1:
+            servir_workers(ctx, rep, ga, args, db_path)
+        elif args.lote_max > 1:
+            servir_lotes(rep, ga, args.lote_max, args.lote_ventana_ms)
+        else:
+            servir_rep(rep, ga)
     except KeyboardInterrupt:
         print("\n[GA] Saliendo...")
     finally:
         rep.close(0)
+        # Cada hilo con sockets (workers, replicación, catch-up) sale con ContextTerminated y
+        # cierra los suyos: ctx.term() retorna cuando terminaron todos.
         ctx.term()
         con.close()
-        if replica_con:
-            replica_con.close()
+        if ga.replica_con:
+            ga.replica_con.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,48 @@
+import argparse
+import json
+
+import zmq
+
+from common.config import GA_REP_CONNECT
+
+# subcomando CLI -> mensaje de administración que entiende el GA
+COMANDOS = {
+    "estado-replicacion": {"type": "estado_replicacion"},
+    "verificar-cache": {"type": "verificar_cache"},
+    "estado-idempotencia": {"type": "estado_idempotencia"},
+}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Consultas de administración al GA")
+    ap.add_argument("comando", choices=sorted(COMANDOS), help="Consulta a enviar")
+    ap.add_argument(
+        "--ga",
+        default=GA_REP_CONNECT,
+        help="Endpoint del GA (p.ej. tcp://127.0.0.1:5570)",
+    )
+    ap.add_argument(
+        "--timeout-ms",
+        type=int,
+        default=3000,
+        help="Timeout de respuesta (ms)",
+    )
+    args = ap.parse_args()
+
+    ctx = zmq.Context.instance()
+    sock = ctx.socket(zmq.REQ)
+    sock.setsockopt(zmq.LINGER, 0)
+    sock.setsockopt(zmq.RCVTIMEO, args.timeout_ms)
+    sock.connect(args.ga)
+    try:
+        sock.send_json(COMANDOS[args.comando])
+        print(json.dumps(sock.recv_json(), indent=2, ensure_ascii=False))
+    except zmq.Again:
+        raise SystemExit(f"[GA-ADMIN] {args.ga} no respondió en {args.timeout_ms} ms")
+    finally:
+        sock.close(0)
+        ctx.term()
+
+
+if __name__ == "__main__":
+    main()
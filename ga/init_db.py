@@ -3,10 +3,14 @@ import os
 import random
 import sqlite3
 from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
 
 DB_NAME_DEFAULT = os.path.join(os.path.dirname(__file__), "biblioteca.db")
 SCHEMA = os.path.join(os.path.dirname(__file__), "schema.sql")
 
+# 1000 libros con 1 ejemplar: L0001-L0500 en SEDE1, L0501-L1000 en SEDE2
+TOTAL_LIBROS = 1000
+
 
 def iso_now():
     return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
@@ -16,55 +20,67 @@ def iso_days_from_now(days: int):
     return (datetime.now(timezone.utc) + timedelta(days=days)).strftime("%Y-%m-%dT%H:%M:%SZ")
 
 
-def main():
-    ap = argparse.ArgumentParser(description="Inicializa la BD de biblioteca (libros + préstamos ACTIVO)")
-    ap.add_argument(
-        "--db",
-        default=DB_NAME_DEFAULT,
-        help="Ruta del archivo de base de datos a crear (default ga/biblioteca.db)",
-    )
-    args = ap.parse_args()
+def sede_libro(i: int) -> str:
+    return "SEDE1" if i <= TOTAL_LIBROS // 2 else "SEDE2"
 
-    db_path = args.db
+
+def prestados_iniciales() -> Dict[str, List[int]]:
+    """
+    Números de libro con préstamo ACTIVO al inicializar (50 en SEDE1, 150 en SEDE2), prestados
+    al usuario U<número>. Semilla fija: siempre los mismos, así ps.generar_carga puede generar
+    devoluciones de préstamos que existen.
+    """
+    rnd = random.Random(42)
+    mitad = TOTAL_LIBROS // 2
+    return {
+        "SEDE1": rnd.sample(list(range(1, mitad + 1)), 50),
+        "SEDE2": rnd.sample(list(range(mitad + 1, TOTAL_LIBROS + 1)), 150),
+    }
+
+
+def crear_bd(db_path: str, sede: Optional[str] = None):
+    """
+    (Re)crea la BD en db_path con el esquema y los datos iniciales.
+    Con sede, sólo carga los libros y préstamos de esa sede (shard del GA por sede).
+    """
     db_dir = os.path.dirname(db_path) or "."
     os.makedirs(db_dir, exist_ok=True)
 
-    if os.path.exists(db_path):
-        os.remove(db_path)
+    # Incluye los archivos -wal/-shm que deja el perfil WAL del GA
+    for ruta in (db_path, db_path + "-wal", db_path + "-shm"):
+        if os.path.exists(ruta):
+            os.remove(ruta)
 
     with sqlite3.connect(db_path) as con, open(SCHEMA, "r", encoding="utf-8") as f:
         con.executescript(f.read())
 
         # 1000 libros, mitad en SEDE1 y mitad en SEDE2
         libros = []
-        for i in range(1, 1001):
+        for i in range(1, TOTAL_LIBROS + 1):
             idLibro = f"L{i:04d}"
-            sede = "SEDE1" if i <= 500 else "SEDE2"
             tot = 1
             disp = 1
             titulo = f"Libro {i:04d}"
-            libros.append((idLibro, titulo, sede, tot, disp))
+            libros.append((idLibro, titulo, sede_libro(i), tot, disp))
 
         con.executemany(
             """
             INSERT INTO libros(idLibro, titulo, sede, ejemplares_totales, ejemplares_disponibles)
             VALUES (?,?,?,?,?)
             """,
-            libros,
+            [l for l in libros if sede is None or l[2] == sede],
         )
 
         # 200 prestados: 50 en SEDE1, 150 en SEDE2
-        prestados_s1 = list(range(1, 501))
-        prestados_s2 = list(range(501, 1001))
-        random.seed(42)
-        sample_s1 = random.sample(prestados_s1, 50)
-        sample_s2 = random.sample(prestados_s2, 150)
+        prestados = prestados_iniciales()
+        sample_s1 = prestados["SEDE1"]
+        sample_s2 = prestados["SEDE2"]
 
         activos = []
         now = iso_now()
         plus14 = iso_days_from_now(14)
 
-        for i in sample_s1:
+        for i in sample_s1 if sede in (None, "SEDE1") else []:
             idLibro = f"L{i:04d}"
             con.execute("UPDATE libros SET ejemplares_disponibles = 0 WHERE idLibro = ?", (idLibro,))
             activos.append(
@@ -79,7 +95,7 @@ def main():
                 )
             )
 
-        for i in sample_s2:
+        for i in sample_s2 if sede in (None, "SEDE2") else []:
             idLibro = f"L{i:04d}"
             con.execute("UPDATE libros SET ejemplares_disponibles = 0 WHERE idLibro = ?", (idLibro,))
             activos.append(
@@ -103,7 +119,28 @@ def main():
         )
         con.commit()
 
-    print(f"[INIT-DB] BD creada en {db_path} con 1000 libros y 200 préstamos ACTIVO.")
+
+def main():
+    ap = argparse.ArgumentParser(description="Inicializa la BD de biblioteca (libros + préstamos ACTIVO)")
+    ap.add_argument(
+        "--db",
+        default=DB_NAME_DEFAULT,
+        help="Ruta del archivo de base de datos a crear (default ga/biblioteca.db)",
+    )
+    ap.add_argument(
+        "--sede",
+        choices=["SEDE1", "SEDE2"],
+        default=None,
+        help="Crea sólo el shard de esa sede (libros y préstamos de la sede). Default: ambas sedes.",
+    )
+    args = ap.parse_args()
+
+    db_path = args.db
+    crear_bd(db_path, args.sede)
+    if args.sede:
+        print(f"[INIT-DB] BD creada en {db_path} con el shard de {args.sede}.")
+    else:
+        print(f"[INIT-DB] BD creada en {db_path} con 1000 libros y 200 préstamos ACTIVO.")
 
 
 if __name__ == "__main__":
@@ -28,3 +28,15 @@ CREATE TABLE IF NOT EXISTS applied_ops (
   idSolicitud TEXT NOT NULL,
   timestamp   TEXT NOT NULL
 );
+
+-- Replicación asíncrona: el primario anota aquí cada operación aplicada (en orden)
+CREATE TABLE IF NOT EXISTS replication_log (
+  seq     INTEGER PRIMARY KEY AUTOINCREMENT,
+  payload TEXT NOT NULL           -- JSON de la operación tal como llegó al GA
+);
+
+-- Última seq del log aplicada en esta BD cuando actúa como réplica
+CREATE TABLE IF NOT EXISTS replica_state (
+  id       INTEGER PRIMARY KEY CHECK (id = 1),
+  last_seq INTEGER NOT NULL
+);
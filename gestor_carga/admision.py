@@ -0,0 +1,108 @@
+import queue
+import time
+from typing import Callable, Dict, Optional, Tuple, Union
+
+from gestor_carga.backlog import BacklogDurable, BacklogMemoria
+
+
+class CuboFichas:
+    """
+    Token bucket: `tasa` fichas por segundo, acumulando hasta `rafaga`.
+    """
+
+    def __init__(self, tasa: float, rafaga: float):
+        self.tasa = tasa
+        self.rafaga = max(rafaga, 1.0)
+        self.fichas = self.rafaga
+        self._ultimo = time.monotonic()
+
+    def tomar(self) -> float:
+        """
+        Toma una ficha. Devuelve 0 si la había o los segundos hasta que haya una.
+        """
+        ahora = time.monotonic()
+        self.fichas = min(self.fichas + (ahora - self._ultimo) * self.tasa, self.rafaga)
+        self._ultimo = ahora
+        if self.fichas >= 1.0:
+            self.fichas -= 1.0
+            return 0.0
+        return (1.0 - self.fichas) / self.tasa
+
+
+class ControlAdmision:
+    """
+    Control de admisión del GC: antes de aceptar una solicitud de un PS mira la carga y, si no
+    hay lugar, contesta al instante "ocupado, reintentar en N ms" en vez de encolarla sin límite.
+    Límites (0 = sin límite):
+    - tasa_sede: solicitudes/s por sede (token bucket con ráfaga `rafaga_sede`).
+    - max_backlog: mensajes en el backlog del tópico (DEV/REN con el actor DOWN o vaciándose).
+    - max_cola_pub: mensajes esperando al publicador.
+    - max_prestamos: préstamos en vuelo hacia los actores PRESTAMO (modo router).
+    Lo usa sólo el hilo del front-end (REP o ROUTER).
+    """
+
+    def __init__(
+        self,
+        tasa_sede: float,
+        rafaga_sede: float,
+        max_backlog: int,
+        max_cola_pub: int,
+        max_prestamos: int,
+        retry_after_ms: int,
+        backlog_de: Callable[[str], Optional[Union[BacklogMemoria, BacklogDurable]]],
+        cola_pub: "queue.Queue[Tuple[str, dict, Optional[int]]]",
+        prestamos_en_vuelo: Callable[[], int],
+    ):
+        self.tasa_sede = tasa_sede
+        self.rafaga_sede = rafaga_sede or tasa_sede
+        self.max_backlog = max_backlog
+        self.max_cola_pub = max_cola_pub
+        self.max_prestamos = max_prestamos
+        self.retry_after_ms = retry_after_ms
+        self.backlog_de = backlog_de
+        self.cola_pub = cola_pub
+        self.prestamos_en_vuelo = prestamos_en_vuelo
+        self._cubos: Dict[str, CuboFichas] = {}
+        self.rechazos: Dict[str, int] = {}
+
+    @property
+    def activo(self) -> bool:
+        return any((self.tasa_sede, self.max_backlog, self.max_cola_pub, self.max_prestamos))
+
+    def _ocupado(self, motivo: str, espera_ms: int, msg: dict) -> dict:
+        self.rechazos[motivo] = self.rechazos.get(motivo, 0) + 1
+        print(
+            f"[GC][admisión] Ocupado ({motivo}) id={msg.get('idSolicitud')} → reintentar en {espera_ms} ms "
+            f"(rechazos {motivo}={self.rechazos[motivo]})"
+        )
+        return {
+            "ok": False,
+            "ocupado": True,
+            "retry_after_ms": espera_ms,
+            "msg": f"GC ocupado ({motivo}); reintentar en {espera_ms} ms.",
+        }
+
+    def admitir(self, op: str, msg: dict) -> Optional[dict]:
+        """
+        Devuelve None si la solicitud entra o la respuesta "ocupado" para el PS.
+        """
+        # Primero la capacidad: una solicitud rechazada no gasta ficha de su sede
+        if op == "PRESTAMO":
+            if self.max_prestamos and self.prestamos_en_vuelo() >= self.max_prestamos:
+                return self._ocupado("préstamos en vuelo", self.retry_after_ms, msg)
+        else:
+            backlog = self.backlog_de(op)
+            if self.max_backlog and backlog is not None and len(backlog) >= self.max_backlog:
+                return self._ocupado(f"backlog {op}", self.retry_after_ms, msg)
+            if self.max_cola_pub and self.cola_pub.qsize() >= self.max_cola_pub:
+                return self._ocupado("cola del publicador", self.retry_after_ms, msg)
+
+        if self.tasa_sede:
+            sede = (msg.get("sede") or "").upper()
+            cubo = self._cubos.get(sede)
+            if cubo is None:
+                cubo = self._cubos[sede] = CuboFichas(self.tasa_sede, self.rafaga_sede)
+            espera_s = cubo.tomar()
+            if espera_s > 0:
+                return self._ocupado(f"tasa {sede or '-'}", max(1, int(espera_s * 1000)), msg)
+        return None
@@ -0,0 +1,124 @@
+import heapq
+import json
+import sqlite3
+import threading
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Tuple
+
+# Mensajes ya sacados del backlog pero sin confirmar: (id, msg)
+Entrada = Tuple[int, dict]
+
+SQL_OUTBOX = """
+    CREATE TABLE IF NOT EXISTS outbox (
+      id      INTEGER PRIMARY KEY AUTOINCREMENT,
+      topico  TEXT NOT NULL,
+      payload TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_outbox_topico ON outbox(topico, id);
+"""
+SQL_ENCOLAR = "INSERT INTO outbox(topico, payload) VALUES (?, ?)"
+SQL_SIGUIENTES = "SELECT id, payload FROM outbox WHERE topico = ? AND id > ? ORDER BY id LIMIT ?"
+SQL_LEER = "SELECT id, payload FROM outbox WHERE id = ?"
+SQL_CONFIRMAR = "DELETE FROM outbox WHERE id = ?"
+SQL_CONTAR = "SELECT COUNT(*) FROM outbox WHERE topico = ?"
+
+
+class BacklogMemoria:
+    """
+    Backlog en memoria de un tópico (se pierde si el GC se reinicia).
+    Los mensajes se sacan con extraer() y sólo se olvidan al confirmar(); reintentar(ids)
+    devuelve esos no confirmados al frente de la cola (los demás siguen en vuelo, por ejemplo
+    esperando en la cola del publicador, y no se duplican).
+    """
+
+    def __init__(self):
+        self._pendientes: Deque[Entrada] = deque()
+        self._en_vuelo: Dict[int, dict] = {}
+        self._siguiente_id = 0
+        self._candado = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._pendientes) + len(self._en_vuelo)
+
+    def append(self, msg: dict):
+        with self._candado:
+            self._siguiente_id += 1
+            self._pendientes.append((self._siguiente_id, msg))
+
+    def extraer(self, n: int) -> List[Entrada]:
+        with self._candado:
+            lote = []
+            while self._pendientes and len(lote) < n:
+                id_msg, msg = self._pendientes.popleft()
+                self._en_vuelo[id_msg] = msg
+                lote.append((id_msg, msg))
+            return lote
+
+    def confirmar(self, ids: Iterable[int]):
+        with self._candado:
+            for id_msg in ids:
+                self._en_vuelo.pop(id_msg, None)
+
+    def reintentar(self, ids: Iterable[int]):
+        with self._candado:
+            vuelven = [(id_msg, self._en_vuelo.pop(id_msg)) for id_msg in ids if id_msg in self._en_vuelo]
+            self._pendientes.extendleft(sorted(vuelven, reverse=True))
+
+
+class BacklogDurable:
+    """
+    Backlog de un tópico persistido en SQLite (tabla outbox, una fila por mensaje): sobrevive
+    a un reinicio del GC y no ocupa RAM aunque el actor pase horas caído.
+    Encolar es un INSERT y confirmar un DELETE por PK; extraer lee por el índice (topico, id)
+    a partir del último id entregado, así que todas son O(1) por mensaje.
+    Un mensaje sólo se borra al confirmar(); si el GC se cae antes, se reenvía al arrancar
+    (los duplicados los absorbe la idempotencia del GA).
+    """
+
+    def __init__(self, db_path: str, topico: str):
+        self.topico = topico
+        self._con = sqlite3.connect(db_path, timeout=10, isolation_level=None, check_same_thread=False)
+        # WAL + NORMAL: sobrevive a la caída del proceso sin un fsync por mensaje
+        self._con.execute("PRAGMA journal_mode = WAL")
+        self._con.execute("PRAGMA synchronous = NORMAL")
+        self._con.executescript(SQL_OUTBOX)
+        self._candado = threading.Lock()
+        self._entregado_hasta = 0  # último id devuelto por extraer()
+        self._reintentos: List[int] = []  # heap de ids ya entregados que vuelven a salir primero
+        self._total = self._con.execute(SQL_CONTAR, (topico,)).fetchone()[0]
+
+    def __len__(self) -> int:
+        return self._total
+
+    def append(self, msg: dict):
+        with self._candado:
+            self._con.execute(SQL_ENCOLAR, (self.topico, json.dumps(msg)))
+            self._total += 1
+
+    def extraer(self, n: int) -> List[Entrada]:
+        with self._candado:
+            filas = []
+            while self._reintentos and len(filas) < n:
+                fila = self._con.execute(SQL_LEER, (heapq.heappop(self._reintentos),)).fetchone()
+                if fila is not None:  # None: confirmado mientras tanto
+                    filas.append(fila)
+            if len(filas) < n:
+                nuevas = self._con.execute(
+                    SQL_SIGUIENTES, (self.topico, self._entregado_hasta, n - len(filas))
+                ).fetchall()
+                if nuevas:
+                    self._entregado_hasta = nuevas[-1][0]
+                filas.extend(nuevas)
+            return [(id_msg, json.loads(payload)) for id_msg, payload in filas]
+
+    def confirmar(self, ids: Iterable[int]):
+        with self._candado:
+            for id_msg in ids:
+                self._total -= self._con.execute(SQL_CONFIRMAR, (id_msg,)).rowcount
+
+    def reintentar(self, ids: Iterable[int]):
+        # Lo no confirmado sigue en la tabla: sólo hay que volver a entregar esos ids
+        with self._candado:
+            for id_msg in ids:
+                if id_msg not in self._reintentos:
+                    heapq.heappush(self._reintentos, id_msg)
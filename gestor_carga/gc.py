@@ -3,97 +3,721 @@ import json
 import queue
 import threading
 import time
+import uuid
 from dataclasses import dataclass, field
-from typing import List, Tuple, Optional
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Tuple, Optional, Union
 
 import zmq
 
+from gestor_carga.admision import ControlAdmision
+from gestor_carga.backlog import BacklogDurable, BacklogMemoria
+from gestor_carga.planificador import ASYNC, PRESTAMO, Planificador, parse_politica, parse_politicas_sede
+from gestor_carga.salud import ActorInfo, MonitorSalud
+
 
 @dataclass
-class ActorInfo:
+class GrupoActores:
+    """
+    Instancias de actor de un mismo tópico. El grupo está VIVO si alguna instancia lo está
+    y todas comparten el mismo backlog (se vacía cuando vuelve cualquiera).
+    """
     nombre: str
-    topico: str  # "DEVOLUCION" o "RENOVACION"
-    hc_addr: str  # tcp://IP:PORT del REP health del actor
-    vivo: bool = False
-    ultimo_ok: float = 0.0
-    req: Optional[zmq.Socket] = None  # socket REQ reutilizable para health
-    backlog: list = field(default_factory=list)  # mensajes pendientes cuando está DOWN
+    topico: str
+    miembros: List[ActorInfo] = field(default_factory=list)
+    backlog: Union[BacklogMemoria, BacklogDurable] = field(default_factory=BacklogMemoria)
+    # Entrega confirmada: todo mensaje pasa por el backlog y este evento despierta al repartidor
+    aviso: Optional[threading.Event] = None
+
+    @property
+    def vivo(self) -> bool:
+        return any(m.vivo for m in self.miembros)
 
+    @classmethod
+    def crear(
+        cls,
+        nombre: str,
+        topico: str,
+        hc_addrs: List[str],
+        backlog: Union[BacklogMemoria, BacklogDurable, None] = None,
+    ) -> "GrupoActores":
+        grupo = cls(nombre=nombre, topico=topico, backlog=backlog if backlog is not None else BacklogMemoria())
+        for i, hc in enumerate(hc_addrs, start=1):
+            grupo.miembros.append(
+                ActorInfo(
+                    nombre=nombre if len(hc_addrs) == 1 else f"{nombre}-{i}",
+                    topico=topico,
+                    hc_addr=hc,
+                    backlog=grupo.backlog,  # el mismo backlog
+                )
+            )
+        return grupo
 
-def publicador_worker(ctx: zmq.Context, bind_pub: str, cola_pub: "queue.Queue[Tuple[str, dict]]"):
+
+def publicador_worker(
+    ctx: zmq.Context,
+    bind_pub: str,
+    cola_pub: "queue.Queue[Tuple[str, dict, Optional[int]]]",
+    push_binds: Optional[Dict[str, str]] = None,
+    get_grupo_por_topico: Optional[Callable[[str], Optional[GrupoActores]]] = None,
+    confirmada: bool = False,
+):
     """
-    Hilo único dueño del socket PUB.
-    Lee (topico, msg) de la cola y publica.
+    Hilo único dueño del socket PUB (y de los PUSH, si hay).
+    Lee (topico, msg, id_backlog) de la cola y publica. Los tópicos con PUSH se reparten entre las
+    instancias conectadas (cada mensaje le llega a una sola); si ninguna lo acepta a tiempo,
+    el mensaje vuelve al backlog del grupo. Los que vienen del backlog (id_backlog) se confirman
+    en él recién cuando salieron por el socket.
+    Con entrega confirmada no toca el backlog: el ack del actor confirma y el timeout reenvía.
     """
     pub = ctx.socket(zmq.PUB)
     pub.bind(bind_pub)
     print(f"[GC] PUB en {bind_pub}")
+    pushes: Dict[str, zmq.Socket] = {}
+    for topico, addr in (push_binds or {}).items():
+        s = ctx.socket(zmq.PUSH)
+        s.setsockopt(zmq.LINGER, 0)
+        s.setsockopt(zmq.SNDTIMEO, 1000)  # sin PULL conectados el send bloquearía
+        s.bind(addr)
+        pushes[topico] = s
+        print(f"[GC] PUSH {topico} en {addr}")
     try:
         while True:
-            topico, msg = cola_pub.get()
-            pub.send_multipart([topico.encode("utf-8"), json.dumps(msg).encode("utf-8")])
-            print(f"[GC] Publicado tópico {topico}")
+            topico, msg, id_backlog = cola_pub.get()
+            grupo = get_grupo_por_topico(topico) if get_grupo_por_topico else None
+            frames = [topico.encode("utf-8"), json.dumps(msg).encode("utf-8")]
+            push = pushes.get(topico)
+            try:
+                if push is None:
+                    pub.send_multipart(frames)
+                    print(f"[GC] Publicado tópico {topico}")
+                else:
+                    push.send_multipart(frames)
+                    print(f"[GC] Repartido tópico {topico}")
+            except zmq.Again:
+                if grupo is not None and not confirmada:
+                    if id_backlog is None:
+                        grupo.backlog.append(msg)
+                    else:
+                        # Sólo vuelve éste: los siguientes del backlog ya están en la cola
+                        grupo.backlog.reintentar([id_backlog])
+                    print(f"[GC][WARN] Ningún actor {topico} aceptó el mensaje → backlog {len(grupo.backlog)}")
+                continue
+            if id_backlog is not None and grupo is not None:
+                grupo.backlog.confirmar([id_backlog])
     except KeyboardInterrupt:
         pass
     finally:
         pub.close(0)
+        for s in pushes.values():
+            s.close(0)
+
+
+def validar_solicitud(msg: Any) -> Optional[dict]:
+    """
+    Devuelve None si la solicitud es atendible o la respuesta de error para el PS.
+    """
+    if not isinstance(msg, dict):
+        return {"ok": False, "error": True, "msg": "solicitud no es un objeto JSON"}
+    op = (msg.get("op") or "").upper()
+    if op not in ("DEVOLUCION", "RENOVACION", "PRESTAMO"):
+        print(f"[GC] op desconocida: {op} payload={msg}")
+        return {"ok": False, "error": True, "msg": "op no soportada (DEV/REN/PREST)"}
+    return None
+
+
+def decodificar_solicitud(raw: bytes, lote_max: int = 0) -> Tuple[Optional[dict], Optional[dict]]:
+    """
+    Valida el payload de un PS: una solicitud o un LOTE {"op": "LOTE", "solicitudes": [...]}
+    (las solicitudes de un lote se validan una por una al atenderlas).
+    Devuelve (msg, None) si es atendible o (None, respuesta_error) para contestar de inmediato.
+    """
+    try:
+        msg = json.loads(raw.decode("utf-8"))
+    except Exception as e:
+        return None, {"ok": False, "error": True, "msg": f"payload no-JSON: {e}"}
+
+    if isinstance(msg, dict) and (msg.get("op") or "").upper() == "LOTE":
+        solicitudes = msg.get("solicitudes")
+        if not isinstance(solicitudes, list) or not solicitudes:
+            return None, {"ok": False, "error": True, "msg": "LOTE sin solicitudes"}
+        if lote_max and len(solicitudes) > lote_max:
+            return None, {
+                "ok": False,
+                "error": True,
+                "msg": f"LOTE de {len(solicitudes)} solicitudes (máximo {lote_max})",
+            }
+        return msg, None
+
+    error = validar_solicitud(msg)
+    if error is not None:
+        return None, error
+    return msg, None
+
+
+def despachar_asincrono(
+    op: str,
+    msg: dict,
+    get_actor_por_topico: Callable[[str], Optional[GrupoActores]],
+    cola_pub: "queue.Queue[Tuple[str, dict, Optional[int]]]",
+) -> dict:
+    """
+    DEVOLUCION / RENOVACION (patrón asíncrono con Pub/Sub).
+    Encola para publicar (o al backlog si el actor está DOWN) y devuelve la respuesta inmediata al PS.
+    """
+    actor = get_actor_por_topico(op)
+    if actor and actor.aviso is not None:
+        actor.backlog.append(msg)
+        actor.aviso.set()
+    elif actor and actor.vivo and not actor.backlog:
+        cola_pub.put((op, msg, None))
+    elif actor and actor.vivo:
+        # Backlog vaciándose: el mensaje va detrás, para no adelantar a uno anterior de su clave
+        actor.backlog.append(msg)
+    else:
+        if actor:
+            actor.backlog.append(msg)
+            print(f"[GC] {actor.nombre} DOWN → backlog {len(actor.backlog)} (tópico {op})")
+        else:
+            print(f"[GC] No hay actor configurado para tópico {op}")
+    return {"ok": True, "msg": "Recibido y (re)publicado si hay actor VIVO"}
+
 
+class VaciadoBacklog:
+    """
+    Vacía el backlog de los grupos VIVOS hacia el publicador a ritmo controlado, en vez de volcarlo
+    entero de golpe (el PUB descarta lo que pase su HWM y el actor/GA se saturan al volver).
+    - ritmo: mensajes/s por tópico (token bucket con ráfaga de 1 s); 0 = sin límite.
+    - cola_actor: si las instancias VIVAS reportan en su health al menos tantos mensajes en cola
+      (la menos cargada), se pausa hasta que bajen; 0 = no se mira.
+    Mientras hay backlog los mensajes nuevos se encolan detrás, así que el vaciado los intercala
+    en orden con los viejos. Informa tamaño, ritmo y duración de cada vaciado.
+    Nunca deja más de COLA_PUB_MAX mensajes esperando al publicador: sin límite de ritmo, un
+    backlog grande se pasaría entero a la cola (en RAM) más rápido de lo que el PUB lo despacha.
+    """
+
+    COLA_PUB_MAX = 1000
+
+    def __init__(
+        self,
+        grupos: List[GrupoActores],
+        cola_pub: "queue.Queue[Tuple[str, dict, Optional[int]]]",
+        ritmo: float,
+        cola_actor: int,
+    ):
+        self.grupos = grupos
+        self.cola_pub = cola_pub
+        self.ritmo = ritmo
+        self.cola_actor = cola_actor
+        self.aviso = threading.Event()
+        self._fichas: Dict[str, float] = {g.topico: 0.0 for g in grupos}
+        # tópico -> (inicio, tamaño inicial, enviados) del vaciado en curso
+        self._vaciados: Dict[str, Tuple[float, int, int]] = {}
+        self._ultimo_reporte: Dict[str, float] = {}
+
+    def iniciar(self):
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def _cola_actores(self, g: GrupoActores) -> int:
+        return min((m.en_cola for m in g.miembros if m.vivo), default=0)
+
+    def _vaciar(self, g: GrupoActores, dt: float):
+        ahora = time.monotonic()
+        vaciado = self._vaciados.get(g.topico)
+        if not g.backlog:
+            if vaciado is not None:
+                inicio, total, enviados = self._vaciados.pop(g.topico)
+                dur = ahora - inicio
+                print(
+                    f"[GC][backlog] {g.topico} vaciado: {enviados} msg en {dur:.1f}s "
+                    f"({enviados / max(dur, 1e-9):.0f} msg/s; {total} pendientes al empezar)"
+                )
+            self._fichas[g.topico] = 0.0
+            return
+        if not g.vivo:
+            return
+        if vaciado is None:
+            vaciado = self._vaciados[g.topico] = (ahora, len(g.backlog), 0)
+            self._ultimo_reporte[g.topico] = ahora
+            ritmo = f"{self.ritmo:g} msg/s" if self.ritmo > 0 else "sin límite"
+            print(f"[GC][backlog] {g.topico}: vaciando {len(g.backlog)} msg ({ritmo})")
+        if self.cola_actor > 0 and self._cola_actores(g) >= self.cola_actor:
+            return  # el actor todavía no digirió lo anterior
+
+        n = self.COLA_PUB_MAX - self.cola_pub.qsize()
+        if self.ritmo > 0:
+            # Ráfaga de al menos 1 mensaje: con ritmo < 1 msg/s las fichas llegan igual a 1
+            self._fichas[g.topico] = min(self._fichas[g.topico] + self.ritmo * dt, max(self.ritmo, 1.0))
+            n = min(n, int(self._fichas[g.topico]))
+        lote = g.backlog.extraer(n) if n > 0 else []
+        for id_backlog, msg in lote:
+            self.cola_pub.put((g.topico, msg, id_backlog))
+        if self.ritmo > 0:
+            self._fichas[g.topico] -= len(lote)
+        inicio, total, enviados = vaciado
+        self._vaciados[g.topico] = (inicio, total, enviados + len(lote))
+
+        if ahora - self._ultimo_reporte[g.topico] >= 5.0:
+            self._ultimo_reporte[g.topico] = ahora
+            print(
+                f"[GC][backlog] {g.topico}: quedan {len(g.backlog)} msg "
+                f"({(enviados + len(lote)) / max(ahora - inicio, 1e-9):.0f} msg/s, "
+                f"cola del actor {self._cola_actores(g)})"
+            )
+
+    def _loop(self):
+        anterior = time.monotonic()
+        while True:
+            self.aviso.wait(0.05)
+            self.aviso.clear()
+            ahora = time.monotonic()
+            for g in self.grupos:
+                self._vaciar(g, ahora - anterior)
+            anterior = ahora
+
+
+@dataclass
+class EnVuelo:
+    grupo: GrupoActores
+    id_backlog: int
+    msg: dict
+    deadline: float
+    intentos: int = 1
 
-def health_loop(
+
+class EntregaConfirmada:
+    """
+    Entrega al-menos-una-vez de DEV/REN. Los mensajes salen del backlog del grupo con un `_mid`
+    y quedan en vuelo hasta que el actor lo confirma por el canal de acks (PUSH del actor →
+    PULL del GC); sólo entonces se borran del backlog. Sin ack dentro de `timeout_s` se
+    reenvían: los duplicados los absorbe el idempotencyKey del GA.
+    No hay ida y vuelta por mensaje: hasta `ventana` mensajes por tópico quedan en vuelo.
+    """
+
+    def __init__(
+        self,
+        grupos: List[GrupoActores],
+        cola_pub: "queue.Queue[Tuple[str, dict, Optional[int]]]",
+        ack_bind: str,
+        timeout_s: float,
+        ventana: int,
+    ):
+        self.grupos = grupos
+        self.cola_pub = cola_pub
+        self.ack_bind = ack_bind
+        self.timeout_s = timeout_s
+        self.ventana = ventana
+        # Prefijo por arranque: un ack tardío de una corrida anterior no confirma otro mensaje
+        self.corrida = uuid.uuid4().hex[:8]
+        self.aviso = threading.Event()
+        # mid -> EnVuelo; con timeout fijo, el orden de inserción es el de vencimiento
+        self.en_vuelo: "OrderedDict[str, EnVuelo]" = OrderedDict()
+        self.por_topico: Dict[str, int] = {g.topico: 0 for g in grupos}
+        self.confirmados = 0
+        self.reenvios = 0
+        for g in grupos:
+            g.aviso = self.aviso
+
+    def iniciar(self, ctx: zmq.Context):
+        threading.Thread(target=self._loop, args=(ctx,), daemon=True).start()
+
+    def _enviar(self, mid: str, ev: EnVuelo):
+        ev.deadline = time.monotonic() + self.timeout_s
+        self.en_vuelo[mid] = ev
+        self.en_vuelo.move_to_end(mid)
+        self.cola_pub.put((ev.grupo.topico, dict(ev.msg, _mid=mid), None))
+
+    def _repartir(self):
+        for g in self.grupos:
+            libres = self.ventana - self.por_topico[g.topico]
+            if not g.vivo or libres <= 0:
+                continue
+            for id_backlog, msg in g.backlog.extraer(libres):
+                self.por_topico[g.topico] += 1
+                self._enviar(f"{self.corrida}:{g.topico}:{id_backlog}", EnVuelo(g, id_backlog, msg, 0.0))
+
+    def _confirmar(self, mid: str):
+        ev = self.en_vuelo.pop(mid, None)
+        if ev is None:
+            return  # ack duplicado o de otra corrida
+        ev.grupo.backlog.confirmar([ev.id_backlog])
+        self.por_topico[ev.grupo.topico] -= 1
+        self.confirmados += 1
+
+    def _vencer(self):
+        ahora = time.monotonic()
+        while self.en_vuelo:
+            mid, ev = next(iter(self.en_vuelo.items()))
+            if ev.deadline > ahora:
+                break
+            if ev.grupo.vivo:
+                ev.intentos += 1
+                self.reenvios += 1
+                print(f"[GC][ack] Sin ack de {mid} → reenvío (intento {ev.intentos})")
+                self._enviar(mid, ev)
+            else:
+                # Grupo caído: se reintenta cuando vuelva, sin publicar al vacío
+                ev.deadline = ahora + self.timeout_s
+                self.en_vuelo.move_to_end(mid)
+
+    def _loop(self, ctx: zmq.Context):
+        pull = ctx.socket(zmq.PULL)
+        pull.bind(self.ack_bind)
+        print(f"[GC] PULL de acks en {self.ack_bind} (reenvío tras {self.timeout_s:g}s sin ack)")
+        ultimo_reporte = time.monotonic()
+        try:
+            while True:
+                if pull.poll(50, zmq.POLLIN):
+                    while True:
+                        try:
+                            ack = pull.recv_json(zmq.NOBLOCK)
+                        except zmq.Again:
+                            break
+                        self._confirmar(ack.get("mid") or "")
+                self.aviso.clear()
+                self._repartir()
+                self._vencer()
+                if time.monotonic() - ultimo_reporte >= 10.0 and (self.en_vuelo or self.reenvios):
+                    ultimo_reporte = time.monotonic()
+                    print(
+                        f"[GC][ack] en vuelo={len(self.en_vuelo)} confirmados={self.confirmados} "
+                        f"reenvíos={self.reenvios}"
+                    )
+        finally:
+            pull.close(0)
+
+
+@dataclass
+class PrestamoWorker:
+    addr: str  # tcp://IP:PORT del REP del actor PRESTAMO
+    salud: Optional[ActorInfo] = None  # None si no se monitorea su health
+    en_vuelo: int = 0  # solicitudes enviadas sin respuesta
+    sock: Optional[zmq.Socket] = None
+
+    @property
+    def disponible(self) -> bool:
+        return self.salud is None or self.salud.vivo
+
+
+class PoolPrestamo:
+    """
+    Conjunto de actores PRESTAMO. Elige el actor VIVO con menos solicitudes en vuelo
+    (empates en round-robin). Si ninguno figura VIVO se reparte entre todos.
+    """
+
+    def __init__(self, workers: List[PrestamoWorker]):
+        self.workers = workers
+        self._turno = 0
+
+    def en_vuelo(self) -> int:
+        return sum(w.en_vuelo for w in self.workers)
+
+    def elegir(self) -> PrestamoWorker:
+        candidatos = [w for w in self.workers if w.disponible] or self.workers
+        i = self._turno % len(candidatos)
+        self._turno += 1
+        return min(candidatos[i:] + candidatos[:i], key=lambda w: w.en_vuelo)
+
+    @staticmethod
+    def marcar_caido(w: PrestamoWorker):
+        # El health checker lo devolverá a rotación cuando vuelva a responder
+        if w.salud is not None and w.salud.vivo:
+            w.salud.vivo = False
+            print(f"[GC] {w.salud.nombre} sin respuesta → fuera de rotación")
+
+
+def parse_lista(valor: Optional[str]) -> List[str]:
+    return [x.strip() for x in (valor or "").split(",") if x.strip()]
+
+
+def crear_pool_prestamo(args: argparse.Namespace) -> Tuple[PoolPrestamo, List[ActorInfo]]:
+    """
+    Construye el pool a partir de --prestamo-addr (lista separada por comas) y,
+    si se indica, --hc-prest (mismo orden). Devuelve el pool y los ActorInfo a monitorear.
+    """
+    addrs = parse_lista(args.prestamo_addr)
+    if args.hc_prest is None:
+        # Un único actor local: su health por defecto (--hc del actor PRESTAMO)
+        hcs = ["tcp://127.0.0.1:5603"] if addrs == ["tcp://127.0.0.1:5585"] else []
+    else:
+        hcs = parse_lista(args.hc_prest)
+    if hcs and len(hcs) != len(addrs):
+        raise SystemExit("--hc-prest debe tener tantas direcciones como --prestamo-addr.")
+
+    workers, salud = [], []
+    for i, addr in enumerate(addrs, start=1):
+        info = None
+        if hcs:
+            info = ActorInfo(nombre=f"ACTOR-PREST-{i}", topico="PRESTAMO", hc_addr=hcs[i - 1])
+            salud.append(info)
+        workers.append(PrestamoWorker(addr=addr, salud=info))
+    return PoolPrestamo(workers), salud
+
+
+def servir_rep(
     ctx: zmq.Context,
-    actores: List[ActorInfo],
-    cola_pub: "queue.Queue[Tuple[str, dict]]",
-    intervalo: float,
-    timeout_ms: int,
+    args: argparse.Namespace,
+    get_actor_por_topico: Callable[[str], Optional[GrupoActores]],
+    cola_pub: "queue.Queue[Tuple[str, dict, Optional[int]]]",
+    pool: PoolPrestamo,
+    admision: Optional[ControlAdmision] = None,
 ):
     """
-    Ping periódico a cada actor. Imprime VIVO/DOWN y hace flush del backlog al volver VIVO.
+    Modo clásico: un REP para los PS y un REQ síncrono por actor PRESTAMO.
+    Atiende una solicitud (o un LOTE, en orden) a la vez.
     """
-    while True:
-        for a in actores:
-            ok = False
-            try:
-                if a.req is None:
-                    s = ctx.socket(zmq.REQ)
-                    s.connect(a.hc_addr)
-                    s.setsockopt(zmq.RCVTIMEO, timeout_ms)
-                    s.setsockopt(zmq.SNDTIMEO, timeout_ms)
-                    a.req = s
-
-                a.req.send_json({"type": "health"})
-                resp = a.req.recv_json()
-                ok = resp.get("type") == "health_ok"
-            except zmq.Again:
-                ok = False
-                try:
-                    if a.req is not None:
-                        a.req.setsockopt(zmq.LINGER, 0)
-                        a.req.close(0)
-                except Exception:
-                    pass
-                a.req = None
-            except Exception:
-                ok = False
-                try:
-                    if a.req is not None:
-                        a.req.setsockopt(zmq.LINGER, 0)
-                        a.req.close(0)
-                except Exception:
-                    pass
-                a.req = None
-
-            previo = a.vivo
-            a.vivo = ok
-            estado = "VIVO" if ok else "DOWN"
-            print(f"[salud] {a.nombre} {estado}")
-
-            if ok and not previo and a.backlog:
-                # flush backlog: mover a la cola del publicador
-                print(f"[GC] {a.nombre} volvió VIVO → enviando backlog ({len(a.backlog)} msg)")
-                while a.backlog:
-                    cola_pub.put((a.topico, a.backlog.pop(0)))
-
-        time.sleep(intervalo)
+    # REP para PS (solo este hilo)
+    rep = ctx.socket(zmq.REP)
+    rep.bind(args.rep)
+    print(f"[GC] REP en {args.rep}")
+
+    def socket_prestamo(w: PrestamoWorker) -> zmq.Socket:
+        # REQ dedicado por actor; se recrea tras un timeout (el REQ queda esperando respuesta)
+        if w.sock is None:
+            s = ctx.socket(zmq.REQ)
+            s.setsockopt(zmq.LINGER, 0)
+            s.setsockopt(zmq.RCVTIMEO, args.prestamo_timeout_ms)
+            s.setsockopt(zmq.SNDTIMEO, args.prestamo_timeout_ms)
+            s.connect(w.addr)
+            w.sock = s
+        return w.sock
+
+    def descartar_socket(w: PrestamoWorker):
+        if w.sock is not None:
+            w.sock.close(0)
+            w.sock = None
+
+    for w in pool.workers:
+        print(f"[GC] Actor PRESTAMO vía {w.addr}")
+
+    def procesar(msg: dict) -> dict:
+        op = msg["op"].upper()
+        ocupado = admision.admitir(op, msg) if admision is not None else None
+        if ocupado is not None:
+            return ocupado
+        if op != "PRESTAMO":
+            # Respuesta inmediata al PS
+            return despachar_asincrono(op, msg, get_actor_por_topico, cola_pub)
+
+        # Patrón síncrono PS→GC→Actor PREST→GA→Actor PREST→GC→PS
+        w = pool.elegir()
+        try:
+            sock = socket_prestamo(w)
+            sock.send_json(msg)
+            resp_actor = sock.recv_json()
+            if w.salud is not None:
+                w.salud.latido_trafico()
+            print(f"[GC] PRESTAMO id={msg.get('idSolicitud')} ({w.addr}) → {resp_actor}")
+            return resp_actor
+        except zmq.Again:
+            descartar_socket(w)
+            pool.marcar_caido(w)
+            print(f"[GC][WARN] PRESTAMO timeout con actor PRESTAMO {w.addr}")
+            return {"ok": False, "timeout": True, "msg": "Actor PRESTAMO no responde (timeout)."}
+        except Exception as e:
+            descartar_socket(w)
+            print(f"[GC][ERROR] PRESTAMO fallo: {e}")
+            return {"ok": False, "error": True, "msg": f"Error hablando con actor PRESTAMO: {e}"}
+
+    print("[GC] Esperando mensajes...")
+    try:
+        while True:
+            msg, error = decodificar_solicitud(rep.recv(), args.lote_max)
+            if error is not None:
+                rep.send_string(json.dumps(error))
+                continue
+
+            if msg["op"].upper() == "LOTE":
+                respuestas = [validar_solicitud(m) or procesar(m) for m in msg["solicitudes"]]
+                rep.send_string(json.dumps({"ok": True, "respuestas": respuestas}))
+                continue
+            rep.send_string(json.dumps(procesar(msg)))
+    finally:
+        rep.close(0)
+        for w in pool.workers:
+            descartar_socket(w)
+
+
+@dataclass
+class LoteEnCurso:
+    envelope: List[bytes]  # identidad ROUTER del PS + delimitador vacío
+    respuestas: List[Optional[dict]]
+    faltan: int
+
+
+# A quién va una respuesta: el sobre del PS, o (lote, posición) si la solicitud vino en un LOTE
+Destino = Union[List[bytes], Tuple[LoteEnCurso, int]]
+
+
+@dataclass
+class PrestamoPendiente:
+    destino: Destino
+    idSolicitud: str
+    deadline: float
+    worker: PrestamoWorker
+
+
+def servir_router(
+    ctx: zmq.Context,
+    args: argparse.Namespace,
+    get_actor_por_topico: Callable[[str], Optional[GrupoActores]],
+    cola_pub: "queue.Queue[Tuple[str, dict, Optional[int]]]",
+    pool: PoolPrestamo,
+    admision: Optional[ControlAdmision] = None,
+    planificador: Optional[Planificador] = None,
+):
+    """
+    Modo asíncrono: ROUTER para los PS y un DEALER por actor PRESTAMO.
+    Mantiene muchas solicitudes en vuelo; las respuestas del actor se emparejan con el PS
+    mediante un token propio que viaja en el sobre (el REP del actor lo devuelve intacto).
+    DEV/REN se contestan al instante aunque haya préstamos pendientes.
+    Un LOTE se reparte en sus solicitudes y se contesta entero cuando todas tienen respuesta.
+    Con planificador, lo recibido se encola por sede y clase y se atiende de a
+    `args.planificador_lote` por vuelta según su política, en vez de por orden de llegada.
+    """
+    front = ctx.socket(zmq.ROUTER)
+    front.bind(args.rep)
+    print(f"[GC] ROUTER en {args.rep}")
+
+    poller = zmq.Poller()
+    poller.register(front, zmq.POLLIN)
+    por_socket: Dict[zmq.Socket, PrestamoWorker] = {}
+    for w in pool.workers:
+        w.sock = ctx.socket(zmq.DEALER)
+        w.sock.setsockopt(zmq.LINGER, 0)
+        w.sock.connect(w.addr)
+        poller.register(w.sock, zmq.POLLIN)
+        por_socket[w.sock] = w
+        print(f"[GC] Actor PRESTAMO vía {w.addr} (DEALER asíncrono)")
+
+    # token -> pendiente; el orden de inserción coincide con el de vencimiento (timeout fijo)
+    pendientes: "OrderedDict[bytes, PrestamoPendiente]" = OrderedDict()
+    timeout_s = args.prestamo_timeout_ms / 1000.0
+    siguiente_token = 0
+
+    def responder(destino: Destino, resp: dict):
+        if isinstance(destino, tuple):
+            lote, i = destino
+            lote.respuestas[i] = resp
+            lote.faltan -= 1
+            if lote.faltan:
+                return
+            destino, resp = lote.envelope, {"ok": True, "respuestas": lote.respuestas}
+        front.send_multipart(destino + [json.dumps(resp).encode("utf-8")])
+
+    def atender(destino: Destino, op: str, msg: dict):
+        nonlocal siguiente_token
+        if op != "PRESTAMO":
+            responder(destino, despachar_asincrono(op, msg, get_actor_por_topico, cola_pub))
+            return
+
+        siguiente_token += 1
+        token = siguiente_token.to_bytes(8, "big")
+        idsol = msg.get("idSolicitud") or "?"
+        w = pool.elegir()
+        w.en_vuelo += 1
+        pendientes[token] = PrestamoPendiente(destino, idsol, time.monotonic() + timeout_s, w)
+        w.sock.send_multipart([token, b"", json.dumps(msg).encode("utf-8")])
+
+    def recibir(destino: Destino, msg: dict):
+        op = msg["op"].upper()
+        ocupado = admision.admitir(op, msg) if admision is not None else None
+        if ocupado is not None:
+            responder(destino, ocupado)
+        elif planificador is None:
+            atender(destino, op, msg)
+        else:
+            clase = PRESTAMO if op == "PRESTAMO" else ASYNC
+            planificador.encolar((msg.get("sede") or "").upper(), clase, (destino, op, msg))
+
+    print("[GC] Esperando mensajes...")
+    try:
+        while True:
+            # Con trabajo encolado no se espera: sólo se mira si llegó algo más urgente
+            socks = dict(poller.poll(0 if planificador is not None and len(planificador) else 100))
+
+            if front in socks:
+                # Drenar lo que haya llegado de los PS. Con planificador, de a un lote: el ROUTER
+                # alterna entre PS, así un préstamo no espera detrás de toda una ráfaga de DEV/REN
+                recibidos = 0
+                while planificador is None or recibidos < args.planificador_lote:
+                    recibidos += 1
+                    try:
+                        frames = front.recv_multipart(zmq.NOBLOCK)
+                    except zmq.Again:
+                        break
+                    envelope, raw = frames[:-1], frames[-1]
+                    msg, error = decodificar_solicitud(raw, args.lote_max)
+                    if error is not None:
+                        responder(envelope, error)
+                        continue
+                    if msg["op"].upper() != "LOTE":
+                        recibir(envelope, msg)
+                        continue
+
+                    solicitudes = msg["solicitudes"]
+                    lote = LoteEnCurso(envelope, [None] * len(solicitudes), len(solicitudes))
+                    for i, m in enumerate(solicitudes):
+                        error = validar_solicitud(m)
+                        if error is not None:
+                            responder((lote, i), error)
+                        else:
+                            recibir((lote, i), m)
+
+            if planificador is not None:
+                for _ in range(args.planificador_lote):
+                    item = planificador.siguiente()
+                    if item is None:
+                        break
+                    atender(*item)
+
+            for sock in socks:
+                w = por_socket.get(sock)
+                if w is None:
+                    continue
+                while True:
+                    try:
+                        frames = sock.recv_multipart(zmq.NOBLOCK)
+                    except zmq.Again:
+                        break
+                    token, raw = frames[0], frames[-1]
+                    pend = pendientes.pop(token, None)
+                    if pend is None:
+                        print(f"[GC][WARN] Respuesta tardía de actor PRESTAMO {w.addr} descartada")
+                        continue
+                    w.en_vuelo -= 1
+                    if w.salud is not None:
+                        w.salud.latido_trafico()
+                    try:
+                        resp_actor = json.loads(raw.decode("utf-8"))
+                    except Exception as e:
+                        resp_actor = {
+                            "ok": False,
+                            "error": True,
+                            "msg": f"Respuesta inválida del actor PRESTAMO: {e}",
+                        }
+                    responder(pend.destino, resp_actor)
+                    print(f"[GC] PRESTAMO id={pend.idSolicitud} ({w.addr}) → {resp_actor}")
+
+            # Vencer préstamos sin respuesta
+            ahora = time.monotonic()
+            while pendientes:
+                token, pend = next(iter(pendientes.items()))
+                if pend.deadline > ahora:
+                    break
+                del pendientes[token]
+                pend.worker.en_vuelo -= 1
+                pool.marcar_caido(pend.worker)
+                responder(
+                    pend.destino, {"ok": False, "timeout": True, "msg": "Actor PRESTAMO no responde (timeout)."}
+                )
+                print(f"[GC][WARN] PRESTAMO timeout con actor PRESTAMO {pend.worker.addr} id={pend.idSolicitud}")
+    finally:
+        front.close(0)
+        for w in pool.workers:
+            if w.sock is not None:
+                w.sock.close(0)
+                w.sock = None
 
 
 def main():
@@ -113,33 +737,127 @@ def main():
         "--hc-dev",
         dest="hc_dev",
         default="tcp://127.0.0.1:5601",
-        help="Health REP de actor DEVOLUCION",
+        help="Health REP de actor DEVOLUCION (varios separados por coma: grupo de actores)",
     )
     ap.add_argument(
         "--hc-ren",
         dest="hc_ren",
         default="tcp://127.0.0.1:5602",
-        help="Health REP de actor RENOVACION",
+        help="Health REP de actor RENOVACION (varios separados por coma: grupo de actores)",
+    )
+    ap.add_argument(
+        "--backlog-db",
+        dest="backlog_db",
+        default=None,
+        help="Archivo SQLite para el backlog de DEV/REN (sobrevive a reinicios del GC y se "
+        "reenvía al volver el actor). Default: backlog en memoria.",
+    )
+    # Entrega confirmada (al-menos-una-vez) de DEV/REN
+    ap.add_argument(
+        "--entrega",
+        choices=["simple", "confirmada"],
+        default="simple",
+        help="simple: se publica y se olvida. confirmada: los actores confirman cada mensaje "
+        "(--ack en el actor) y el GC reenvía los que no se confirmen a tiempo.",
+    )
+    ap.add_argument(
+        "--ack-bind",
+        dest="ack_bind",
+        default="tcp://*:5565",
+        help="(confirmada) Bind PULL donde los actores envían los acks (default tcp://*:5565)",
+    )
+    ap.add_argument(
+        "--ack-timeout-ms",
+        dest="ack_timeout_ms",
+        type=int,
+        default=5000,
+        help="(confirmada) Tiempo sin ack tras el cual se reenvía un mensaje (ms)",
+    )
+    ap.add_argument(
+        "--ack-ventana",
+        dest="ack_ventana",
+        type=int,
+        default=1000,
+        help="(confirmada) Máximo de mensajes sin confirmar por tópico",
+    )
+    # Vaciado del backlog al volver un actor
+    ap.add_argument(
+        "--backlog-ritmo",
+        dest="backlog_ritmo",
+        type=float,
+        default=0.0,
+        help="Mensajes/s por tópico al vaciar el backlog cuando el actor vuelve (default 0 = sin límite)",
+    )
+    ap.add_argument(
+        "--backlog-cola-actor",
+        dest="backlog_cola_actor",
+        type=int,
+        default=0,
+        help="Pausa el vaciado mientras el actor reporte al menos estos mensajes en cola "
+        "(default 0 = no se mira)",
+    )
+    # Reparto de DEV/REN a varios actores por tópico
+    ap.add_argument(
+        "--distribucion",
+        choices=["pubsub", "push"],
+        default="pubsub",
+        help="pubsub: PUB, cada actor suscrito recibe todos los mensajes. "
+        "push: PUSH por tópico, cada mensaje le llega a una sola instancia del grupo.",
+    )
+    ap.add_argument(
+        "--push-dev",
+        dest="push_dev",
+        default="tcp://*:5561",
+        help="(push) Bind PUSH para el grupo DEVOLUCION (default tcp://*:5561)",
+    )
+    ap.add_argument(
+        "--push-ren",
+        dest="push_ren",
+        default="tcp://*:5562",
+        help="(push) Bind PUSH para el grupo RENOVACION (default tcp://*:5562)",
     )
     # Actor PRESTAMO (síncrono)
     ap.add_argument(
         "--prestamo-addr",
         dest="prestamo_addr",
         default="tcp://127.0.0.1:5585",
-        help="Dirección REP del actor PRESTAMO (el GC se conecta por REQ).",
+        help="Dirección REP del actor PRESTAMO (el GC se conecta por REQ). "
+        "Acepta varias separadas por coma para repartir préstamos entre un pool de actores.",
+    )
+    ap.add_argument(
+        "--hc-prest",
+        dest="hc_prest",
+        default=None,
+        help="Health REP de los actores PRESTAMO, separados por coma y en el mismo orden que "
+        "--prestamo-addr. Los actores DOWN salen de rotación. Por defecto se monitorea "
+        "tcp://127.0.0.1:5603 si se usa el actor local por defecto; '' desactiva el monitoreo.",
     )
     # Timings del health checker
     ap.add_argument(
         "--health-interval",
         type=float,
         default=3.0,
-        help="Intervalo entre pings (s)",
+        help="Intervalo entre pings a un actor sano sin tráfico (s)",
+    )
+    ap.add_argument(
+        "--health-interval-min",
+        dest="health_interval_min",
+        type=float,
+        default=0.5,
+        help="Intervalo entre pings a un actor atrasado o DOWN (s)",
     )
     ap.add_argument(
         "--health-timeout-ms",
         type=int,
         default=1500,
-        help="Timeout de health (ms)",
+        help="Tiempo tras el cual un ping sin respuesta se da por perdido (ms)",
+    )
+    ap.add_argument(
+        "--phi-umbral",
+        dest="phi_umbral",
+        type=float,
+        default=8.0,
+        help="Umbral phi-accrual para declarar DOWN un actor que no responde (default 8)",
     )
     # Timeout para actor PRESTAMO
     ap.add_argument(
@@ -148,103 +866,197 @@ def main():
         default=5000,
         help="Timeout de actor PRESTAMO (ms)",
     )
+    # Control de admisión (0 = sin límite)
+    ap.add_argument(
+        "--admision-tasa-sede",
+        dest="admision_tasa_sede",
+        type=float,
+        default=0.0,
+        help="Solicitudes/s admitidas por sede; el resto recibe 'ocupado' (default 0 = sin límite)",
+    )
+    ap.add_argument(
+        "--admision-rafaga-sede",
+        dest="admision_rafaga_sede",
+        type=float,
+        default=0.0,
+        help="Ráfaga admitida por sede por encima de la tasa (default = la tasa, 1 s)",
+    )
+    ap.add_argument(
+        "--admision-max-backlog",
+        dest="admision_max_backlog",
+        type=int,
+        default=0,
+        help="Rechaza DEV/REN mientras el backlog del tópico tenga al menos estos mensajes",
+    )
+    ap.add_argument(
+        "--admision-max-cola-pub",
+        dest="admision_max_cola_pub",
+        type=int,
+        default=0,
+        help="Rechaza DEV/REN mientras la cola del publicador tenga al menos estos mensajes",
+    )
+    ap.add_argument(
+        "--admision-max-prestamos",
+        dest="admision_max_prestamos",
+        type=int,
+        default=0,
+        help="(router) Rechaza PRESTAMO con al menos estos préstamos en vuelo hacia los actores",
+    )
+    ap.add_argument(
+        "--retry-after-ms",
+        dest="retry_after_ms",
+        type=int,
+        default=200,
+        help="Espera sugerida al PS en las respuestas 'ocupado' por capacidad (ms)",
+    )
+    # Planificación PRESTAMO vs DEV/REN (modo router)
+    ap.add_argument(
+        "--planificacion",
+        default="fifo",
+        help="(router) fifo: orden de llegada. estricta: PRESTAMO siempre antes que DEV/REN. "
+        "P:A (p.ej. 4:1): hasta P préstamos por cada A DEV/REN. Las sedes se alternan.",
+    )
+    ap.add_argument(
+        "--planificacion-sede",
+        dest="planificacion_sede",
+        default=None,
+        help="(router) Política por sede que reemplaza a --planificacion, p.ej. 'SEDE1=8:1,SEDE2=estricta'",
+    )
+    ap.add_argument(
+        "--planificador-lote",
+        dest="planificador_lote",
+        type=int,
+        default=64,
+        help="(router) Solicitudes atendidas por vuelta antes de volver a mirar los sockets",
+    )
+    ap.add_argument(
+        "--lote-max",
+        dest="lote_max",
+        type=int,
+        default=1000,
+        help="Máximo de solicitudes por LOTE de un PS (0 = sin límite)",
+    )
+    # Front-end hacia los PS
+    ap.add_argument(
+        "--modo",
+        choices=["rep", "router"],
+        default="rep",
+        help="rep: un REP bloqueante (una solicitud a la vez). "
+        "router: ROUTER asíncrono con muchas solicitudes en vuelo.",
+    )
 
     args = ap.parse_args()
 
     ctx = zmq.Context.instance()
 
-    # REP para PS (solo este hilo)
-    rep = ctx.socket(zmq.REP)
-    rep.bind(args.rep)
-    print(f"[GC] REP en {args.rep}")
+    # Grupos DEV y REN (una o varias instancias cada uno)
+    def crear_backlog(topico: str) -> Union[BacklogMemoria, BacklogDurable]:
+        if not args.backlog_db:
+            return BacklogMemoria()
+        backlog = BacklogDurable(args.backlog_db, topico)
+        if len(backlog):
+            print(
+                f"[GC] {len(backlog)} mensajes {topico} pendientes en {args.backlog_db} "
+                "(se reenvían al volver VIVO)"
+            )
+        return backlog
 
-    # Cola y publicador (hilo dueño del PUB)
-    cola_pub: "queue.Queue[Tuple[str, dict]]" = queue.Queue()
-    threading.Thread(
-        target=publicador_worker,
-        args=(ctx, args.pub, cola_pub),
-        daemon=True,
-    ).start()
-
-    # Lista de actores a monitorear (solo DEV y REN para el patrón Pub/Sub)
-    actores = [
-        ActorInfo(nombre="ACTOR-DEV", topico="DEVOLUCION", hc_addr=args.hc_dev),
-        ActorInfo(nombre="ACTOR-REN", topico="RENOVACION", hc_addr=args.hc_ren),
+    grupos = [
+        GrupoActores.crear("ACTOR-DEV", "DEVOLUCION", parse_lista(args.hc_dev), crear_backlog("DEVOLUCION")),
+        GrupoActores.crear("ACTOR-REN", "RENOVACION", parse_lista(args.hc_ren), crear_backlog("RENOVACION")),
     ]
+    if args.distribucion == "pubsub":
+        for g in grupos:
+            if len(g.miembros) > 1:
+                print(
+                    f"[GC][WARN] {len(g.miembros)} actores {g.topico} con PUB/SUB: cada uno recibe "
+                    "todos los mensajes. Usa --distribucion push para repartirlos."
+                )
 
-    # Hilo de health
+    # Helper para hallar el grupo de actores por topic
+    def get_actor_por_topico(topico: str) -> Optional[GrupoActores]:
+        for g in grupos:
+            if g.topico == topico:
+                return g
+        return None
+
+    # Cola y publicador (hilo dueño del PUB y de los PUSH)
+    push_binds = {}
+    if args.distribucion == "push":
+        push_binds = {"DEVOLUCION": args.push_dev, "RENOVACION": args.push_ren}
+    cola_pub: "queue.Queue[Tuple[str, dict, Optional[int]]]" = queue.Queue()
+    confirmada = args.entrega == "confirmada"
     threading.Thread(
-        target=health_loop,
-        args=(ctx, actores, cola_pub, args.health_interval, args.health_timeout_ms),
+        target=publicador_worker,
+        args=(ctx, args.pub, cola_pub, push_binds, get_actor_por_topico, confirmada),
         daemon=True,
     ).start()
+    if confirmada:
+        EntregaConfirmada(
+            grupos, cola_pub, args.ack_bind, args.ack_timeout_ms / 1000.0, args.ack_ventana
+        ).iniciar(ctx)
 
-    # Helper para hallar Actor por topic
-    def get_actor_por_topico(topico: str) -> Optional[ActorInfo]:
-        for a in actores:
-            if a.topico == topico:
-                return a
-        return None
+    # Actores a monitorear: instancias DEV y REN + pool PRESTAMO si tiene health
+    actores = [m for g in grupos for m in g.miembros]
+    pool, salud_prestamo = crear_pool_prestamo(args)
+    actores.extend(salud_prestamo)
 
-    # Socket REQ dedicado para el actor PRESTAMO (síncrono)
-    prest_sock = ctx.socket(zmq.REQ)
-    prest_sock.connect(args.prestamo_addr)
-    prest_sock.setsockopt(zmq.RCVTIMEO, args.prestamo_timeout_ms)
-    prest_sock.setsockopt(zmq.SNDTIMEO, args.prestamo_timeout_ms)
-    print(f"[GC] Actor PRESTAMO vía {args.prestamo_addr}")
+    # Con entrega confirmada el backlog lo drena el repartidor
+    vaciado = None
+    if not confirmada:
+        vaciado = VaciadoBacklog(grupos, cola_pub, args.backlog_ritmo, args.backlog_cola_actor)
+        vaciado.iniciar()
 
-    print("[GC] Esperando mensajes...")
-    try:
-        while True:
-            raw = rep.recv()
-            try:
-                msg = json.loads(raw.decode("utf-8"))
-            except Exception as e:
-                rep.send_string(json.dumps({"ok": False, "msg": f"payload no-JSON: {e}"}))
-                continue
+    # Health checker
+    MonitorSalud(
+        ctx,
+        actores,
+        args.health_interval,
+        args.health_interval_min,
+        args.health_timeout_ms,
+        args.phi_umbral,
+        al_volver=None if vaciado is None else (lambda a: vaciado.aviso.set()),
+    ).iniciar()
 
-            op = (msg.get("op") or "").upper()
-            if op not in ("DEVOLUCION", "RENOVACION", "PRESTAMO"):
-                rep.send_string(json.dumps({"ok": False, "msg": "op no soportada (DEV/REN/PREST)"}))
-                print(f"[GC] op desconocida: {op} payload={msg}")
-                continue
+    def backlog_de(topico: str) -> Optional[Union[BacklogMemoria, BacklogDurable]]:
+        g = get_actor_por_topico(topico)
+        return g.backlog if g else None
 
-            if op == "PRESTAMO":
-                # Patrón síncrono PS→GC→Actor PREST→GA→Actor PREST→GC→PS
-                try:
-                    prest_sock.send_json(msg)
-                    resp_actor = prest_sock.recv_json()
-                    rep.send_string(json.dumps(resp_actor))
-                    print(f"[GC] PRESTAMO id={msg.get('idSolicitud')} → {resp_actor}")
-                except zmq.Again:
-                    resp = {"ok": False, "msg": "Actor PRESTAMO no responde (timeout)."}
-                    rep.send_string(json.dumps(resp))
-                    print(f"[GC][WARN] PRESTAMO timeout con actor PRESTAMO")
-                except Exception as e:
-                    resp = {"ok": False, "msg": f"Error hablando con actor PRESTAMO: {e}"}
-                    rep.send_string(json.dumps(resp))
-                    print(f"[GC][ERROR] PRESTAMO fallo: {e}")
-                continue
+    admision = ControlAdmision(
+        args.admision_tasa_sede,
+        args.admision_rafaga_sede,
+        args.admision_max_backlog,
+        args.admision_max_cola_pub,
+        args.admision_max_prestamos,
+        args.retry_after_ms,
+        backlog_de,
+        cola_pub,
+        pool.en_vuelo,
+    )
+    if not admision.activo:
+        admision = None
 
-            # DEVOLUCION / RENOVACION (patrón asíncrono con Pub/Sub)
-            # Responder inmediato al PS
-            rep.send_string(json.dumps({"ok": True, "msg": "Recibido y (re)publicado si hay actor VIVO"}))
+    planificador = None
+    if args.planificacion != "fifo" or args.planificacion_sede:
+        if args.modo != "router":
+            raise SystemExit("--planificacion requiere --modo router (el REP atiende de a una solicitud).")
+        if args.planificacion == "fifo":
+            raise SystemExit("--planificacion-sede requiere una --planificacion por defecto (estricta o P:A).")
+        try:
+            politica = parse_politica(args.planificacion)
+            planificador = Planificador(politica, parse_politicas_sede(args.planificacion_sede))
+        except ValueError as e:
+            raise SystemExit(str(e))
 
-            actor = get_actor_por_topico(op)
-            if actor and actor.vivo:
-                cola_pub.put((op, msg))
-            else:
-                if actor:
-                    actor.backlog.append(msg)
-                    print(f"[GC] {actor.nombre} DOWN → backlog {len(actor.backlog)} (tópico {op})")
-                else:
-                    print(f"[GC] No hay actor configurado para tópico {op}")
+    try:
+        if args.modo == "router":
+            servir_router(ctx, args, get_actor_por_topico, cola_pub, pool, admision, planificador)
+        else:
+            servir_rep(ctx, args, get_actor_por_topico, cola_pub, pool, admision)
     except KeyboardInterrupt:
         print("\n[GC] Saliendo...")
     finally:
         try:
-            rep.close(0)
-            prest_sock.close(0)
             ctx.term()
         except Exception:
             pass
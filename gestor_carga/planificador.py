@@ -0,0 +1,96 @@
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+# Clases de operación: los préstamos tienen a un usuario esperando; DEV/REN se confirman igual
+PRESTAMO = "PRESTAMO"
+ASYNC = "ASYNC"
+
+# Política de una sede: None = prioridad estricta a PRESTAMO; (p, a) = p préstamos por cada a DEV/REN
+Politica = Optional[Tuple[int, int]]
+
+
+def parse_politica(valor: str) -> Politica:
+    """
+    "estricta" o "P:A" (pesos PRESTAMO:DEV/REN, p.ej. "4:1").
+    """
+    valor = valor.strip().lower()
+    if valor == "estricta":
+        return None
+    try:
+        p, a = (int(x) for x in valor.split(":"))
+    except ValueError:
+        raise ValueError(f"Política inválida (se espera 'estricta' o 'P:A'): {valor}")
+    if p < 1 or a < 1:
+        raise ValueError(f"Los pesos deben ser >= 1: {valor}")
+    return (p, a)
+
+
+def parse_politicas_sede(spec: Optional[str]) -> Dict[str, Politica]:
+    """
+    "SEDE1=8:1,SEDE2=estricta" → {sede: política}.
+    """
+    politicas: Dict[str, Politica] = {}
+    for item in (spec or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        if "=" not in item:
+            raise ValueError(f"Política por sede inválida (se espera SEDE=política): {item}")
+        sede, valor = item.split("=", 1)
+        politicas[sede.strip().upper()] = parse_politica(valor)
+    return politicas
+
+
+class Planificador:
+    """
+    Colas separadas por sede y clase de operación (PRESTAMO / DEV-REN).
+    siguiente() alterna entre sedes (round-robin, ninguna acapara el GC) y dentro de cada sede
+    elige la clase según su política: estricta (siempre PRESTAMO primero) o ponderada
+    (hasta P préstamos por cada A DEV/REN). Nunca deja trabajo esperando si la otra clase está vacía.
+    """
+
+    def __init__(self, politica: Politica, politicas_sede: Optional[Dict[str, Politica]] = None):
+        self.politica = politica
+        self.politicas_sede = politicas_sede or {}
+        self._colas: Dict[str, Dict[str, Deque[Any]]] = {}
+        self._sedes: List[str] = []
+        self._turno_sede = 0
+        # sede -> (clase en turno, cuántos lleva servidos en este turno)
+        self._turno_clase: Dict[str, Tuple[str, int]] = {}
+        self._total = 0
+
+    def __len__(self) -> int:
+        return self._total
+
+    def encolar(self, sede: str, clase: str, item: Any):
+        colas = self._colas.get(sede)
+        if colas is None:
+            colas = self._colas[sede] = {PRESTAMO: deque(), ASYNC: deque()}
+            self._sedes.append(sede)
+        colas[clase].append(item)
+        self._total += 1
+
+    def _clase(self, sede: str, colas: Dict[str, Deque[Any]]) -> str:
+        if not colas[PRESTAMO]:
+            return ASYNC
+        if not colas[ASYNC]:
+            return PRESTAMO
+        politica = self.politicas_sede.get(sede, self.politica)
+        if politica is None:
+            return PRESTAMO
+        pesos = {PRESTAMO: politica[0], ASYNC: politica[1]}
+        clase, servidos = self._turno_clase.get(sede, (PRESTAMO, 0))
+        if servidos >= pesos[clase]:
+            clase, servidos = (ASYNC if clase == PRESTAMO else PRESTAMO), 0
+        self._turno_clase[sede] = (clase, servidos + 1)
+        return clase
+
+    def siguiente(self) -> Optional[Any]:
+        for _ in range(len(self._sedes)):
+            sede = self._sedes[self._turno_sede % len(self._sedes)]
+            self._turno_sede += 1
+            colas = self._colas[sede]
+            if colas[PRESTAMO] or colas[ASYNC]:
+                self._total -= 1
+                return colas[self._clase(sede, colas)].popleft()
+        return None
@@ -0,0 +1,194 @@
+import json
+import math
+import statistics
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Deque, Dict, List, Optional
+
+import zmq
+from zmq.utils.monitor import recv_monitor_message
+
+from gestor_carga.backlog import BacklogMemoria
+
+
+class DetectorPhi:
+    """
+    Detector de fallas phi-accrual: en vez de un timeout fijo estima la distribución (normal) de
+    los intervalos entre latidos y devuelve phi = -log10(P(el próximo latido llegue aún más tarde)).
+    phi=1 es un latido ~10% atrasado respecto de lo esperable; phi=8, uno en 10^8.
+    """
+
+    def __init__(self, ventana: int = 100, granularidad_s: float = 0.1):
+        self._intervalos: Deque[float] = deque(maxlen=ventana)
+        # Latidos más seguidos que esto (tráfico) no aportan muestras, sólo mueven `ultimo`
+        self._granularidad_s = granularidad_s
+        self.ultimo: Optional[float] = None
+
+    def latido(self, t: float):
+        if self.ultimo is not None:
+            if t <= self.ultimo:
+                return
+            if t - self.ultimo >= self._granularidad_s:
+                self._intervalos.append(t - self.ultimo)
+        self.ultimo = t
+
+    def phi(self, ahora: float, media_min: float) -> float:
+        """
+        media_min: intervalo esperable aunque no haya muestras (el de los pings). Evita que una
+        racha de tráfico enseñe intervalos cortísimos y un silencio posterior parezca una caída.
+        """
+        if self.ultimo is None:
+            return 0.0
+        media = max(statistics.fmean(self._intervalos) if self._intervalos else 0.0, media_min)
+        desvio = statistics.pstdev(self._intervalos) if len(self._intervalos) > 1 else 0.0
+        desvio = max(desvio, media / 4)
+        p_mas_tarde = 0.5 * math.erfc((ahora - self.ultimo - media) / (desvio * math.sqrt(2)))
+        return -math.log10(max(p_mas_tarde, 1e-300))
+
+
+@dataclass
+class ActorInfo:
+    nombre: str
+    topico: str  # "DEVOLUCION", "RENOVACION" o "PRESTAMO"
+    hc_addr: str  # tcp://IP:PORT del REP health del actor
+    vivo: bool = False
+    ultimo_ok: float = 0.0
+    backlog: BacklogMemoria = field(default_factory=BacklogMemoria)  # mensajes pendientes cuando está DOWN
+    detector: DetectorPhi = field(default_factory=DetectorPhi)
+    # Latido llevado por el tráfico normal (p.ej. una respuesta de PRESTAMO); lo escribe otro hilo
+    ultimo_trafico: float = 0.0
+    ultimo_ping: float = 0.0
+    ping_deadline: float = 0.0  # > 0 mientras hay un ping sin respuesta
+    en_cola: int = 0  # mensajes pendientes que el actor reportó en su último health
+    sock: Optional[zmq.Socket] = None  # DEALER de health (sólo lo usa el monitor)
+
+    def latido_trafico(self):
+        self.ultimo_trafico = time.monotonic()
+
+
+class MonitorSalud:
+    """
+    Health checker de un solo hilo y sin bloqueos: un DEALER por actor, todos en el mismo poller,
+    así los pings van en paralelo y un actor caído no demora a los demás.
+    - Intervalos adaptativos: un actor sano se pingea cada `intervalo` (y nada si su tráfico ya
+      trae latidos); uno atrasado o DOWN, cada `intervalo_min`, para detectar pronto la vuelta,
+      y uno con mensajes en cola también, para tener fresco su `en_cola`.
+    - DOWN por phi-accrual (phi >= umbral_phi) o en el acto si el monitor del socket avisa que se
+      cortó la conexión (proceso caído).
+    - Al volver VIVO llama a al_volver(actor) (p.ej. vaciar el backlog).
+    """
+
+    def __init__(
+        self,
+        ctx: zmq.Context,
+        actores: List[ActorInfo],
+        intervalo: float,
+        intervalo_min: float,
+        timeout_ms: int,
+        umbral_phi: float,
+        al_volver: Optional[Callable[[ActorInfo], None]] = None,
+    ):
+        self.ctx = ctx
+        self.actores = actores
+        self.intervalo = intervalo
+        self.intervalo_min = min(intervalo_min, intervalo)
+        self.timeout_s = timeout_ms / 1000.0
+        self.umbral_phi = umbral_phi
+        self.al_volver = al_volver
+
+    def iniciar(self):
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def _marcar(self, a: ActorInfo, vivo: bool, motivo: str):
+        if a.vivo == vivo:
+            return
+        a.vivo = vivo
+        print(f"[salud] {a.nombre} {'VIVO' if vivo else 'DOWN'} ({motivo})")
+        if vivo and self.al_volver is not None:
+            self.al_volver(a)
+
+    def _latido(self, a: ActorInfo, t: float, motivo: str):
+        a.detector.latido(t)
+        a.ultimo_ok = time.time()
+        self._marcar(a, True, motivo)
+
+    def _proximo_ping(self, a: ActorInfo, ahora: float) -> float:
+        atrasado = not a.vivo or a.detector.phi(ahora, self.intervalo) >= 1.0
+        # Un actor con mensajes en cola se consulta más seguido: su en_cola regula el backlog
+        atrasado = atrasado or a.en_cola > 0
+        base = max(a.ultimo_ping, a.detector.ultimo or 0.0)
+        return base + (self.intervalo_min if atrasado else self.intervalo)
+
+    def _ping(self, a: ActorInfo, ahora: float):
+        a.ultimo_ping = ahora
+        try:
+            a.sock.send_multipart([b"", json.dumps({"type": "health"}).encode("utf-8")], zmq.NOBLOCK)
+            a.ping_deadline = ahora + self.timeout_s
+        except zmq.Again:
+            # IMMEDIATE: sin conexión establecida no se encola nada
+            self._marcar(a, False, "sin conexión")
+
+    def _loop(self):
+        poller = zmq.Poller()
+        por_socket: Dict[zmq.Socket, ActorInfo] = {}
+        monitores: Dict[zmq.Socket, ActorInfo] = {}
+        for a in self.actores:
+            a.sock = self.ctx.socket(zmq.DEALER)
+            a.sock.setsockopt(zmq.LINGER, 0)
+            a.sock.setsockopt(zmq.IMMEDIATE, 1)
+            mon = a.sock.get_monitor_socket(zmq.EVENT_DISCONNECTED)
+            a.sock.connect(a.hc_addr)
+            poller.register(a.sock, zmq.POLLIN)
+            poller.register(mon, zmq.POLLIN)
+            por_socket[a.sock] = a
+            monitores[mon] = a
+        print(
+            f"[salud] Monitoreando {len(self.actores)} actores (cada {self.intervalo:g}s, "
+            f"{self.intervalo_min:g}s si están atrasados o DOWN; phi >= {self.umbral_phi:g} → DOWN)"
+        )
+        try:
+            while True:
+                ahora = time.monotonic()
+                for a in self.actores:
+                    if a.ultimo_trafico > (a.detector.ultimo or 0.0):
+                        self._latido(a, a.ultimo_trafico, "tráfico")
+                    if a.ping_deadline and ahora >= a.ping_deadline:
+                        a.ping_deadline = 0.0  # ping perdido: cuenta en phi, no tumba por sí solo
+                    if not a.ping_deadline and ahora >= self._proximo_ping(a, ahora):
+                        self._ping(a, ahora)
+                    if a.vivo:
+                        phi = a.detector.phi(ahora, self.intervalo)
+                        if phi >= self.umbral_phi:
+                            self._marcar(a, False, f"phi={phi:.1f}")
+
+                for sock, _ in poller.poll(int(self.intervalo_min * 1000 / 2)):
+                    a = monitores.get(sock)
+                    if a is not None:
+                        recv_monitor_message(sock)
+                        a.ping_deadline = 0.0
+                        self._marcar(a, False, "conexión cerrada")
+                        continue
+                    a = por_socket[sock]
+                    while True:
+                        try:
+                            frames = sock.recv_multipart(zmq.NOBLOCK)
+                        except zmq.Again:
+                            break
+                        try:
+                            resp = json.loads(frames[-1].decode("utf-8"))
+                        except Exception:
+                            resp = {}
+                        if resp.get("type") == "health_ok":
+                            a.en_cola = int(resp.get("en_cola") or 0)
+                            a.ping_deadline = 0.0
+                            self._latido(a, time.monotonic(), "health")
+        finally:
+            for a in self.actores:
+                if a.sock is not None:
+                    a.sock.disable_monitor()
+                    a.sock.close(0)
+                    a.sock = None
+            for mon in monitores:
+                mon.close(0)
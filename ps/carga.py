@@ -0,0 +1,223 @@
+import heapq
+import json
+import random
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import zmq
+
+from common.metricas import OCUPADO, TIMEOUT, MetricasPS, clasificar
+from common.ruteo import RuteoGC
+
+
+@dataclass
+class Pendiente:
+    msg: dict
+    t0: float  # cuándo debía salir (lazo abierto) o cuándo salió: la latencia se mide desde acá
+    candidatos: List[str] = field(default_factory=list)  # GC en orden de failover
+    intento: int = 0
+    ocupados: int = 0
+    ep: str = ""
+
+
+class GeneradorCarga:
+    """
+    Modo carga del PS: muchos clientes virtuales desde un solo proceso y un solo hilo.
+    Un DEALER por GC con muchas solicitudes en vuelo; cada respuesta se empareja por un token que
+    viaja en el sobre (el ROUTER o REP del GC lo devuelve intacto).
+    - Lazo cerrado: `clientes` clientes, cada uno manda la siguiente solicitud cuando recibe la
+      respuesta de la anterior (más `pausa_s` de "tiempo de pensar").
+    - Lazo abierto: las solicitudes llegan a `tasa` por segundo pase lo que pase con las respuestas;
+      `clientes` sólo acota cuántas quedan en vuelo. La latencia se mide desde la llegada prevista,
+      así una solicitud demorada por el propio cliente no esconde la espera.
+    Timeouts: failover al siguiente GC del ruteo. "Ocupado": se reintenta tras retry_after_ms.
+    """
+
+    def __init__(
+        self,
+        ctx: zmq.Context,
+        ruteo: RuteoGC,
+        mensajes: Iterable[dict],
+        clientes: int,
+        abierto: bool,
+        tasa: float,
+        pausa_s: float,
+        timeout_ms: int,
+        reintentos_ocupado: int,
+        label: str = "",
+    ):
+        self.ctx = ctx
+        self.ruteo = ruteo
+        # Se consumen a medida que se envían: el archivo no se carga entero
+        self._fuente = iter(mensajes)
+        self._proximo: Optional[dict] = next(self._fuente, None)
+        self.clientes = max(1, clientes)
+        self.abierto = abierto
+        self.tasa = tasa
+        self.pausa_s = pausa_s
+        self.timeout_s = timeout_ms / 1000.0
+        self.reintentos_ocupado = reintentos_ocupado
+        self.label = label
+
+        self.poller = zmq.Poller()
+        self.socks: Dict[str, zmq.Socket] = {}
+        # token -> pendiente; con timeout fijo, el orden de inserción es el de vencimiento
+        self.pendientes: "OrderedDict[bytes, Tuple[float, Pendiente]]" = OrderedDict()
+        # envíos diferidos: (cuándo, secuencia, pendiente o None = nueva solicitud de un cliente)
+        self.agenda: List[Tuple[float, int, Optional[Pendiente]]] = []
+        self._seq = 0
+        self._token = 0
+        self.siguiente = 0  # mensajes ya tomados de la fuente
+
+        self.metricas = MetricasPS()
+        self.atrasadas = 0  # lazo abierto: salieron tarde porque ya había `clientes` en vuelo
+
+    def _socket(self, ep: str) -> zmq.Socket:
+        sock = self.socks.get(ep)
+        if sock is None:
+            sock = self.ctx.socket(zmq.DEALER)
+            sock.setsockopt(zmq.LINGER, 0)
+            sock.connect(ep)
+            self.poller.register(sock, zmq.POLLIN)
+            self.socks[ep] = sock
+        return sock
+
+    def _agendar(self, cuando: float, p: Optional[Pendiente]):
+        self._seq += 1
+        heapq.heappush(self.agenda, (cuando, self._seq, p))
+
+    def _enviar(self, p: Pendiente, ahora: float):
+        self._token += 1
+        token = self._token.to_bytes(8, "big")
+        p.ep = p.candidatos[p.intento]
+        self.pendientes[token] = (ahora + self.timeout_s, p)
+        self._socket(p.ep).send_multipart([token, b"", json.dumps(p.msg).encode("utf-8")])
+
+    def _hay_mas(self) -> bool:
+        return self._proximo is not None
+
+    def _nueva(self, ahora: float, t0: float):
+        msg = self._proximo
+        self._proximo = next(self._fuente, None)
+        self.siguiente += 1
+        self._enviar(Pendiente(msg=msg, t0=t0, candidatos=self.ruteo.candidatos(msg)), ahora)
+
+    def _terminada(self, ahora: float):
+        # Lazo cerrado: el cliente que se liberó manda la siguiente
+        if self.abierto or not self._hay_mas():
+            return
+        if self.pausa_s > 0:
+            self._agendar(ahora + self.pausa_s, None)
+        else:
+            self._nueva(ahora, ahora)
+
+    def _respuesta(self, p: Pendiente, reply: dict, ahora: float):
+        self.ruteo.marcar_ok(p.ep)
+        op = p.msg.get("op", "?")
+        if reply.get("ocupado"):
+            self.metricas.respuestas_ocupado += 1
+            if p.ocupados < self.reintentos_ocupado:
+                p.ocupados += 1
+                espera = reply.get("retry_after_ms", 200) / 1000.0 * random.uniform(1.0, 1.5)
+                self._agendar(ahora + espera, p)
+                return
+            self.metricas.registrar(op, OCUPADO)
+        else:
+            self.metricas.registrar(op, clasificar(reply), ahora - p.t0)
+        self._terminada(ahora)
+
+    def _vencer(self, ahora: float):
+        while self.pendientes:
+            token, (deadline, p) = next(iter(self.pendientes.items()))
+            if deadline > ahora:
+                break
+            del self.pendientes[token]
+            self.ruteo.marcar_caido(p.ep)
+            p.intento += 1
+            if p.intento < len(p.candidatos):
+                print(
+                    f"{self.label}[PS][WARN] Timeout con GC {p.ep} para id={p.msg.get('idSolicitud')}, "
+                    "probando siguiente..."
+                )
+                self._enviar(p, ahora)
+            else:
+                print(f"{self.label}[PS][WARN] Timeout para id={p.msg.get('idSolicitud')} (ningún GC respondió)")
+                self.metricas.registrar(p.msg.get("op", "?"), TIMEOUT)
+                self._terminada(ahora)
+
+    def _llegadas(self, inicio: float, ahora: float) -> Optional[float]:
+        """
+        Lazo abierto: envía las solicitudes cuya llegada ya pasó. Devuelve la próxima llegada.
+        """
+        while self._hay_mas():
+            llegada = inicio + self.siguiente / self.tasa
+            if llegada > ahora:
+                return llegada
+            if len(self.pendientes) >= self.clientes:
+                return ahora + 0.001  # sin lugar: se reintenta enseguida
+            if ahora - llegada > 0.01:
+                self.atrasadas += 1
+            self._nueva(ahora, llegada)
+        return None
+
+    def correr(self):
+        """
+        Envía todos los mensajes y espera sus respuestas; los resultados quedan en self.metricas.
+        """
+        for ep in self.ruteo.anillo.nodos:
+            self._socket(ep)
+        modo = f"abierto a {self.tasa:g} req/s" if self.abierto else "cerrado"
+        print(f"{self.label}[PS] Modo carga: {self.clientes} clientes, lazo {modo}")
+        self.metricas.iniciar()
+        inicio = time.perf_counter()
+        if not self.abierto:
+            for _ in range(self.clientes):
+                if not self._hay_mas():
+                    break
+                self._nueva(inicio, inicio)
+        try:
+            while self._hay_mas() or self.pendientes or self.agenda:
+                ahora = time.perf_counter()
+                while self.agenda and self.agenda[0][0] <= ahora:
+                    _, _, p = heapq.heappop(self.agenda)
+                    if p is None:
+                        # El mensaje se toma recién ahora: otros clientes pudieron vaciar la fuente
+                        if self._hay_mas():
+                            self._nueva(ahora, ahora)
+                    else:
+                        self._enviar(p, ahora)
+                proxima = self._llegadas(inicio, ahora) if self.abierto else None
+                self._vencer(ahora)
+
+                # Dormir hasta el próximo evento (respuesta, envío agendado, llegada o vencimiento)
+                eventos = [0.1]
+                if self.agenda:
+                    eventos.append(self.agenda[0][0] - ahora)
+                if proxima is not None:
+                    eventos.append(proxima - ahora)
+                if self.pendientes:
+                    eventos.append(next(iter(self.pendientes.values()))[0] - ahora)
+                espera_ms = max(0, int(min(eventos) * 1000))
+
+                for sock, _ in self.poller.poll(espera_ms):
+                    while True:
+                        try:
+                            frames = sock.recv_multipart(zmq.NOBLOCK)
+                        except zmq.Again:
+                            break
+                        entrada = self.pendientes.pop(frames[0], None)
+                        if entrada is None:
+                            continue  # respuesta tardía de una solicitud ya vencida
+                        try:
+                            reply = json.loads(frames[-1].decode("utf-8"))
+                        except Exception:
+                            reply = {"ok": False}
+                        self._respuesta(entrada[1], reply, time.perf_counter())
+        finally:
+            for sock in self.socks.values():
+                sock.close(0)
+            self.metricas.terminar()
+        if self.atrasadas:
+            print(f"{self.label}[PS][WARN] {self.atrasadas} solicitudes salieron tarde (--clientes en vuelo)")
@@ -0,0 +1,210 @@
+"""
+Generador de cargas sintéticas para el PS (mismo formato JSON por línea que ps/data/*.txt).
+
+- Mezcla de operaciones configurable (--mezcla) y reparto por sede (--sedes).
+- Popularidad de libros Zipf (--zipf s; 0 = uniforme): unos pocos títulos calientes concentran
+  los préstamos, como en una biblioteca real, y generan contención en el GA.
+- Población de usuarios por sede (--usuarios).
+- Coherente con ga/init_db.py: parte de los préstamos ACTIVO sembrados y lleva la cuenta de los
+  préstamos que va generando, así DEVOLUCION y RENOVACION apuntan a préstamos que existen
+  (si las solicitudes se aplican en el orden del archivo).
+
+Genera en streaming (memoria proporcional a los libros, no a las solicitudes), a un archivo o a
+stdout para pasarlo directo al PS con --file -:
+    python -m ps.generar_carga --n 1000000 --zipf 1.1 --salida /tmp/carga.txt
+    python -m ps.generar_carga --n 50000 --sedes SEDE1=1 | python -m ps.ps --file - --interval 0
+"""
+import argparse
+import bisect
+import itertools
+import json
+import random
+import sys
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from ga.init_db import TOTAL_LIBROS, prestados_iniciales, sede_libro
+
+OPS = ("PRESTAMO", "DEVOLUCION", "RENOVACION")
+
+
+def parse_pesos(spec: str, claves: Optional[Tuple[str, ...]] = None) -> Dict[str, float]:
+    """
+    "PRESTAMO=0.5,DEVOLUCION=0.3,RENOVACION=0.2" → {clave: peso}. Los pesos no necesitan sumar 1.
+    """
+    pesos: Dict[str, float] = {}
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        if "=" not in item:
+            raise ValueError(f"Peso inválido (se espera CLAVE=peso): {item}")
+        clave, valor = item.split("=", 1)
+        clave = clave.strip().upper()
+        if claves is not None and clave not in claves:
+            raise ValueError(f"Clave desconocida: {clave} (opciones: {', '.join(claves)})")
+        pesos[clave] = float(valor)
+    if not pesos or sum(pesos.values()) <= 0 or min(pesos.values()) < 0:
+        raise ValueError(f"Pesos inválidos: {spec}")
+    return pesos
+
+
+class Zipf:
+    """
+    Muestreo Zipf sobre `items` (rango 1 = el más popular): P(r) ∝ 1 / r^s, por búsqueda binaria
+    sobre los pesos acumulados.
+    """
+
+    def __init__(self, items: List[int], s: float, rnd: random.Random):
+        self.items = items
+        self.rnd = rnd
+        self._acum = list(itertools.accumulate(1.0 / (r ** s) for r in range(1, len(items) + 1)))
+
+    def muestra(self) -> int:
+        i = bisect.bisect(self._acum, self.rnd.random() * self._acum[-1])
+        return self.items[min(i, len(self.items) - 1)]
+
+
+class Prestamos:
+    """
+    Préstamos ACTIVO de una sede (libro → usuario), con elección al azar en O(1).
+    """
+
+    def __init__(self):
+        self._libros: List[int] = []
+        self._pos: Dict[int, int] = {}
+        self.usuario: Dict[int, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._libros)
+
+    def __contains__(self, libro: int) -> bool:
+        return libro in self._pos
+
+    def agregar(self, libro: int, usuario: str):
+        self._pos[libro] = len(self._libros)
+        self._libros.append(libro)
+        self.usuario[libro] = usuario
+
+    def quitar(self, libro: int):
+        i = self._pos.pop(libro)
+        ultimo = self._libros.pop()
+        if ultimo != libro:
+            self._libros[i] = ultimo
+            self._pos[ultimo] = i
+        del self.usuario[libro]
+
+    def elegir(self, rnd: random.Random) -> int:
+        return self._libros[rnd.randrange(len(self._libros))]
+
+
+class GeneradorCargaSintetica:
+    def __init__(
+        self,
+        mezcla: Dict[str, float],
+        sedes: Dict[str, float],
+        zipf_s: float,
+        usuarios: int,
+        semilla: int,
+        prefijo: str,
+    ):
+        self.rnd = random.Random(semilla)
+        self.prefijo = prefijo
+        self.usuarios = max(1, usuarios)
+        self.ops = list(mezcla)
+        self.pesos_ops = [mezcla[op] for op in self.ops]
+        self.sedes = list(sedes)
+        self.pesos_sedes = [sedes[s] for s in self.sedes]
+
+        self.zipf: Dict[str, Zipf] = {}
+        self.prestamos: Dict[str, Prestamos] = {}
+        iniciales = prestados_iniciales()
+        for sede in self.sedes:
+            libros = [i for i in range(1, TOTAL_LIBROS + 1) if sede_libro(i) == sede]
+            if not libros:
+                raise ValueError(f"Sede sin libros en init_db.py: {sede}")
+            # Qué libros son los populares también sale de la semilla
+            self.rnd.shuffle(libros)
+            self.zipf[sede] = Zipf(libros, zipf_s, self.rnd)
+            self.prestamos[sede] = Prestamos()
+            for i in iniciales.get(sede, []):
+                self.prestamos[sede].agregar(i, f"U{i:04d}")
+
+    def _usuario(self) -> str:
+        return f"U{self.rnd.randint(1, self.usuarios):04d}"
+
+    def solicitudes(self, n: int) -> Iterator[dict]:
+        for k in range(1, n + 1):
+            sede = self.rnd.choices(self.sedes, self.pesos_sedes)[0]
+            op = self.rnd.choices(self.ops, self.pesos_ops)[0]
+            activos = self.prestamos[sede]
+            if op != "PRESTAMO" and not len(activos):
+                op = "PRESTAMO"  # nada que devolver o renovar en la sede
+
+            if op == "PRESTAMO":
+                libro = self.zipf[sede].muestra()
+                usuario = self._usuario()
+                # Si el libro ya está prestado el GA lo rechaza: es la contención sobre títulos calientes
+                if libro not in activos:
+                    activos.agregar(libro, usuario)
+            else:
+                libro = activos.elegir(self.rnd)
+                usuario = activos.usuario[libro]
+                if op == "DEVOLUCION":
+                    activos.quitar(libro)
+
+            yield {
+                "op": op,
+                "idSolicitud": f"{self.prefijo}{k:07d}",
+                "idUsuario": usuario,
+                "idLibro": f"L{libro:04d}",
+                "sede": sede,
+            }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Genera solicitudes sintéticas (JSON por línea) para el PS")
+    ap.add_argument("--n", type=int, default=1000, help="Cantidad de solicitudes")
+    ap.add_argument(
+        "--mezcla",
+        default="PRESTAMO=0.5,DEVOLUCION=0.3,RENOVACION=0.2",
+        help="Pesos de cada operación",
+    )
+    ap.add_argument("--sedes", default="SEDE1=0.5,SEDE2=0.5", help="Pesos de cada sede")
+    ap.add_argument(
+        "--zipf",
+        type=float,
+        default=1.0,
+        help="Exponente Zipf de la popularidad de libros (0 = uniforme; más alto = más concentrado)",
+    )
+    ap.add_argument("--usuarios", type=int, default=1000, help="Usuarios distintos por sede")
+    ap.add_argument("--semilla", type=int, default=1, help="Semilla (misma semilla = mismo archivo)")
+    ap.add_argument("--prefijo", default="G-", help="Prefijo de idSolicitud (distinto por archivo)")
+    ap.add_argument("--salida", default="-", help="Archivo de salida ('-' = stdout)")
+    args = ap.parse_args()
+
+    try:
+        gen = GeneradorCargaSintetica(
+            parse_pesos(args.mezcla, OPS),
+            parse_pesos(args.sedes),
+            args.zipf,
+            args.usuarios,
+            args.semilla,
+            args.prefijo,
+        )
+    except ValueError as e:
+        raise SystemExit(str(e))
+
+    salida = sys.stdout if args.salida == "-" else open(args.salida, "w", encoding="utf-8")
+    try:
+        for msg in gen.solicitudes(args.n):
+            salida.write(json.dumps(msg, separators=(",", ":")) + "\n")
+    except BrokenPipeError:
+        pass  # el PS dejó de leer
+    finally:
+        if salida is not sys.stdout:
+            salida.close()
+            print(f"[GEN] {args.n} solicitudes en {args.salida}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
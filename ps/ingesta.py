@@ -0,0 +1,219 @@
+import json
+import queue
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+import zmq
+
+from common.metricas import ERROR, OCUPADO, TIMEOUT, MetricasPS, clasificar
+from common.ruteo import RuteoGC
+
+# Lo que el lector deja en la cola: ("ok", solicitud), ("error", "línea N inválida: ...") o None al final
+Item = Optional[Tuple[str, Union[dict, str]]]
+
+
+class LectorSolicitudes:
+    """
+    Etapa de lectura de la ingesta: en su propio hilo recorre la fuente (archivo, gzip, mmap o
+    stdin), parsea y valida cada línea y la deja en una cola acotada. Así el JSON y el hash del
+    idempotencyKey se solapan con la espera de red del envío, y si el envío se atrasa la
+    lectura se frena (la cola llena bloquea) en vez de cargar el archivo en memoria.
+    """
+
+    def __init__(
+        self,
+        fuente: Iterable[Union[str, bytes]],
+        validar: Callable[[dict], dict],
+        cola: "queue.Queue[Item]",
+    ):
+        self.fuente = fuente
+        self.validar = validar
+        self.cola = cola
+        self.leidas = 0
+
+    def iniciar(self):
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def _loop(self):
+        try:
+            for line in self.fuente:
+                line = line.strip()
+                if not line:
+                    continue
+                self.leidas += 1
+                try:
+                    self.cola.put(("ok", self.validar(json.loads(line))))
+                except Exception as e:
+                    self.cola.put(("error", f"Línea {self.leidas} inválida: {e}"))
+        except Exception as e:
+            self.cola.put(("error", f"Lectura interrumpida tras {self.leidas} líneas: {e}"))
+        finally:
+            self.cola.put(None)
+
+
+class EnvioPorLotes:
+    """
+    Etapa de envío de la ingesta: toma de la cola hasta `lote` solicitudes ya validadas y las manda
+    en un solo LOTE por GC ({"op": "LOTE", "solicitudes": [...]}; la respuesta trae una por
+    solicitud, en orden). Con varios GC, cada solicitud va al que indique el ruteo; si un GC no
+    responde, las del lote pasan al siguiente candidato. Las que vuelven "ocupado" se reenvían
+    juntas tras el retry_after_ms más largo.
+    El GC contesta un LOTE recién cuando atendió todos sus PRESTAMO (uno tras otro en el actor),
+    así que la espera es timeout_ms más timeout_por_solicitud_ms por cada solicitud del LOTE.
+    """
+
+    def __init__(
+        self,
+        ctx: zmq.Context,
+        ruteo: RuteoGC,
+        cola: "queue.Queue[Item]",
+        lote: int,
+        pausa_s: float,
+        timeout_ms: int,
+        timeout_por_solicitud_ms: int,
+        reintentos_ocupado: int,
+        label: str = "",
+    ):
+        self.ctx = ctx
+        self.ruteo = ruteo
+        self.cola = cola
+        self.lote = max(1, lote)
+        self.pausa_s = pausa_s
+        self.timeout_ms = timeout_ms
+        self.timeout_por_solicitud_ms = timeout_por_solicitud_ms
+        self.reintentos_ocupado = reintentos_ocupado
+        self.label = label
+        self.socks: Dict[str, zmq.Socket] = {}
+        self.metricas = MetricasPS()
+        self.lotes = 0
+
+    def _socket(self, ep: str) -> zmq.Socket:
+        sock = self.socks.get(ep)
+        if sock is None:
+            sock = self.ctx.socket(zmq.REQ)
+            sock.setsockopt(zmq.LINGER, 0)
+            sock.connect(ep)
+            self.socks[ep] = sock
+        return sock
+
+    def _lote_a(self, ep: str, msgs: List[dict]) -> Optional[List[dict]]:
+        """
+        Manda un LOTE a un GC. Devuelve una respuesta por solicitud o None si el GC no respondió.
+        """
+        sock = self._socket(ep)
+        sock.setsockopt(zmq.RCVTIMEO, self.timeout_ms + len(msgs) * self.timeout_por_solicitud_ms)
+        try:
+            sock.send_json({"op": "LOTE", "solicitudes": msgs})
+            reply = sock.recv_json()
+        except zmq.Again:
+            # El REQ queda esperando la respuesta: se recrea
+            sock.close(0)
+            del self.socks[ep]
+            return None
+        self.lotes += 1
+        respuestas = reply.get("respuestas")
+        if not isinstance(respuestas, list) or len(respuestas) != len(msgs):
+            # GC sin API de lotes, o lote rechazado entero: la misma respuesta para todas
+            print(f"{self.label}[PS][WARN] GC {ep} no aceptó el LOTE: {reply}")
+            return [reply] * len(msgs)
+        return respuestas
+
+    def _solicitar(self, msgs: List[dict]) -> List[Tuple[dict, Optional[dict]]]:
+        """
+        Envía cada solicitud a su GC (con failover). Devuelve (solicitud, respuesta o None).
+        """
+        resultado: List[Tuple[dict, Optional[dict]]] = []
+        probados: List[Set[str]] = [set() for _ in msgs]
+        restantes = list(range(len(msgs)))
+        while restantes:
+            grupos: "OrderedDict[str, List[int]]" = OrderedDict()
+            for i in restantes:
+                ep = next((ep for ep in self.ruteo.candidatos(msgs[i]) if ep not in probados[i]), None)
+                if ep is None:
+                    resultado.append((msgs[i], None))
+                else:
+                    grupos.setdefault(ep, []).append(i)
+            restantes = []
+            for ep, idxs in grupos.items():
+                for i in idxs:
+                    probados[i].add(ep)
+                respuestas = self._lote_a(ep, [msgs[i] for i in idxs])
+                if respuestas is None:
+                    self.ruteo.marcar_caido(ep)
+                    print(
+                        f"{self.label}[PS][WARN] Timeout con GC {ep} para un LOTE de {len(idxs)}, "
+                        "probando siguiente..."
+                    )
+                    restantes.extend(idxs)
+                    continue
+                self.ruteo.marcar_ok(ep)
+                resultado.extend(zip((msgs[i] for i in idxs), respuestas))
+        return resultado
+
+    def _enviar(self, lote: List[dict]):
+        t0 = time.perf_counter()
+        pendientes = lote
+        for intento in range(self.reintentos_ocupado + 1):
+            ocupados: List[dict] = []
+            espera_ms = 0
+            for msg, reply in self._solicitar(pendientes):
+                if reply is None:
+                    self.metricas.registrar(msg["op"], TIMEOUT)
+                    print(f"{self.label}[PS][WARN] Timeout para id={msg['idSolicitud']} (ningún GC respondió)")
+                elif reply.get("ocupado"):
+                    self.metricas.respuestas_ocupado += 1
+                    ocupados.append(msg)
+                    espera_ms = max(espera_ms, reply.get("retry_after_ms", 200))
+                else:
+                    # Como en el envío de a una, la latencia incluye las esperas por "ocupado"
+                    self.metricas.registrar(msg["op"], clasificar(reply), time.perf_counter() - t0)
+            pendientes = ocupados
+            if not pendientes or intento == self.reintentos_ocupado:
+                break
+            time.sleep(espera_ms / 1000.0 * random.uniform(1.0, 1.5))
+        for msg in pendientes:
+            self.metricas.registrar(msg["op"], OCUPADO)
+            print(
+                f"{self.label}[PS][WARN] GC ocupado para id={msg['idSolicitud']} "
+                f"tras {self.reintentos_ocupado} reintentos"
+            )
+
+    def correr(self):
+        """
+        Envía hasta que el lector termina; los resultados quedan en self.metricas.
+        """
+        self.metricas.iniciar()
+        fin = False
+        try:
+            while not fin:
+                lote: List[dict] = []
+                item = self.cola.get()
+                while True:
+                    if item is None:
+                        fin = True
+                        break
+                    tipo, valor = item
+                    if tipo == "ok":
+                        lote.append(valor)
+                    else:
+                        self.metricas.registrar("INVALIDA", ERROR)
+                        print(f"{self.label}[PS][ERROR] {valor}")
+                    if len(lote) >= self.lote:
+                        break
+                    # Lo que ya está leído entra en este lote; no se espera a llenarlo
+                    try:
+                        item = self.cola.get_nowait()
+                    except queue.Empty:
+                        break
+                if lote:
+                    self._enviar(lote)
+                    if self.pausa_s > 0:
+                        time.sleep(self.pausa_s)
+        finally:
+            for sock in self.socks.values():
+                sock.close(0)
+            self.metricas.terminar()
+        print(f"{self.label}[PS] Ingesta: {self.lotes} lotes de hasta {self.lote} solicitudes")
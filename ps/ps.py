@@ -1,13 +1,26 @@
 import argparse
+import gzip
 import json
+import mmap
+import os
+import queue
+import random
 import sys
 import time
 import uuid
 import hashlib
+from contextlib import contextmanager
 from datetime import datetime, timezone
+from typing import Iterator
 
 import zmq
 
+from common.config import GC_REP_CONNECT
+from common.metricas import ERROR, OCUPADO, OK, TIMEOUT, MetricasPS, clasificar
+from common.ruteo import RuteoGC, parse_gc_sedes
+from ps.carga import GeneradorCarga
+from ps.ingesta import EnvioPorLotes, LectorSolicitudes
+
 ALLOWED_OPS = {"DEVOLUCION", "RENOVACION", "PRESTAMO"}
 
 
@@ -36,13 +49,106 @@ def ensure_message_contract(msg: dict) -> dict:
     return msg
 
 
+def solicitar(ctx: zmq.Context, endpoint: str, msg: dict, timeout_ms: int, reintentos_ocupado: int):
+    """
+    Envía msg a un GC y espera la respuesta, reintentando mientras conteste "ocupado".
+    Devuelve (respuesta, respuestas "ocupado" recibidas). Lanza zmq.Again si el GC no responde.
+    """
+    sock = ctx.socket(zmq.REQ)
+    sock.connect(endpoint)
+    sock.setsockopt(zmq.RCVTIMEO, timeout_ms)
+    sock.setsockopt(zmq.LINGER, 0)
+    try:
+        sock.send_json(msg)
+        reply = sock.recv_json()
+        ocupados = 0
+        while reply.get("ocupado") and ocupados < reintentos_ocupado:
+            # Control de admisión del GC: reintentar la misma solicitud (mismo idempotencyKey)
+            ocupados += 1
+            # Con jitter, para que los PS rechazados juntos no reintenten juntos
+            time.sleep(reply.get("retry_after_ms", 200) / 1000.0 * random.uniform(1.0, 1.5))
+            sock.send_json(msg)
+            reply = sock.recv_json()
+        if reply.get("ocupado"):
+            ocupados += 1
+        return reply, ocupados
+    finally:
+        sock.close(0)
+
+
+@contextmanager
+def abrir_entrada(path: str, usar_mmap: bool = False):
+    """
+    Archivo de solicitudes; "-" = stdin (p.ej. la salida de ps.generar_carga), *.gz = gzip.
+    Con usar_mmap el archivo se mapea en memoria y las líneas salen como bytes.
+    """
+    if path == "-":
+        yield sys.stdin
+    elif path.endswith(".gz"):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            yield f
+    elif usar_mmap and os.path.getsize(path) > 0:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield iter(mm.readline, b"")
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            yield f
+
+
+def leer_mensajes(path: str, repetir: int, label: str) -> Iterator[dict]:
+    """
+    Modo carga: recorre el archivo `repetir` veces, leyendo a medida que se envía (no lo carga
+    entero). Cada repetición es una solicitud distinta (idSolicitud con sufijo #k, y por ende
+    otro idempotencyKey).
+    """
+    for k in range(repetir):
+        with abrir_entrada(path) as f:
+            n = 0
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                n += 1
+                try:
+                    raw = json.loads(line)
+                    if k > 0 and "idSolicitud" in raw:
+                        raw["idSolicitud"] = f"{raw['idSolicitud']}#{k}"
+                    yield ensure_message_contract(raw)
+                except Exception as e:
+                    if k == 0:
+                        print(f"{label}[PS][ERROR] Línea {n} inválida: {e}")
+
+
+def reportar(metricas: MetricasPS, args: argparse.Namespace, label: str):
+    metricas.imprimir(label)
+    if args.metricas_json:
+        metricas.guardar_json(args.metricas_json)
+        print(f"{label}[METRICAS] JSON en {args.metricas_json} (fusionar con ps.unir_metricas)")
+    if args.metricas_csv:
+        metricas.guardar_csv(args.metricas_csv)
+        print(f"{label}[METRICAS] CSV en {args.metricas_csv}")
+
+
 def main():
     parser = argparse.ArgumentParser(description="Procesos Solicitantes (PS) - ZeroMQ REQ")
-    parser.add_argument("--file", required=True, help="Ruta al archivo (JSON por línea)")
+    parser.add_argument("--file", required=True, help="Ruta al archivo (JSON por línea); '-' lee de stdin")
     parser.add_argument(
         "--endpoint",
-        default="tcp://127.0.0.1:5555",
-        help="Endpoint del GC REP (p.e., tcp://gc:5555)",
+        default=GC_REP_CONNECT,
+        help="Endpoint del GC REP (p.e., tcp://gc:5555). Con varios GC, lista separada por comas: "
+        "cada solicitud va al GC que indique --ruteo y, si no responde, al siguiente.",
+    )
+    parser.add_argument(
+        "--ruteo",
+        choices=["libro", "sede"],
+        default="libro",
+        help="Con varios GC: libro = hashing consistente sobre idLibro; sede = el GC de --gc-sedes",
+    )
+    parser.add_argument(
+        "--gc-sedes",
+        dest="gc_sedes",
+        default=None,
+        help="(ruteo sede) GC de cada sede, p.ej. 'SEDE1=tcp://10.0.0.1:5555,SEDE2=tcp://10.0.0.2:5555'",
     )
     parser.add_argument(
         "--interval",
@@ -56,6 +162,80 @@ def main():
         default=2000,
         help="Timeout de respuesta (ms)",
     )
+    parser.add_argument(
+        "--reintentos-ocupado",
+        dest="reintentos_ocupado",
+        type=int,
+        default=5,
+        help="Reintentos cuando el GC responde 'ocupado' (espera el retry_after_ms que indica)",
+    )
+    # Modo carga: muchos clientes virtuales desde este proceso
+    parser.add_argument(
+        "--clientes",
+        type=int,
+        default=1,
+        help="Clientes virtuales concurrentes (DEALER asíncrono). Con más de 1 se activa el modo carga; "
+        "--interval pasa a ser la pausa de cada cliente entre respuesta y siguiente envío.",
+    )
+    parser.add_argument(
+        "--lazo",
+        choices=["cerrado", "abierto"],
+        default="cerrado",
+        help="(carga) cerrado: cada cliente espera su respuesta. abierto: llegadas a --tasa fija "
+        "(--clientes acota las solicitudes en vuelo).",
+    )
+    parser.add_argument(
+        "--tasa",
+        type=float,
+        default=0.0,
+        help="(carga, lazo abierto) Solicitudes por segundo",
+    )
+    parser.add_argument(
+        "--repetir",
+        type=int,
+        default=1,
+        help="(carga) Veces que se recorre el archivo (cada vuelta genera solicitudes nuevas)",
+    )
+    # Ingesta por lotes: lectura y envío en etapas separadas
+    parser.add_argument(
+        "--lote",
+        type=int,
+        default=0,
+        help="Envía en LOTEs de hasta N solicitudes, con la lectura/validación en otro hilo "
+        "(para reproducir archivos grandes). --interval pasa a ser la pausa entre lotes.",
+    )
+    parser.add_argument(
+        "--lote-timeout-ms",
+        dest="lote_timeout_ms",
+        type=int,
+        default=50,
+        help="(lote) Espera extra por cada solicitud del LOTE, sumada a --timeout_ms "
+        "(el GC contesta cuando atendió todos los PRESTAMO del LOTE)",
+    )
+    parser.add_argument(
+        "--cola-ingesta",
+        dest="cola_ingesta",
+        type=int,
+        default=10000,
+        help="(lote) Solicitudes validadas que el lector puede adelantar al envío",
+    )
+    parser.add_argument(
+        "--mmap",
+        action="store_true",
+        help="Lee el archivo mapeado en memoria (no aplica a stdin ni a .gz)",
+    )
+    parser.add_argument(
+        "--metricas-json",
+        dest="metricas_json",
+        default=None,
+        help="Guarda las métricas (histogramas por operación y serie por segundo) en este JSON",
+    )
+    parser.add_argument(
+        "--metricas-csv",
+        dest="metricas_csv",
+        default=None,
+        help="Guarda el resumen por operación y la serie por segundo en este CSV",
+    )
     parser.add_argument(
         "--label",
         default="",
@@ -65,15 +245,65 @@ def main():
 
     label = f"[{args.label}] " if args.label else ""
 
-    print(f"{label}[PS] Enviando solicitudes a {args.endpoint} desde archivo {args.file}")
-    ctx = zmq.Context.instance()
+    endpoints = [ep.strip() for ep in args.endpoint.split(",") if ep.strip()]
+    try:
+        ruteo = RuteoGC(endpoints, args.ruteo, parse_gc_sedes(args.gc_sedes))
+    except ValueError as e:
+        raise SystemExit(str(e))
+
+    if args.file == "-" and args.repetir > 1:
+        raise SystemExit("--repetir no se puede usar leyendo de stdin.")
 
-    total, ok, fail = 0, 0, 0
-    lat_sum, lat_min, lat_max = 0.0, None, None
-    t_global_start = None
-    t_global_end = None
+    origen = "stdin" if args.file == "-" else f"archivo {args.file}"
+    print(f"{label}[PS] Enviando solicitudes a {', '.join(ruteo.anillo.nodos)} desde {origen}")
+    ctx = zmq.Context.instance()
 
-    with open(args.file, "r", encoding="utf-8") as f:
+    if args.lote > 0:
+        if args.clientes > 1 or args.lazo == "abierto" or args.repetir > 1:
+            raise SystemExit("--lote no se combina con --clientes, --lazo abierto ni --repetir.")
+        cola: "queue.Queue" = queue.Queue(maxsize=max(1, args.cola_ingesta))
+        envio = EnvioPorLotes(
+            ctx,
+            ruteo,
+            cola,
+            args.lote,
+            max(0.0, args.interval),
+            args.timeout_ms,
+            args.lote_timeout_ms,
+            args.reintentos_ocupado,
+            label,
+        )
+        with abrir_entrada(args.file, args.mmap) as f:
+            LectorSolicitudes(f, ensure_message_contract, cola).iniciar()
+            envio.correr()
+        reportar(envio.metricas, args, label)
+        ctx.term()
+        return
+
+    if args.clientes > 1 or args.lazo == "abierto":
+        if args.lazo == "abierto" and args.tasa <= 0:
+            raise SystemExit("--lazo abierto requiere --tasa > 0.")
+        gen = GeneradorCarga(
+            ctx,
+            ruteo,
+            leer_mensajes(args.file, max(1, args.repetir), label),
+            args.clientes,
+            args.lazo == "abierto",
+            args.tasa,
+            max(0.0, args.interval),
+            args.timeout_ms,
+            args.reintentos_ocupado,
+            label,
+        )
+        gen.correr()
+        reportar(gen.metricas, args, label)
+        ctx.term()
+        return
+
+    metricas = MetricasPS()
+    total = 0
+
+    with abrir_entrada(args.file, args.mmap) as f:
         for line in f:
             line = line.strip()
             if not line:
@@ -84,61 +314,57 @@ def main():
                 raw = json.loads(line)
                 msg = ensure_message_contract(raw)
             except Exception as e:
-                fail += 1
+                metricas.registrar("INVALIDA", ERROR)
                 print(f"{label}[PS][ERROR] Línea {total} inválida: {e}")
                 continue
 
-            sock = ctx.socket(zmq.REQ)
-            sock.connect(args.endpoint)
-            sock.setsockopt(zmq.RCVTIMEO, args.timeout_ms)
-            sock.setsockopt(zmq.LINGER, 0)
-
             try:
-                if t_global_start is None:
-                    t_global_start = time.perf_counter()
-
+                metricas.iniciar()
                 t0 = time.perf_counter()
-                sock.send_json(msg)
-                reply = sock.recv_json()
+                reply = None
+                for ep in ruteo.candidatos(msg):
+                    try:
+                        reply, n = solicitar(ctx, ep, msg, args.timeout_ms, args.reintentos_ocupado)
+                    except zmq.Again:
+                        ruteo.marcar_caido(ep)
+                        print(
+                            f"{label}[PS][WARN] Timeout con GC {ep} para id={msg['idSolicitud']}, "
+                            "probando siguiente..."
+                        )
+                        continue
+                    ruteo.marcar_ok(ep)
+                    metricas.respuestas_ocupado += n
+                    break
                 t1 = time.perf_counter()
 
                 dt = t1 - t0
-                lat_sum += dt
-                lat_min = dt if lat_min is None or dt < lat_min else lat_min
-                lat_max = dt if lat_max is None or dt > lat_max else lat_max
-
-                ok += 1
-                print(f"{label}[PS][OK] {msg['op']} id={msg['idSolicitud']} → {reply} (lat={dt:.4f}s)")
-            except zmq.Again:
-                fail += 1
-                print(f"{label}[PS][WARN] Timeout para id={msg['idSolicitud']}")
+                if reply is None:
+                    metricas.registrar(msg["op"], TIMEOUT)
+                    print(f"{label}[PS][WARN] Timeout para id={msg['idSolicitud']} (ningún GC respondió)")
+                elif reply.get("ocupado"):
+                    metricas.registrar(msg["op"], OCUPADO)
+                    print(
+                        f"{label}[PS][WARN] GC ocupado para id={msg['idSolicitud']} "
+                        f"tras {args.reintentos_ocupado} reintentos"
+                    )
+                else:
+                    # La latencia (sólo de las OK) incluye las esperas por "ocupado"
+                    resultado = clasificar(reply)
+                    metricas.registrar(msg["op"], resultado, dt)
+                    print(
+                        f"{label}[PS][{resultado.upper()}] {msg['op']} id={msg['idSolicitud']} → {reply} "
+                        f"(lat={dt:.4f}s)"
+                    )
             except Exception as e:
-                fail += 1
+                metricas.registrar(msg["op"], ERROR)
                 print(f"{label}[PS][ERROR] id={msg['idSolicitud']} fallo: {e}")
-            finally:
-                sock.close(0)
 
             time.sleep(max(0.0, args.interval))
 
-    t_global_end = time.perf_counter() if t_global_start is not None else None
-
-    print(f"{label}[PS] Terminado. total={total} ok={ok} fail={fail}")
-
-    if t_global_start is not None and t_global_end is not None:
-        elapsed = t_global_end - t_global_start
-        throughput = (total / elapsed) if elapsed > 0 else 0.0
-        avg_lat = (lat_sum / ok) if ok > 0 else 0.0
-
-        lat_min_str = f"{lat_min:.4f}s" if lat_min is not None else "N/A"
-        lat_max_str = f"{lat_max:.4f}s" if lat_max is not None else "N/A"
-
-        print(f"{label}[METRICAS] Duración total = {elapsed:.4f}s")
-        print(f"{label}[METRICAS] Throughput = {throughput:.2f} ops/s (total={total})")
-        print(f"{label}[METRICAS] Latencia media = {avg_lat:.4f}s, min = {lat_min_str}, max = {lat_max_str}")
-
+    metricas.terminar()
+    reportar(metricas, args, label)
     ctx.term()
 
-
 if __name__ == "__main__":
     try:
         main()
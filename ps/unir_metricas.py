@@ -0,0 +1,37 @@
+"""
+Une las métricas de varios PS (archivos de --metricas-json) en un solo reporte del escenario.
+
+Los histogramas se suman cubeta a cubeta (los percentiles salen del total, no de promediar
+percentiles) y las series por segundo se alinean por segundo epoch.
+
+Ejemplo:
+    python -m ps.unir_metricas /tmp/sede1-ps*.json /tmp/sede2-ps*.json --csv escenario_a.csv
+"""
+import argparse
+
+from common.metricas import MetricasPS
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Une métricas JSON de varios PS en un reporte")
+    ap.add_argument("archivos", nargs="+", help="JSON generados con --metricas-json")
+    ap.add_argument("--json", default=None, help="Guarda las métricas unidas en este JSON")
+    ap.add_argument("--csv", default=None, help="Guarda el resumen y la serie por segundo en este CSV")
+    ap.add_argument("--label", default="", help="Prefijo para los logs del reporte")
+    args = ap.parse_args()
+
+    label = f"[{args.label}] " if args.label else ""
+    total = MetricasPS.cargar_json(args.archivos[0])
+    for path in args.archivos[1:]:
+        total.fusionar(MetricasPS.cargar_json(path))
+
+    print(f"{label}[METRICAS] {total.procesos} PS unidos desde {len(args.archivos)} archivos")
+    total.imprimir(label)
+    if args.json:
+        total.guardar_json(args.json)
+    if args.csv:
+        total.guardar_csv(args.csv)
+
+
+if __name__ == "__main__":
+    main()